@@ -0,0 +1,101 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Micro-benchmark of reading fields of many builds, as 'osbs list-builds' does
+
+Run from the top directory of the repository:
+
+    PYTHONPATH=. python benchmarks/build_listing.py
+"""
+from __future__ import print_function, absolute_import, unicode_literals
+
+import copy
+import json
+import os
+import timeit
+
+from osbs.build import build_response
+from osbs.build.build_response import BuildResponse
+from osbs.utils import graceful_chain_get
+
+
+BUILD_JSON = os.path.join(os.path.dirname(__file__), os.pardir, "tests", "mock_jsons",
+                          "1.0.4", "build_test-build-123.json")
+
+
+def graceful_chain_get_copying(d, *args):
+    # the implementation replaced by the copy-free one: the whole input is copied first
+    if not d:
+        return None
+    t = copy.deepcopy(d)
+    for arg in args:
+        try:
+            t = t[arg]
+        except (AttributeError, KeyError):
+            return None
+    return t
+
+
+class BuildResponseDecodingAgain(BuildResponse):
+    # annotations were decoded on every call
+    def _get_json_annotation(self, name):
+        value = build_response.graceful_chain_get(self.get_annotations_or_labels(), name)
+        if value:
+            return json.loads(value)
+
+
+def make_builds(count):
+    with open(BUILD_JSON) as f:
+        template = json.load(f)
+    template["metadata"]["annotations"]["tar_metadata"] = json.dumps(
+        {"size": 1234, "md5sum": "0" * 32, "sha256sum": "0" * 64, "filename": "image.tar"})
+    builds = []
+    for i in range(count):
+        build = copy.deepcopy(template)
+        build["metadata"]["name"] = "build-%d" % i
+        builds.append(build)
+    return builds
+
+
+def render_list(cls, builds):
+    # what cmd_list_builds reads of every build
+    rows = []
+    for build_json in builds:
+        build = cls(None, build_json)
+        rows.append((build.get_time_created_in_seconds(), build.get_build_name(),
+                     build.status, build.get_image_tag()))
+    return sorted(rows)
+
+
+def render_tar_metadata(cls, builds):
+    for build_json in builds:
+        build = cls(None, build_json)
+        (build.get_tar_metadata_size(), build.get_tar_metadata_md5sum(),
+         build.get_tar_metadata_sha256sum(), build.get_tar_metadata_filename())
+
+
+def main(count=10000, repeat=3):
+    builds = make_builds(count)
+    implementations = [
+        ("copying", graceful_chain_get_copying, BuildResponseDecodingAgain),
+        ("copy-free", graceful_chain_get, BuildResponse),
+    ]
+    for name, render in (("list of %d builds" % count, render_list),
+                         ("tar metadata of %d builds" % count, render_tar_metadata)):
+        print(name)
+        for impl_name, chain_get, cls in implementations:
+            build_response.graceful_chain_get = chain_get
+            try:
+                best = min(timeit.repeat(lambda: render(cls, builds), number=1, repeat=repeat))
+            finally:
+                build_response.graceful_chain_get = graceful_chain_get
+            print("    %-10s %8.1f ms" % (impl_name, best * 1000))
+
+
+if __name__ == '__main__':
+    main()
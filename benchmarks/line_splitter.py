@@ -0,0 +1,66 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Micro-benchmark of splitting streamed responses into lines
+
+Run from the top directory of the repository:
+
+    PYTHONPATH=. python benchmarks/line_splitter.py
+"""
+from __future__ import print_function, absolute_import, unicode_literals
+
+import timeit
+
+from osbs.http import HttpStream
+
+
+def split_by_concatenating(chunks):
+    # the implementation LineSplitter replaced: the unfinished line is prepended to every chunk
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            chunk = pending + chunk
+        lines = chunk.splitlines()
+
+        if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1]:
+            pending = lines.pop()
+        else:
+            pending = None
+
+        for line in lines:
+            yield line
+
+    if pending is not None:
+        yield pending
+
+
+def cut(text, chunk_size):
+    return [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+
+
+SCENARIOS = [
+    # a watch event carrying a big annotation, e.g. build logs
+    ("one 4 MB line in 1 kB chunks", cut("x" * 4 * 1024 * 1024 + "\n", 1024)),
+    ("100k short lines in 16 kB chunks", cut("build log line\n" * 100000, 16 * 1024)),
+]
+
+
+def main(repeat=3):
+    implementations = [
+        ("concatenating", split_by_concatenating),
+        ("LineSplitter", HttpStream._split_lines_from_chunks),
+    ]
+    for name, chunks in SCENARIOS:
+        print(name)
+        for impl_name, impl in implementations:
+            best = min(timeit.repeat(lambda: list(impl(chunks)), number=1, repeat=repeat))
+            print("    %-15s %8.1f ms" % (impl_name, best * 1000))
+
+
+if __name__ == '__main__':
+    main()
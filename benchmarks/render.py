@@ -0,0 +1,117 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Micro-benchmark of rendering production build requests
+
+Run from the top directory of the repository:
+
+    PYTHONPATH=. python benchmarks/render.py
+"""
+from __future__ import print_function, absolute_import, unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+import timeit
+
+from osbs.build import build_request
+from osbs.build.build_request import BuildManager
+from osbs.build.manipulate import DockJsonManipulator
+from osbs.constants import PROD_BUILD_TYPE
+
+
+INPUTS = os.path.join(os.path.dirname(__file__), os.pardir, "inputs")
+PARAMS = {
+    'git_uri': "git://hostname/path",
+    'git_ref': "01234567",
+    'git_branch': "master",
+    'user': "john-foo",
+    'component': "component",
+    'base_image': 'fedora:latest',
+    'name_label': "fedora/resultingimage",
+    'registry_uri': "registry.example.com",
+    'openshift_uri': "http://openshift/",
+    'koji_target': "koji-target",
+    'kojiroot': "http://root/",
+    'kojihub': "http://hub/",
+    'sources_command': "make",
+    'architecture': "x86_64",
+    'vendor': "Foo Vendor",
+    'build_host': "our.build.host.example.com",
+    'authoritative_registry': "registry.example.com",
+    'pulp_registry': "pulp",
+    'pulp_secret': "secret",
+    'nfs_server_path': "server:path",
+}
+
+
+class LinearDockJsonManipulator(DockJsonManipulator):
+    # the implementation the index replaced: every lookup scans the plugin list
+    def dock_json_get_plugin_conf(self, plugin_type, plugin_name):
+        match = [x for x in self.dock_json[plugin_type] if x.get('name', None) == plugin_name]
+        return match[0]
+
+    def remove_plugin(self, plugin_type, plugin_name):
+        for p in self.dock_json[plugin_type]:
+            if p.get('name', None) == plugin_name:
+                self.dock_json[plugin_type].remove(p)
+                break
+
+    def write_dock_json(self):
+        env_json = self.build_json['spec']['strategy']['customStrategy']['env']
+        p = [env for env in env_json if env["name"] == "DOCK_PLUGINS"]
+        p[0]['value'] = json.dumps(self.dock_json)
+
+
+def make_store(extra_plugins):
+    """
+    :return: str, directory with the templates, every plugin list of the inner template
+             extended by extra_plugins plugins nothing looks for
+    """
+    store = tempfile.mkdtemp()
+    shutil.copy(os.path.join(INPUTS, "prod.json"), store)
+    with open(os.path.join(INPUTS, "prod_inner.json")) as fp:
+        inner = json.load(fp)
+    for plugins in inner.values():
+        if isinstance(plugins, list):
+            plugins[:0] = [{"name": "unused_%d" % i, "args": {}} for i in range(extra_plugins)]
+    with open(os.path.join(store, "prod_inner.json"), "w") as fp:
+        json.dump(inner, fp)
+    return store
+
+
+def render(store):
+    request = BuildManager(store).get_build_request_by_type(PROD_BUILD_TYPE)
+    request.set_params(**PARAMS)
+    return request.render()
+
+
+def main(number=500, repeat=5):
+    implementations = [
+        ("linear", LinearDockJsonManipulator),
+        ("indexed", DockJsonManipulator),
+    ]
+    for extra_plugins in (0, 20, 50):
+        print("render prod with %d more plugins of each type" % extra_plugins)
+        store = make_store(extra_plugins)
+        try:
+            for name, cls in implementations:
+                build_request.DockJsonManipulator = cls
+                try:
+                    best = min(timeit.repeat(lambda: render(store), number=number,
+                                             repeat=repeat))
+                finally:
+                    build_request.DockJsonManipulator = DockJsonManipulator
+                print("    %-8s %8.1f us" % (name, best / number * 1e6))
+        finally:
+            shutil.rmtree(store)
+
+
+if __name__ == '__main__':
+    main()
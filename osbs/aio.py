@@ -0,0 +1,687 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+asyncio-native client
+
+Requests are driven by a single CurlMulti per event loop through libcurl's socket-action API, so
+any number of concurrent requests, watches and log follows share one thread.
+
+This module requires Python 3.6 or newer and is not imported by the osbs package itself.
+"""
+import asyncio
+import codecs
+import functools
+import json
+import logging
+import random
+import sys
+from io import BytesIO
+
+import pycurl
+
+from osbs.api import OSBS
+from osbs.build.build_response import BuildResponse
+from osbs.constants import (DEFAULT_NAMESPACE, BUILD_FINISHED_STATES, BUILD_RUNNING_STATES,
+                            BUILD_CANCELLED_STATE, PATCH_MERGE, WATCH_MODIFIED, WATCH_DELETED,
+                            WATCH_ERROR)
+from osbs.exceptions import (OsbsException, OsbsNetworkException, OsbsResponseException,
+                             OsbsWatchBuildNotFound)
+from osbs.http import (HttpResponse, LineSplitter, RequestMetrics, setup_curl, parse_headers,
+                       get_encoding, http2_supported, enable_multiplexing, notify_observers,
+                       network_exception)
+
+
+logger = logging.getLogger(__name__)
+
+# chunks of a response queued for a consumer which is behind before the transfer is paused
+MAX_QUEUED_CHUNKS = 64
+
+
+async def check_response(response):
+    """
+    asynchronous variant of osbs.core.check_response, which also reads the body of
+    an AsyncHttpStream
+
+    :param response: HttpResponse or AsyncHttpStream
+    """
+    if response.status_code not in (200, 201):
+        if hasattr(response, 'content'):
+            content = response.content
+        else:
+            content = await response.read()
+
+        logger.error("[%s] %s", response.status_code, content)
+        raise OsbsResponseException(message=content, status_code=response.status_code)
+
+
+class AsyncCurlMulti(object):
+    """
+    CurlMulti driven by an asyncio event loop
+
+    libcurl tells us which sockets to watch (M_SOCKETFUNCTION) and when to wake it up
+    (M_TIMERFUNCTION); the event loop calls socket_action() when that happens.
+    """
+
+    def __init__(self, loop, http2=False):
+        self.loop = loop
+        self._timer = None
+        self._transfers = {}  # pycurl.Curl -> _AsyncTransfer
+        self._multi = pycurl.CurlMulti()
+        if http2:
+            # all requests of the loop share one connection per host
+            enable_multiplexing(self._multi)
+        self._multi.setopt(pycurl.M_SOCKETFUNCTION, self._on_socket)
+        self._multi.setopt(pycurl.M_TIMERFUNCTION, self._on_timer)
+
+    def _on_socket(self, event, fd, multi, data):
+        # called from within socket_action(): only (un)register fds with the loop here
+        if event == pycurl.POLL_REMOVE:
+            self.loop.remove_reader(fd)
+            self.loop.remove_writer(fd)
+            return
+
+        if event in (pycurl.POLL_IN, pycurl.POLL_INOUT):
+            self.loop.add_reader(fd, self._socket_action, fd, pycurl.CSELECT_IN)
+        else:
+            self.loop.remove_reader(fd)
+
+        if event in (pycurl.POLL_OUT, pycurl.POLL_INOUT):
+            self.loop.add_writer(fd, self._socket_action, fd, pycurl.CSELECT_OUT)
+        else:
+            self.loop.remove_writer(fd)
+
+    def _on_timer(self, timeout_ms):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if timeout_ms >= 0:
+            self._timer = self.loop.call_later(timeout_ms / 1000.0, self._on_timeout)
+
+    def _on_timeout(self):
+        self._timer = None
+        self._socket_action(pycurl.SOCKET_TIMEOUT, 0)
+
+    def _socket_action(self, fd, event):
+        while True:
+            try:
+                ret, _ = self._multi.socket_action(fd, event)
+            except pycurl.error as ex:
+                self._fail_all(OsbsException(cause=ex, traceback=sys.exc_info()[2]))
+                return
+            if ret != pycurl.E_CALL_MULTI_PERFORM:
+                break
+        self._process_finished()
+
+    def _process_finished(self):
+        while True:
+            num_q, ok_list, err_list = self._multi.info_read()
+            for c in ok_list:
+                self._finish(c, None)
+            for c, code, message in err_list:
+                self._finish(c, network_exception(self._transfers[c].url, message, code))
+            if num_q == 0:
+                break
+
+    def _finish(self, c, error):
+        transfer = self._transfers.pop(c)
+        self._multi.remove_handle(c)
+        transfer.finish(error)
+
+    def _fail_all(self, error):
+        for c in list(self._transfers):
+            self._finish(c, error)
+
+    def add(self, transfer):
+        self._transfers[transfer.c] = transfer
+        self._multi.add_handle(transfer.c)
+
+    def resume(self, transfer):
+        """
+        continue a transfer paused because its consumer was behind, see _AsyncTransfer
+        """
+        if transfer.paused and transfer.c in self._transfers:
+            transfer.paused = False
+            # curl may deliver the data it kept right away
+            transfer.c.pause(pycurl.PAUSE_CONT)
+            # the socket of the transfer may be quiet, let curl carry on
+            self.loop.call_soon(self._socket_action, pycurl.SOCKET_TIMEOUT, 0)
+
+    def remove(self, transfer):
+        if self._transfers.pop(transfer.c, None) is not None:
+            self._multi.remove_handle(transfer.c)
+
+    def close(self):
+        self._fail_all(OsbsException("transfer aborted, the session was closed"))
+        if self._timer is not None:
+            self._timer.cancel()
+        self._multi.close()
+
+
+class _AsyncTransfer(object):
+    """
+    curl handle of one request; data written by curl is queued for the consumer
+
+    Once MAX_QUEUED_CHUNKS are waiting, the transfer is paused, so that curl stops reading
+    from the socket, until the consumer catches up and AsyncCurlMulti.resume() is called.
+    """
+
+    def __init__(self, loop, url, method, verbose=False, **kwargs):
+        self.url = url
+        self.method = method
+        self.c = pycurl.Curl()
+        self.headers_buffer = BytesIO()
+        self.chunks = asyncio.Queue()  # bytes; None marks the end
+        self.paused = False
+        self.first_data = loop.create_future()
+        self.done = loop.create_future()
+        setup_curl(self.c, url, method, self._write, self.headers_buffer.write,
+                   verbose=verbose, **kwargs)
+
+    def _write(self, data):
+        if not self.first_data.done():
+            self.first_data.set_result(None)
+        if self.chunks.qsize() >= MAX_QUEUED_CHUNKS:
+            # curl keeps the data and writes it again once the transfer is resumed
+            self.paused = True
+            return pycurl.WRITEFUNC_PAUSE
+        self.chunks.put_nowait(data)
+
+    def finish(self, error):
+        if not self.first_data.done():
+            self.first_data.set_result(None)
+        if error is None:
+            self.done.set_result(None)
+        else:
+            self.done.set_exception(error)
+            # don't complain about exceptions nobody asked for
+            self.done.exception()
+        self.chunks.put_nowait(None)
+
+
+class AsyncHttpStream(object):
+    """
+    Asynchronous counterpart of osbs.http.HttpStream; use it as an async context manager.
+    """
+
+    def __init__(self, reactor, transfer, observers=None):
+        self._reactor = reactor
+        self._transfer = transfer
+        self._observers = observers
+        self.url = transfer.url
+        self.status_code = 0
+        self.headers = None
+        self.closed = False
+        self._decoder = None
+
+    async def _start(self):
+        self._reactor.add(self._transfer)
+        await self._transfer.first_data
+        if self._transfer.done.done() and self._transfer.done.exception() is not None:
+            self.close()
+            raise self._transfer.done.exception()
+        self.headers = parse_headers(self._transfer.headers_buffer.getvalue())
+        self.status_code = self._transfer.c.getinfo(pycurl.HTTP_CODE)
+        self._decoder = codecs.getincrementaldecoder(get_encoding(self.headers))()
+        return self
+
+    async def iter_chunks(self, decode=True):
+        """
+        :param decode: bool, decode the chunks using the charset of the response;
+                       when False, yield bytes as they were received
+        """
+        while True:
+            chunk = await self._transfer.chunks.get()
+            if chunk is None:
+                break
+            if self._transfer.paused and \
+                    self._transfer.chunks.qsize() <= MAX_QUEUED_CHUNKS // 2:
+                self._reactor.resume(self._transfer)
+            yield self._decoder.decode(chunk) if decode else chunk
+        # raises the network error, if there was one
+        await self._transfer.done
+        tail = self._decoder.decode(b'', final=True) if decode else None
+        if tail:
+            yield tail
+        self.close()
+
+    async def iter_lines(self, max_line_length=None):
+        # same behaviour as HttpStream.iter_lines()
+        splitter = LineSplitter(max_line_length=max_line_length)
+        async for chunk in self.iter_chunks():
+            for line in splitter.feed(chunk):
+                yield line
+
+        for line in splitter.finish():
+            yield line
+
+    async def read(self, decode=True):
+        chunks = [chunk async for chunk in self.iter_chunks(decode=decode)]
+        return ''.join(chunks) if decode else b''.join(chunks)
+
+    def close(self):
+        if not self.closed:
+            self._reactor.remove(self._transfer)
+            if self._observers:
+                notify_observers(self._observers,
+                                 RequestMetrics.from_curl(self._transfer.c, self.url,
+                                                          self._transfer.method))
+            self._transfer.c.close()
+        self.closed = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class AsyncHttpSession(object):
+    """
+    Asynchronous counterpart of osbs.http.HttpSession
+
+    One instance must only be used from a single event loop.
+    """
+
+    def __init__(self, verbose=False, compression=False, http2=False, observers=None,
+                 connect_timeout=None, timeout=None, stall_timeout=None, keepalive=None):
+        self.verbose = verbose
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.keepalive = keepalive
+        self.observers = observers if observers is not None else []
+        self.compression = compression
+        if http2 and not http2_supported():
+            logger.warning("curl doesn't support HTTP/2, using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self._reactor = None
+
+    def _get_reactor(self):
+        if self._reactor is None:
+            self._reactor = AsyncCurlMulti(asyncio.get_event_loop(), http2=self.http2)
+        return self._reactor
+
+    def _transfer_args(self, kwargs):
+        # see HttpSession._transfer_args()
+        args = dict(verbose=self.verbose, compression=self.compression, http2=self.http2,
+                    connect_timeout=self.connect_timeout, stall_timeout=self.stall_timeout,
+                    keepalive=self.keepalive)
+        args.update(kwargs)
+        if self.timeout is not None and not args.get('stream', False):
+            timeout = args.get('timeout')
+            args['timeout'] = self.timeout if timeout is None else min(timeout, self.timeout)
+        return args
+
+    async def stream(self, url, method, **kwargs):
+        """
+        start a request and return once the response headers are available
+
+        :return: AsyncHttpStream
+        """
+        kwargs['stream'] = True
+        reactor = self._get_reactor()
+        transfer = _AsyncTransfer(reactor.loop, url, method, **self._transfer_args(kwargs))
+        return await AsyncHttpStream(reactor, transfer, self.observers)._start()
+
+    async def request(self, url, method, stream=False, **kwargs):
+        """
+        :return: HttpResponse, or AsyncHttpStream when stream is True
+        """
+        if stream:
+            return await self.stream(url, method, **kwargs)
+
+        reactor = self._get_reactor()
+        transfer = _AsyncTransfer(reactor.loop, url, method, **self._transfer_args(kwargs))
+        async with await AsyncHttpStream(reactor, transfer, self.observers)._start() as s:
+            content = await s.read(decode=False)
+            return HttpResponse(s.status_code, s.headers, content, url=url)
+
+    async def get(self, url, **kwargs):
+        return await self.request(url, "get", **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request(url, "post", **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self.request(url, "put", **kwargs)
+
+    async def patch(self, url, **kwargs):
+        return await self.request(url, "patch", **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request(url, "delete", **kwargs)
+
+    def close(self):
+        if self._reactor is not None:
+            self._reactor.close()
+            self._reactor = None
+
+
+class AsyncOpenshift(object):
+    """
+    asyncio counterpart of osbs.core.Openshift
+
+    It wraps an Openshift instance, which provides configuration and authentication. Obtaining
+    an OAuth token is a blocking operation, so it runs in the default executor.
+    """
+
+    def __init__(self, openshift):
+        """
+        :param openshift: instance of osbs.core.Openshift
+        """
+        self.os = openshift
+        self._con = AsyncHttpSession(verbose=openshift.verbose,
+                                     compression=openshift.use_compression,
+                                     http2=openshift.use_http2,
+                                     observers=openshift.request_observers,
+                                     connect_timeout=openshift.connect_timeout,
+                                     timeout=openshift.request_timeout,
+                                     stall_timeout=openshift.stall_timeout,
+                                     keepalive=openshift.keepalive)
+
+    async def _request_args(self, with_auth=True, **kwargs):
+        """
+        see Openshift._request_args(); when a token has to be obtained, which blocks, it runs
+        in the default executor
+        """
+        if with_auth and self.os.use_auth and self.os.token is None:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, functools.partial(self.os._request_args,
+                                                                      with_auth, **kwargs))
+        return self.os._request_args(with_auth, **kwargs)
+
+    async def _request(self, method, url, with_auth=True, **kwargs):
+        loop = asyncio.get_event_loop()
+        headers, request_kwargs = await self._request_args(with_auth, **kwargs)
+        response = await self._con.request(url, method, headers=headers,
+                                           verify_ssl=self.os.verify_ssl, **request_kwargs)
+        if with_auth and self.os.use_auth and response.status_code == 401:
+            # see Openshift._request()
+            refreshed = await loop.run_in_executor(None, self.os._token_rejected,
+                                                   headers.get("Authorization"))
+            if refreshed and self.os._is_replayed(method, headers):
+                logger.info("replaying %s %s with a new token", method.upper(), url)
+                if request_kwargs.get("stream"):
+                    response.close()
+                headers, request_kwargs = await self._request_args(with_auth, **kwargs)
+                response = await self._con.request(url, method, headers=headers,
+                                                   verify_ssl=self.os.verify_ssl,
+                                                   **request_kwargs)
+        return response
+
+    async def _get(self, url, with_auth=True, **kwargs):
+        return await self._request("get", url, with_auth=with_auth, **kwargs)
+
+    async def _post(self, url, with_auth=True, **kwargs):
+        return await self._request("post", url, with_auth=with_auth, **kwargs)
+
+    async def _put(self, url, with_auth=True, **kwargs):
+        return await self._request("put", url, with_auth=with_auth, **kwargs)
+
+    async def _patch(self, url, with_auth=True, **kwargs):
+        return await self._request("patch", url, with_auth=with_auth, **kwargs)
+
+    async def create_build(self, build_json, namespace=DEFAULT_NAMESPACE):
+        url = self.os._build_url("namespaces/%s/builds/" % namespace)
+        return await self._post(url, data=build_json,
+                                headers={"Content-Type": "application/json"})
+
+    async def get_build(self, build_id, namespace=DEFAULT_NAMESPACE):
+        url = self.os._build_url("namespaces/%s/builds/%s/" % (namespace, build_id))
+        response = await self._get(url)
+        await check_response(response)
+        return response
+
+    async def list_builds(self, build_config_id=None, namespace=DEFAULT_NAMESPACE,
+                          field_selector=None, labels=None):
+        query = self.os._builds_query(build_config_id, field_selector, labels)
+        url = self.os._build_url("namespaces/%s/builds/" % namespace, **query)
+        return await self._get(url)
+
+    async def cancel_build(self, build_id, namespace=DEFAULT_NAMESPACE):
+        url = self.os._build_url("namespaces/%s/builds/%s/" % (namespace, build_id))
+        patch = {"status": {"phase": BUILD_CANCELLED_STATE.capitalize()}}
+        return await self._patch(url, data=json.dumps(patch),
+                                 headers={"Content-Type": PATCH_MERGE})
+
+    async def watch_builds(self, build_id=None, namespace=DEFAULT_NAMESPACE):
+        """
+        watch builds in namespace, or just one of them; see Openshift.watch() for how
+        dropped streams are resumed
+
+        :param build_id: str, watch only this build
+        :param namespace: str
+        :return: async iterator of (change type, build json) tuples
+        """
+        if build_id is None:
+            path = "watch/namespaces/%s/builds/" % namespace
+        else:
+            path = "watch/namespaces/%s/builds/%s/" % (namespace, build_id)
+        resource_version = None
+        failures = 0
+        while True:
+            query = {}
+            if resource_version:
+                query["resourceVersion"] = resource_version
+            url = self.os._build_url(path, **query)
+            try:
+                async with await self._get(url, stream=True,
+                                           headers={'Connection': 'close'}) as response:
+                    await check_response(response)
+                    lines = response.iter_lines()
+                    try:
+                        async for line in lines:
+                            j = json.loads(line)
+                            logger.debug(line)
+                            changetype = j.get("type", "").lower()
+                            obj = j.get("object", None)
+                            if obj is None:
+                                logger.error("'object' is None")
+                                continue
+                            if changetype == WATCH_ERROR:
+                                raise OsbsResponseException(obj.get("message", "watch failed"),
+                                                            obj.get("code"))
+                            failures = 0
+                            resource_version = obj.get("metadata", {}).get("resourceVersion",
+                                                                           resource_version)
+                            yield changetype, obj
+                    finally:
+                        await lines.aclose()
+            except OsbsResponseException as ex:
+                if ex.status_code == 410:
+                    logger.info("resourceVersion %s is gone, listing again", resource_version)
+                    if build_id is None:
+                        response = await self.list_builds(namespace=namespace)
+                        await check_response(response)
+                        objs = response.json().get("items", [])
+                        resource_version = response.json().get("metadata", {}).get(
+                            "resourceVersion")
+                    else:
+                        objs = [(await self.get_build(build_id, namespace=namespace)).json()]
+                        resource_version = objs[0]["metadata"].get("resourceVersion")
+                    for obj in objs:
+                        yield WATCH_MODIFIED, obj
+                    continue
+                if ex.status_code is not None and ex.status_code < 500:
+                    raise
+                failures += 1
+                if failures > self.os.WATCH_MAX_FAILURES:
+                    raise
+                logger.warning("watch failed (%d/%d): %r", failures,
+                               self.os.WATCH_MAX_FAILURES, ex)
+            except OsbsNetworkException as ex:
+                failures += 1
+                if failures > self.os.WATCH_MAX_FAILURES:
+                    raise
+                logger.warning("watch failed (%d/%d): %r", failures,
+                               self.os.WATCH_MAX_FAILURES, ex)
+
+            await asyncio.sleep(random.uniform(0, min(self.os.WATCH_RECONNECT_MAX_DELAY,
+                                                      self.os.WATCH_RECONNECT_DELAY *
+                                                      2 ** failures)))
+
+    async def wait(self, build_id, states, namespace=DEFAULT_NAMESPACE):
+        logger.info("watching build '%s'", build_id)
+        watch = self.watch_builds(build_id=build_id, namespace=namespace)
+        try:
+            async for changetype, obj in watch:
+                try:
+                    obj_name = obj["metadata"]["name"]
+                except KeyError:
+                    logger.error("'object' doesn't have any name")
+                    continue
+                if obj_name != build_id:
+                    continue
+                if changetype == WATCH_DELETED:
+                    raise OsbsWatchBuildNotFound("build '%s' was deleted" % build_id)
+                try:
+                    obj_status = obj["status"]["phase"].lower()
+                except KeyError:
+                    logger.error("'object' doesn't have any status")
+                    continue
+                if obj_status in states:
+                    return obj
+        finally:
+            # close the stream now rather than whenever the generator gets collected
+            await watch.aclose()
+
+    async def wait_for_build_to_finish(self, build_id, namespace=DEFAULT_NAMESPACE):
+        return await self.wait(build_id, BUILD_FINISHED_STATES, namespace)
+
+    async def wait_for_build_to_get_scheduled(self, build_id, namespace=DEFAULT_NAMESPACE):
+        return await self.wait(build_id, BUILD_FINISHED_STATES + BUILD_RUNNING_STATES, namespace)
+
+    async def logs(self, build_id, follow=False, build_json=None, wait_if_missing=False,
+                   namespace=DEFAULT_NAMESPACE):
+        """
+        provide logs from build
+
+        :return: None, str or async iterator of lines (when following)
+        """
+        try:
+            if not build_json:
+                build_json = (await self.get_build(build_id, namespace=namespace)).json()
+        except OsbsResponseException as ex:
+            if ex.status_code == 404:
+                if not wait_if_missing:
+                    raise OsbsException("Build '%s' doesn't exist." % build_id)
+            else:
+                raise
+
+        if follow or wait_if_missing:
+            build_json = await self.wait_for_build_to_get_scheduled(build_id, namespace=namespace)
+
+        br = BuildResponse(None, build_json=build_json)
+
+        # When build is in new or pending state, openshift responds with 500
+        if br.is_pending():
+            return
+
+        buildlogs_url = self.os._build_url("namespaces/%s/builds/%s/log/" % (namespace, build_id),
+                                           follow=(1 if follow else 0))
+        response = await self._get(buildlogs_url, stream=follow, headers={'Connection': 'close'})
+        await check_response(response)
+
+        if follow:
+            return response.iter_lines()
+        return response.content
+
+    def close(self):
+        self._con.close()
+
+
+def async_osbsapi(func):
+    """
+    asynchronous variant of osbs.api.osbsapi
+    """
+    @functools.wraps(func)
+    async def catch_exceptions(*args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        except OsbsException:
+            raise
+        except Exception as ex:
+            raise OsbsException(cause=ex, traceback=sys.exc_info()[2])
+
+    return catch_exceptions
+
+
+class AsyncOSBS(object):
+    """
+    asyncio counterpart of osbs.api.OSBS
+
+    Methods without an asynchronous implementation (like rendering build requests) are
+    available through the wrapped OSBS instance in the 'osbs' attribute.
+    """
+
+    def __init__(self, openshift_configuration, build_configuration):
+        self.osbs = OSBS(openshift_configuration, build_configuration)
+        self.os = AsyncOpenshift(self.osbs.os)
+
+    @async_osbsapi
+    async def list_builds(self, namespace=DEFAULT_NAMESPACE):
+        response = await self.os.list_builds(namespace=namespace)
+        return [BuildResponse(None, build) for build in response.json()["items"]]
+
+    @async_osbsapi
+    async def get_build(self, build_id, namespace=DEFAULT_NAMESPACE):
+        response = await self.os.get_build(build_id, namespace=namespace)
+        return BuildResponse(response)
+
+    @async_osbsapi
+    async def cancel_build(self, build_id, namespace=DEFAULT_NAMESPACE):
+        response = await self.os.cancel_build(build_id, namespace=namespace)
+        return BuildResponse(response)
+
+    @async_osbsapi
+    async def create_build_from_buildrequest(self, build_request, namespace=DEFAULT_NAMESPACE):
+        build_request.set_openshift_required_version(
+            self.osbs.os_conf.get_openshift_required_version())
+        build = build_request.render()
+        response = await self.os.create_build(json.dumps(build), namespace=namespace)
+        return BuildResponse(response)
+
+    @async_osbsapi
+    async def create_build(self, **kwargs):
+        """
+        see OSBS.create_build(); creating a build config involves cloning the git repository
+        and several dependent requests, so it runs in the default executor
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, functools.partial(self.osbs.create_build,
+                                                                  **kwargs))
+
+    @async_osbsapi
+    async def get_build_logs(self, build_id, follow=False, build_json=None,
+                             wait_if_missing=False, namespace=DEFAULT_NAMESPACE):
+        return await self.os.logs(build_id, follow=follow, build_json=build_json,
+                                  wait_if_missing=wait_if_missing, namespace=namespace)
+
+    @async_osbsapi
+    async def wait_for_build_to_finish(self, build_id, namespace=DEFAULT_NAMESPACE):
+        response = await self.os.wait_for_build_to_finish(build_id, namespace=namespace)
+        return BuildResponse(None, response)
+
+    @async_osbsapi
+    async def wait_for_build_to_get_scheduled(self, build_id, namespace=DEFAULT_NAMESPACE):
+        response = await self.os.wait_for_build_to_get_scheduled(build_id, namespace=namespace)
+        return BuildResponse(None, response)
+
+    def watch_builds(self, namespace=DEFAULT_NAMESPACE):
+        """
+        :return: async iterator of (change type, BuildResponse) tuples
+        """
+        return self._watch_builds(namespace)
+
+    async def _watch_builds(self, namespace):
+        async for changetype, obj in self.os.watch_builds(namespace=namespace):
+            yield changetype, BuildResponse(None, obj)
+
+    def close(self):
+        self.os.close()
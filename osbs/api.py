@@ -7,6 +7,7 @@ of the BSD license. See the LICENSE file for details.
 """
 from __future__ import print_function, unicode_literals, absolute_import
 
+import inspect
 import json
 import logging
 import os
@@ -17,31 +18,78 @@ from functools import wraps
 from .constants import SIMPLE_BUILD_TYPE, PROD_WITHOUT_KOJI_BUILD_TYPE, PROD_WITH_SECRET_BUILD_TYPE
 from osbs.build.build_request import BuildManager
 from osbs.build.build_response import BuildResponse
+from osbs.build.build_record import BuildRecord
 from osbs.build.pod_response import PodResponse
-from osbs.constants import DEFAULT_NAMESPACE, PROD_BUILD_TYPE
-from osbs.core import Openshift
+from osbs.build.template_cache import template_cache
+from osbs.constants import (DEFAULT_NAMESPACE, PROD_BUILD_TYPE, BUILD_PENDING_STATES,
+                            BUILD_RUNNING_STATES, BUILD_FINISHED_STATES, DEFAULT_BUILDS_PAGE_SIZE)
+from osbs.core import Openshift, BuildReflector, check_response
 from osbs.exceptions import OsbsException, OsbsValidationException
+from osbs.http import RetryPolicy
 # import utils in this way, so that we can mock standalone functions with flexmock
 from osbs import utils
 
 
+def _convert_exception(ex):
+    # Python 3 has implicit exception chaining and enhanced
+    # reporting, so you get the original traceback as well as
+    # the one originating here.
+    # For Python 2, let's do that explicitly.
+    return OsbsException(cause=ex, traceback=sys.exc_info()[2])
+
+
+def _iterate_within(os_inst, generator, end):
+    """
+    run generator of an API method, every step within the time left until end, so that the
+    deadline applies to the requests of the generator and not to the code consuming it
+
+    :param end: float, time.time() when the deadline passes, None for no deadline
+    """
+    try:
+        while True:
+            try:
+                if end is None:
+                    item = next(generator)
+                else:
+                    with os_inst.deadline(max(0.0, end - time.time())):
+                        item = next(generator)
+            except StopIteration:
+                return
+            except OsbsException:
+                raise
+            except Exception as ex:
+                raise _convert_exception(ex)
+            yield item
+    finally:
+        generator.close()
+
+
 # Decorator for API methods.
 def osbsapi(func):
+    # methods without a timeout argument of their own get one limiting the whole call,
+    # see Openshift.deadline(); for generators it limits the whole iteration
+    code = func.__code__
+    has_timeout = "timeout" in code.co_varnames[:code.co_argcount]
+    is_generator = inspect.isgeneratorfunction(func)
+
     @wraps(func)
     def catch_exceptions(*args, **kwargs):
+        timeout = None if has_timeout else kwargs.pop("timeout", None)
+        if is_generator:
+            # the body runs only once iterated, outside of this call
+            end = None if timeout is None else time.time() + timeout
+            return _iterate_within(args[0].os, func(*args, **kwargs), end)
         try:
-            return func(*args, **kwargs)
+            if timeout is None:
+                return func(*args, **kwargs)
+            with args[0].os.deadline(timeout):
+                return func(*args, **kwargs)
         except OsbsException:
             # Re-raise OsbsExceptions
             raise
         except Exception as ex:
             # Convert anything else to OsbsException
-
-            # Python 3 has implicit exception chaining and enhanced
-            # reporting, so you get the original traceback as well as
-            # the one originating here.
-            # For Python 2, let's do that explicitly.
-            raise OsbsException(cause=ex, traceback=sys.exc_info()[2])
+            raise _convert_exception(ex)
 
     return catch_exceptions
 
@@ -54,12 +102,18 @@ class OSBS(object):
     Note: all API methods return osbs.http.Response object. This is, due to historical
     reasons, untrue for list_builds and get_user, which return list of BuildResponse objects
     and dict respectively.
+
+    API methods accept a timeout argument, seconds the whole call may take, after which they
+    raise OsbsTimeoutException; see Openshift.deadline(). For generators like iter_builds()
+    the time counts from the call until the iteration ends.
     """
     @osbsapi
     def __init__(self, openshift_configuration, build_configuration):
         """ """
         self.os_conf = openshift_configuration
         self.build_conf = build_configuration
+        max_retries = self.os_conf.get_max_retries()
+        retry_policy = RetryPolicy(max_attempts=max_retries + 1) if max_retries else None
         self.os = Openshift(openshift_api_url=self.os_conf.get_openshift_api_uri(),
                             openshift_api_version=self.os_conf.get_openshift_api_version(),
                             openshift_oauth_url=self.os_conf.get_openshift_oauth_api_uri(),
@@ -74,8 +128,19 @@ class OSBS(object):
                             kerberos_principal=self.os_conf.get_kerberos_principal(),
                             kerberos_ccache=self.os_conf.get_kerberos_ccache(),
                             use_auth=self.os_conf.get_use_auth(),
-                            verify_ssl=self.os_conf.get_verify_ssl())
+                            verify_ssl=self.os_conf.get_verify_ssl(),
+                            use_watch_hub=self.os_conf.get_use_watch_hub(),
+                            use_token_cache=self.os_conf.get_use_token_cache(),
+                            token_cache_file=self.os_conf.get_token_cache_file(),
+                            use_compression=self.os_conf.get_use_compression(),
+                            use_http2=self.os_conf.get_use_http2(),
+                            connect_timeout=self.os_conf.get_connect_timeout(),
+                            request_timeout=self.os_conf.get_request_timeout(),
+                            stall_timeout=self.os_conf.get_stall_timeout(),
+                            keepalive=self.os_conf.get_tcp_keepalive(),
+                            retry_policy=retry_policy)
         self._bm = None
+        self._reflectors = {}  # namespace -> BuildReflector
 
     # some calls might not need build manager so let's make it lazy
     @property
@@ -85,20 +150,134 @@ class OSBS(object):
         return self._bm
 
     @osbsapi
-    def list_builds(self, namespace=DEFAULT_NAMESPACE):
-        response = self.os.list_builds(namespace=namespace)
-        serialized_response = response.json()
-        build_list = []
-        for build in serialized_response["items"]:
-            build_list.append(BuildResponse(None, build))
-        return build_list
+    def start_build_reflector(self, namespace=DEFAULT_NAMESPACE, timeout=None):
+        """
+        start keeping a local copy of all builds in namespace; list_builds, get_build and
+        the check for running builds are then answered from it without asking the server
+
+        Build jsons of BuildResponses listed from the copy are shared with it; don't modify
+        them, e.g. by setting BuildResponse.status.
+
+        :param namespace: str
+        :param timeout: float, seconds to wait for the builds to be loaded, None to wait
+                        as long as it takes
+        :return: BuildReflector instance
+        """
+        self.stop_build_reflector(namespace)
+        reflector = BuildReflector(self.os, namespace=namespace)
+        reflector.start()
+        self._reflectors[namespace] = reflector
+        if not reflector.wait_for_sync(timeout) and reflector.error is not None:
+            raise OsbsException("Failed to load builds in namespace '%s'" % namespace,
+                                cause=reflector.error)
+        return reflector
+
+    @osbsapi
+    def stop_build_reflector(self, namespace=DEFAULT_NAMESPACE):
+        reflector = self._reflectors.pop(namespace, None)
+        if reflector is not None:
+            reflector.stop()
+
+    def _get_reflector(self, namespace):
+        reflector = self._reflectors.get(namespace)
+        if reflector is not None and reflector.is_running():
+            return reflector
+        return None
+
+    @osbsapi
+    def list_builds(self, namespace=DEFAULT_NAMESPACE, field_selector=None, labels=None):
+        """
+        :param namespace: str
+        :param field_selector: str, e.g. "status!=Complete", see Openshift.list_builds()
+        :param labels: dict, only builds with all these labels
+        :return: list of BuildResponse instances
+        """
+        reflector = self._get_reflector(namespace)
+        if reflector is not None and field_selector is None:
+            return [BuildResponse(None, build) for build in reflector.list_builds(labels=labels)]
+
+        builds = self.os.iter_builds(namespace=namespace, page_size=None,
+                                     field_selector=field_selector, labels=labels)
+        return [BuildResponse(None, build) for build in builds]
+
+    @osbsapi
+    def iter_builds(self, namespace=DEFAULT_NAMESPACE, page_size=DEFAULT_BUILDS_PAGE_SIZE,
+                    field_selector=None, labels=None):
+        """
+        list builds in namespace as they are fetched, page by page
+
+        :param namespace: str
+        :param page_size: int, number of builds fetched at once
+        :param field_selector: str, e.g. "status!=Complete", see Openshift.list_builds()
+        :param labels: dict, only builds with all these labels
+        :return: generator of BuildResponse instances
+        """
+        for build in self._iter_build_jsons(namespace, page_size, field_selector, labels):
+            yield BuildResponse(None, build)
+
+    def _iter_build_jsons(self, namespace, page_size, field_selector, labels):
+        reflector = self._get_reflector(namespace)
+        if reflector is not None and field_selector is None:
+            return iter(reflector.list_builds(labels=labels))
+        return self.os.iter_builds(namespace=namespace, page_size=page_size,
+                                   field_selector=field_selector, labels=labels)
+
+    @osbsapi
+    def iter_build_records(self, namespace=DEFAULT_NAMESPACE, page_size=DEFAULT_BUILDS_PAGE_SIZE,
+                           field_selector=None, labels=None):
+        """
+        list builds as compact records, each made as soon as its build is received, so that
+        the whole build json doesn't need to be kept
+
+        :param namespace: str
+        :param page_size: int, number of builds fetched at once
+        :param field_selector: str, e.g. "status!=Complete", see Openshift.list_builds()
+        :param labels: dict, only builds with all these labels
+        :return: generator of BuildRecord instances; BuildRecord.full() gets the whole build
+        """
+        fetch = self.get_build
+        for build in self._iter_build_jsons(namespace, page_size, field_selector, labels):
+            yield BuildRecord.from_json(build, namespace=namespace, fetch=fetch)
+
+    @osbsapi
+    def list_build_records(self, namespace=DEFAULT_NAMESPACE, field_selector=None, labels=None):
+        """
+        :param namespace: str
+        :param field_selector: str, e.g. "status!=Complete", see Openshift.list_builds()
+        :param labels: dict, only builds with all these labels
+        :return: list of BuildRecord instances, see iter_build_records()
+        """
+        return list(self.iter_build_records(namespace=namespace, page_size=None,
+                                            field_selector=field_selector, labels=labels))
 
     @osbsapi
     def get_build(self, build_id, namespace=DEFAULT_NAMESPACE):
+        reflector = self._get_reflector(namespace)
+        if reflector is not None:
+            build_json = reflector.get_build(build_id)
+            # the build may be too new to have been seen yet, ask the server then
+            if build_json is not None:
+                return BuildResponse(None, build_json)
+
         response = self.os.get_build(build_id, namespace=namespace)
         build_response = BuildResponse(response)
         return build_response
 
+    @osbsapi
+    def get_builds(self, build_ids, namespace=DEFAULT_NAMESPACE):
+        """
+        get several builds at once, the requests are performed concurrently
+
+        :param build_ids: iterable of str
+        :param namespace: str
+        :return: list of BuildResponse instances, in order of completion
+        """
+        build_list = []
+        for _, response in self.os.get_builds(build_ids, namespace=namespace):
+            check_response(response)
+            build_list.append(BuildResponse(response))
+        return build_list
+
     @osbsapi
     def cancel_build(self, build_id, namespace=DEFAULT_NAMESPACE):
         response = self.os.cancel_build(build_id, namespace=namespace)
@@ -110,10 +289,9 @@ class OSBS(object):
         """
         :return: PodResponse object for pod relating to the build
         """
-        pods = self.os.list_pods(label='openshift.io/build.name=%s' % build_id,
+        pods = self.os.iter_pods(label='openshift.io/build.name=%s' % build_id,
                                  namespace=namespace)
-        serialized_response = pods.json()
-        pod_list = [PodResponse(pod) for pod in serialized_response["items"]]
+        pod_list = [PodResponse(pod) for pod in pods]
         if not pod_list:
             raise OsbsException("No pod for build")
         elif len(pod_list) != 1:
@@ -161,11 +339,19 @@ class OSBS(object):
         return build_response
 
     def _get_running_builds_for_build_config(self, build_config_id, namespace=DEFAULT_NAMESPACE):
-        all_builds_for_bc = self.os.list_builds(
-            build_config_id=build_config_id,
-            namespace=namespace).json()['items']
+        reflector = self._get_reflector(namespace)
+        if reflector is not None:
+            builds = reflector.list_builds(build_config_id=build_config_id,
+                                           phases=BUILD_PENDING_STATES + BUILD_RUNNING_STATES)
+            return [BuildResponse(request=None, build_json=b) for b in builds]
+
+        # leave the finished builds, i.e. most of the history, on the server
+        field_selector = ",".join("status!=%s" % phase.capitalize()
+                                  for phase in BUILD_FINISHED_STATES)
+        builds = self.os.iter_builds(build_config_id=build_config_id, namespace=namespace,
+                                     page_size=None, field_selector=field_selector)
         running = []
-        for b in all_builds_for_bc:
+        for b in builds:
             br = BuildResponse(request=None, build_json=b)
             if br.is_pending() or br.is_running():
                 running.append(br)
@@ -450,7 +636,7 @@ class OSBS(object):
     @osbsapi
     def create_image_stream(self, name, docker_image_repository, namespace=DEFAULT_NAMESPACE):
         img_stream_file = os.path.join(self.os_conf.get_build_json_store(), 'image_stream.json')
-        stream = json.load(open(img_stream_file))
+        stream = template_cache.load(img_stream_file)
         stream['metadata']['name'] = name
         stream['spec']['dockerImageRepository'] = docker_image_repository
         return self.os.create_image_stream(json.dumps(stream), namespace=DEFAULT_NAMESPACE)
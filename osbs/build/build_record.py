@@ -0,0 +1,134 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+from __future__ import print_function, absolute_import, unicode_literals
+
+from osbs.exceptions import OsbsException
+from osbs.utils import graceful_chain_get, get_time_from_rfc3339
+from osbs.constants import BUILD_FINISHED_STATES, BUILD_RUNNING_STATES, \
+    BUILD_SUCCEEDED_STATES, BUILD_FAILED_STATES, BUILD_PENDING_STATES
+
+try:
+    # py3
+    from sys import intern
+except ImportError:
+    # py2 interns only byte strings, but decoded JSON has unicode ones
+    def intern(string):
+        return string
+
+
+def _intern(string):
+    return intern(string) if string is not None else None
+
+
+class BuildRecord(object):
+    """
+    Compact projection of build json: just the fields needed to list builds, the rest of the
+    json isn't kept. Strings shared by many builds (phase, label names and values) are interned.
+
+    Getters mirror those of BuildResponse; full() fetches the whole build.
+    """
+
+    __slots__ = ("name", "namespace", "phase", "image_tag", "created", "started", "completed",
+                 "build_config", "labels", "_fetch")
+
+    def __init__(self, name, namespace=None, phase=None, image_tag=None, created=None,
+                 started=None, completed=None, build_config=None, labels=None, fetch=None):
+        """
+        :param name: str
+        :param namespace: str
+        :param phase: str, lower-case
+        :param image_tag: str
+        :param created: str, creation time, RFC 3339
+        :param started: str, start time, RFC 3339
+        :param completed: str, completion time, RFC 3339
+        :param build_config: str, name of the BuildConfig
+        :param labels: dict
+        :param fetch: callable taking build name and namespace and returning BuildResponse,
+                      used by full()
+        """
+        self.name = name
+        self.namespace = _intern(namespace)
+        self.phase = _intern(phase)
+        self.image_tag = image_tag
+        self.created = created
+        self.started = started
+        self.completed = completed
+        self.build_config = _intern(build_config)
+        self.labels = dict((intern(key), intern(value))
+                           for key, value in (labels or {}).items())
+        self._fetch = fetch
+
+    @classmethod
+    def from_json(cls, build_json, namespace=None, fetch=None):
+        """
+        :param build_json: dict
+        :param namespace: str, used when the json doesn't say
+        :param fetch: callable, see __init__()
+        :return: BuildRecord
+        """
+        metadata = build_json.get("metadata", {})
+        labels = metadata.get("labels") or {}
+        phase = graceful_chain_get(build_json, "status", "phase")
+        return cls(metadata.get("name"),
+                   namespace=metadata.get("namespace", namespace),
+                   phase=phase.lower() if phase else None,
+                   image_tag=graceful_chain_get(build_json, "spec", "output", "to", "name"),
+                   created=metadata.get("creationTimestamp"),
+                   started=graceful_chain_get(build_json, "status", "startTimestamp"),
+                   completed=graceful_chain_get(build_json, "status", "completionTimestamp"),
+                   build_config=(labels.get("buildconfig") or
+                                 graceful_chain_get(build_json, "status", "config", "name")),
+                   labels=labels,
+                   fetch=fetch)
+
+    def __repr__(self):
+        return "BuildRecord(%r, phase=%r)" % (self.name, self.phase)
+
+    def full(self):
+        """
+        get the whole build from the server; it isn't kept by the record
+
+        :return: BuildResponse
+        """
+        if self._fetch is None:
+            raise OsbsException("BuildRecord of '%s' can't fetch the build" % self.name)
+        return self._fetch(self.name, self.namespace)
+
+    @property
+    def status(self):
+        return self.phase
+
+    def is_finished(self):
+        return self.status in BUILD_FINISHED_STATES
+
+    def is_failed(self):
+        return self.status in BUILD_FAILED_STATES
+
+    def is_succeeded(self):
+        return self.status in BUILD_SUCCEEDED_STATES
+
+    def is_running(self):
+        return self.status in BUILD_RUNNING_STATES
+
+    def is_pending(self):
+        return self.status in BUILD_PENDING_STATES
+
+    def get_build_name(self):
+        return self.name
+
+    def get_image_tag(self):
+        return self.image_tag
+
+    def get_time_created(self):
+        return self.created
+
+    def get_time_created_in_seconds(self):
+        return get_time_from_rfc3339(self.created)
+
+    def get_labels(self):
+        return self.labels
@@ -20,6 +20,8 @@ except ImportError:
 
 from osbs.build.manipulate import DockJsonManipulator
 from osbs.build.spec import CommonSpec, ProdSpec, SimpleSpec
+from osbs.build.render_plan import render_plans
+from osbs.build.template_cache import template_cache
 from osbs.constants import PROD_BUILD_TYPE, SIMPLE_BUILD_TYPE, PROD_WITHOUT_KOJI_BUILD_TYPE
 from osbs.constants import PROD_WITH_SECRET_BUILD_TYPE
 from osbs.constants import SECRETS_PATH
@@ -41,6 +43,8 @@ class BuildRequest(object):
     """
 
     key = None
+    # (plugin type, plugin name) of plugins removed from templates without triggers
+    plugins_needing_triggers = ()
 
     def __init__(self, build_json_store):
         """
@@ -109,28 +113,45 @@ class BuildRequest(object):
     def build_id(self):
         return self.build_json['metadata']['name']
 
+    def _load_template_text(self):
+        path = os.path.join(self.build_json_store, "%s.json" % self.key)
+        try:
+            return template_cache.load_text(path)
+        except (IOError, OSError) as ex:
+            raise OsbsException("Can't open template '%s': %s" %
+                                (path, repr(ex)))
+
+    def _load_inner_template_text(self):
+        path = os.path.join(self.build_json_store, "%s_inner.json" % self.key)
+        return template_cache.load_text(path)
+
     @property
     def template(self):
         if self._template is None:
-            path = os.path.join(self.build_json_store, "%s.json" % self.key)
-            logger.debug("loading template from path %s", path)
-            try:
-                with open(path, "r") as fp:
-                    self._template = json.load(fp)
-            except (IOError, OSError) as ex:
-                raise OsbsException("Can't open template '%s': %s" %
-                                    (path, repr(ex)))
+            self._template = json.loads(self._load_template_text())
         return self._template
 
     @property
     def inner_template(self):
         if self._inner_template is None:
-            path = os.path.join(self.build_json_store, "%s_inner.json" % self.key)
-            logger.debug("loading inner template from path %s", path)
-            with open(path, "r") as fp:
-                self._inner_template = json.load(fp)
+            self._inner_template = json.loads(self._load_inner_template_text())
         return self._inner_template
 
+    def _start_render(self):
+        """
+        start from templates prepared by the render plan for this request
+
+        :return: RenderPlan
+        """
+        plan = render_plans.get((self.key, self.build_json_store),
+                                self._load_template_text(),
+                                self._load_inner_template_text(),
+                                self._openshift_required_version,
+                                self.plugins_needing_triggers)
+        self._template, self._inner_template = plan.new_templates()
+        self._dj = None
+        return plan
+
     @property
     def dj(self):
         if self._dj is None:
@@ -174,6 +195,8 @@ class CommonBuild(BuildRequest):
         self.spec.set_params(**kwargs)
 
     def render(self):
+        plan = self._start_render()
+
         # !IMPORTANT! can't be too long: https://github.com/openshift/origin/issues/733
         self.template['metadata']['name'] = self.spec.name.value
 
@@ -189,16 +212,16 @@ class CommonBuild(BuildRequest):
 
         tag_with_registry = self.spec.registry_uri.value + "/" + self.spec.image_tag.value
         self.template['spec']['output']['to']['name'] = tag_with_registry
-        if 'triggers' in self.template['spec']:
+        if plan.has_triggers:
             self.template['spec']['triggers']\
                 [0]['imageChange']['from']['name'] = self.spec.trigger_imagestreamtag.value
 
         if (self.spec.yum_repourls.value is not None and
-                self.dj.dock_json_has_plugin_conf('prebuild_plugins', "add_yum_repo_by_url")):
+                plan.has_plugin('prebuild_plugins', "add_yum_repo_by_url")):
             self.dj.dock_json_set_arg('prebuild_plugins', "add_yum_repo_by_url", "repourls",
                                       self.spec.yum_repourls.value)
 
-        if self.dj.dock_json_has_plugin_conf('prebuild_plugins', 'check_and_set_rebuild'):
+        if plan.has_plugin('prebuild_plugins', 'check_and_set_rebuild'):
             self.dj.dock_json_set_arg('prebuild_plugins', 'check_and_set_rebuild', 'url',
                                       self.spec.openshift_uri.value)
             if self.spec.use_auth.value is not None:
@@ -206,22 +229,9 @@ class CommonBuild(BuildRequest):
                                           'use_auth', self.spec.use_auth.value)
 
         if self.spec.use_auth.value is not None:
-            try:
-                self.dj.dock_json_set_arg('exit_plugins', "store_metadata_in_osv3",
-                                          "use_auth", self.spec.use_auth.value)
-            except RuntimeError:
-                # For compatibility with older osbs.conf files
-                self.dj.dock_json_set_arg('postbuild_plugins', "store_metadata_in_osv3",
-                                          "use_auth", self.spec.use_auth.value)
-
-        # For Origin 1.0.6 we'll use the 'secrets' array; for earlier
-        # versions we'll just use 'sourceSecret'
-        if self._openshift_required_version < [1, 0, 6]:
-            if 'secrets' in self.template['spec']['strategy']['customStrategy']:
-                del self.template['spec']['strategy']['customStrategy']['secrets']
-        else:
-            if 'sourceSecret' in self.template['spec']['source']:
-                del self.template['spec']['source']['sourceSecret']
+            self.dj.dock_json_set_arg(plan.metadata_plugin_type, "store_metadata_in_osv3",
+                                      "use_auth", self.spec.use_auth.value)
+        return plan
 
     def validate_input(self):
         self.spec.validate()
@@ -230,6 +240,11 @@ class CommonBuild(BuildRequest):
 @register_build_class
 class ProductionBuild(CommonBuild):
     key = PROD_BUILD_TYPE
+    # If there are no triggers set, there is no point in running
+    # the check_and_set_rebuild, bump_release, or import_image plugins.
+    plugins_needing_triggers = (("prebuild_plugins", "check_and_set_rebuild"),
+                                ("prebuild_plugins", "bump_release"),
+                                ("postbuild_plugins", "import_image"))
 
     def __init__(self, build_json_store, **kwargs):
         super(ProductionBuild, self).__init__(build_json_store, **kwargs)
@@ -262,7 +277,7 @@ class ProductionBuild(CommonBuild):
     def render(self, validate=True):
         if validate:
             self.spec.validate()
-        super(ProductionBuild, self).render()
+        plan = super(ProductionBuild, self).render()
 
         self.dj.dock_json_set_arg('prebuild_plugins', "distgit_fetch_artefacts",
                                   "command", self.spec.sources_command.value)
@@ -279,24 +294,8 @@ class ProductionBuild(CommonBuild):
         self.dj.dock_json_merge_arg('prebuild_plugins', "add_labels_in_dockerfile",
                                     "labels", implicit_labels)
 
-        try:
-            self.dj.dock_json_set_arg('exit_plugins', "store_metadata_in_osv3",
-                                      "url", self.spec.openshift_uri.value)
-        except RuntimeError:
-            # For compatibility with older osbs.conf files
-            self.dj.dock_json_set_arg('postbuild_plugins', "store_metadata_in_osv3",
-                                      "url", self.spec.openshift_uri.value)
-
-        # If there are no triggers set, there is no point in running
-        # the check_and_set_rebuild, bump_release, or import_image plugins.
-        triggers = self.template['spec'].get('triggers', [])
-        if len(triggers) == 0:
-            for when, which in [("prebuild_plugins", "check_and_set_rebuild"),
-                                ("prebuild_plugins", "bump_release"),
-                                ("postbuild_plugins", "import_image")]:
-                logger.info("removing %s from request because there are no triggers",
-                            which)
-                self.dj.remove_plugin(when, which)
+        self.dj.dock_json_set_arg(plan.metadata_plugin_type, "store_metadata_in_osv3",
+                                  "url", self.spec.openshift_uri.value)
 
         # if there is yum repo specified, don't pick stuff from koji
         if self.spec.yum_repourls.value:
@@ -314,8 +313,7 @@ class ProductionBuild(CommonBuild):
             self.dj.dock_json_set_arg('prebuild_plugins', "koji", "hub", self.spec.kojihub.value)
 
         # If the bump_release plugin is present, configure it
-        if self.dj.dock_json_has_plugin_conf('prebuild_plugins',
-                                             'bump_release'):
+        if plan.has_plugin('prebuild_plugins', 'bump_release'):
             push_url = self.spec.git_push_url.value
 
             if push_url is not None:
@@ -350,7 +348,7 @@ class ProductionBuild(CommonBuild):
         if self.spec.pulp_secret.value:
             name = self.spec.pulp_secret.value
 
-            if 'secrets' in self.template['spec']['strategy']['customStrategy']:
+            if plan.uses_secrets:
                 # origin 1.0.6 and newer
                 pulp_secret_path = os.path.join(SECRETS_PATH, name)
                 logger.info("Configuring pulp secret at %s", pulp_secret_path)
@@ -366,7 +364,7 @@ class ProductionBuild(CommonBuild):
             else:
                 # origin 1.0.5 and earlier
                 logger.info("Configuring pulp secret as sourceSecret")
-                if 'sourceSecret' not in self.template['spec']['source']:
+                if not plan.has_source_secret:
                     raise OsbsValidationException("JSON template does not allow secrets")
 
                 self.template['spec']['source']['sourceSecret']['name'] = name
@@ -376,9 +374,9 @@ class ProductionBuild(CommonBuild):
             self.template['spec']['output']['to']['name'] = self.spec.image_tag.value
         else:
             # Otherwise remove references to the secret
-            if 'sourceSecret' in self.template['spec']['source']:
+            if plan.has_source_secret:
                 del self.template['spec']['source']['sourceSecret']
-            if 'secrets' in self.template['spec']['strategy']['customStrategy']:
+            if plan.uses_secrets:
                 del self.template['spec']['strategy']['customStrategy']['secrets']
 
         # If NFS destination set, use it
@@ -412,7 +410,7 @@ class ProductionBuild(CommonBuild):
 
 
         # Configure the import_image plugin
-        if self.dj.dock_json_has_plugin_conf('postbuild_plugins', 'import_image'):
+        if plan.has_plugin('postbuild_plugins', 'import_image'):
             self.dj.dock_json_set_arg('postbuild_plugins', 'import_image', 'imagestream',
                                       self.spec.imagestream_name.value)
             self.dj.dock_json_set_arg('postbuild_plugins', 'import_image', 'docker_image_repo',
@@ -452,14 +450,9 @@ class SimpleBuild(CommonBuild):
     def render(self, validate=True):
         if validate:
             self.spec.validate()
-        super(SimpleBuild, self).render()
-        try:
-            self.dj.dock_json_set_arg('exit_plugins', "store_metadata_in_osv3", "url",
-                                      self.spec.openshift_uri.value)
-        except RuntimeError:
-            # For compatibility with older osbs.conf files
-            self.dj.dock_json_set_arg('postbuild_plugins', "store_metadata_in_osv3", "url",
-                                      self.spec.openshift_uri.value)
+        plan = super(SimpleBuild, self).render()
+        self.dj.dock_json_set_arg(plan.metadata_plugin_type, "store_metadata_in_osv3", "url",
+                                  self.spec.openshift_uri.value)
 
         self.dj.write_dock_json()
         self.build_json = self.template
@@ -29,6 +29,7 @@ class BuildResponse(object):
         self._json = build_json
         self.request = request
         self._status = None
+        self._decoded_annotations = {}  # name -> value decoded from JSON
 
     @property
     def json(self):
@@ -126,15 +127,25 @@ class BuildResponse(object):
     def get_commit_id(self):
         return graceful_chain_get(self.get_annotations_or_labels(), "commit_id")
 
+    def _get_json_annotation(self, name):
+        """
+        :return: value of the annotation (or label) decoded from JSON, None when it's not set;
+                 decoded once and shared by all callers, so don't modify it
+        """
+        try:
+            return self._decoded_annotations[name]
+        except KeyError:
+            pass
+        value = graceful_chain_get(self.get_annotations_or_labels(), name)
+        decoded = json.loads(value) if value else None
+        self._decoded_annotations[name] = decoded
+        return decoded
+
     def get_repositories(self):
-        repositories_json = graceful_chain_get(self.get_annotations_or_labels(), "repositories")
-        if repositories_json:
-            return json.loads(repositories_json)
+        return self._get_json_annotation("repositories")
 
     def get_tar_metadata(self):
-        tar_md_json = graceful_chain_get(self.get_annotations_or_labels(), "tar_metadata")
-        if tar_md_json:
-            return json.loads(tar_md_json)
+        return self._get_json_annotation("tar_metadata")
 
     def get_tar_metadata_size(self):
         return graceful_chain_get(self.get_tar_metadata(), "size")
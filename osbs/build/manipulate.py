@@ -12,25 +12,53 @@ import copy
 
 
 class DockJsonManipulator(object):
-    """ """
+    """
+    Plugins are looked up by name through an index kept for every plugin type. It follows
+    removals done by remove_plugin(); a plugin list replaced or changed in length elsewhere
+    is indexed again.
+    """
     def __init__(self, build_json, dock_json):
         """ """
         self.build_json = build_json
         self.dock_json = dock_json
+        self._plugin_index = {}  # plugin type -> (plugin list, its length, name -> plugin)
+        self._dock_plugins_env = None  # DOCK_PLUGINS entry of env in build json
+
+    def _get_dock_plugins_env(self):
+        if self._dock_plugins_env is None:
+            env_json = self.build_json['spec']['strategy']['customStrategy']['env']
+            try:
+                for env in env_json:
+                    if env["name"] == "DOCK_PLUGINS":
+                        self._dock_plugins_env = env
+                        break
+                else:
+                    raise RuntimeError("\"env\" misses key DOCK_PLUGINS")
+            except TypeError:
+                raise RuntimeError("\"env\" is not iterable")
+        return self._dock_plugins_env
 
     def get_dock_json(self):
         """ return dock json from existing build json """
-        env_json = self.build_json['spec']['strategy']['customStrategy']['env']
-        try:
-            p = [env for env in env_json if env["name"] == "DOCK_PLUGINS"]
-        except TypeError:
-            raise RuntimeError("\"env\" is not iterable")
-        if len(p) <= 0:
-            raise RuntimeError("\"env\" misses key DOCK_PLUGINS")
-        dock_json_str = p[0]['value']
+        dock_json_str = self._get_dock_plugins_env()['value']
         dock_json = json.loads(dock_json_str)
         return dock_json
 
+    def _get_plugins_by_name(self, plugin_type):
+        """
+        :return: dict, plugin name -> configuration of the first plugin of that name
+        :raises KeyError: when there are no plugins of that type
+        """
+        plugins = self.dock_json[plugin_type]
+        indexed = self._plugin_index.get(plugin_type)
+        if indexed is None or indexed[0] is not plugins or indexed[1] != len(plugins):
+            by_name = {}
+            for plugin in plugins:
+                by_name.setdefault(plugin.get('name', None), plugin)
+            indexed = (plugins, len(plugins), by_name)
+            self._plugin_index[plugin_type] = indexed
+        return indexed[2]
+
     def dock_json_get_plugin_conf(self, plugin_type, plugin_name):
         """
         Return the configuration for a plugin.
@@ -38,17 +66,32 @@ class DockJsonManipulator(object):
         Raises KeyError if there are no plugins of that type.
         Raises IndexError if the named plugin is not listed.
         """
-        match = [x for x in self.dock_json[plugin_type] if x.get('name', None) == plugin_name]
-        return match[0]
+        try:
+            return self._get_plugins_by_name(plugin_type)[plugin_name]
+        except KeyError:
+            if plugin_type not in self.dock_json:
+                raise
+            raise IndexError("no plugin '%s' in %s" % (plugin_name, plugin_type))
 
     def remove_plugin(self, plugin_type, plugin_name):
         """
         if config contains plugin, remove it
         """
-        for p in self.dock_json[plugin_type]:
+        by_name = self._get_plugins_by_name(plugin_type)
+        plugin = by_name.pop(plugin_name, None)
+        if plugin is None:
+            return
+        plugins = self.dock_json[plugin_type]
+        for i, p in enumerate(plugins):
+            if p is plugin:
+                del plugins[i]
+                break
+        # another plugin of the same name takes its place
+        for p in plugins[i:]:
             if p.get('name', None) == plugin_name:
-                self.dock_json[plugin_type].remove(p)
+                by_name[plugin_name] = p
                 break
+        self._plugin_index[plugin_type] = (plugins, len(plugins), by_name)
 
     def dock_json_has_plugin_conf(self, plugin_type, plugin_name):
         """
@@ -88,8 +131,4 @@ class DockJsonManipulator(object):
         plugin_conf['args'][arg_key] = value
 
     def write_dock_json(self):
-        env_json = self.build_json['spec']['strategy']['customStrategy']['env']
-        p = [env for env in env_json if env["name"] == "DOCK_PLUGINS"]
-        if len(p) <= 0:
-            raise RuntimeError("\"env\" misses key DOCK_PLUGINS")
-        p[0]['value'] = json.dumps(self.dock_json)
+        self._get_dock_plugins_env()['value'] = json.dumps(self.dock_json)
@@ -0,0 +1,127 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+from __future__ import print_function, absolute_import, unicode_literals
+
+import json
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class RenderPlan(object):
+    """
+    What rendering makes of a pair of templates regardless of the parameters of a build
+    request: the parts removed for the required openshift version or for the lack of
+    triggers, and the structural facts render() would otherwise probe the templates for
+    (triggers, plugins and where they are, secrets). Compiled once per templates, build
+    type and required openshift version.
+    """
+
+    def __init__(self, template_text, inner_template_text, openshift_required_version,
+                 plugins_needing_triggers=()):
+        """
+        :param template_text: str, build json template
+        :param inner_template_text: str, dock json template
+        :param openshift_required_version: list of int
+        :param plugins_needing_triggers: list of (plugin type, plugin name), plugins removed
+                                         when the template has no triggers
+        """
+        self._sources = (template_text, inner_template_text)
+        template = json.loads(template_text)
+        inner_template = json.loads(inner_template_text)
+
+        spec = template['spec']
+        custom = spec['strategy']['customStrategy']
+        # For Origin 1.0.6 we'll use the 'secrets' array; for earlier
+        # versions we'll just use 'sourceSecret'
+        if openshift_required_version < [1, 0, 6]:
+            custom.pop('secrets', None)
+        else:
+            spec['source'].pop('sourceSecret', None)
+
+        self.has_triggers = 'triggers' in spec
+        if not spec.get('triggers'):
+            for when, which in plugins_needing_triggers:
+                logger.info("removing %s from template because there are no triggers", which)
+                plugins = inner_template[when]
+                for i, plugin in enumerate(plugins):
+                    if plugin.get('name', None) == which:
+                        del plugins[i]
+                        break
+
+        self.uses_secrets = 'secrets' in custom
+        self.has_source_secret = 'sourceSecret' in spec['source']
+        self._plugins = frozenset((plugin_type, plugin.get('name', None))
+                                  for plugin_type, plugins in inner_template.items()
+                                  if isinstance(plugins, list)
+                                  for plugin in plugins)
+        # older osbs.conf files have it among postbuild plugins
+        if self.has_plugin('exit_plugins', 'store_metadata_in_osv3'):
+            self.metadata_plugin_type = 'exit_plugins'
+        else:
+            self.metadata_plugin_type = 'postbuild_plugins'
+
+        self.template_text = json.dumps(template)
+        self.inner_template_text = json.dumps(inner_template)
+
+    def compiled_from(self, template_text, inner_template_text):
+        return self._sources == (template_text, inner_template_text)
+
+    def has_plugin(self, plugin_type, plugin_name):
+        """
+        :return: bool, is the plugin in the template? render() removes some more depending
+                 on the parameters
+        """
+        return (plugin_type, plugin_name) in self._plugins
+
+    def new_templates(self):
+        """
+        :return: tuple, build json and dock json templates, copies owned by the caller
+        """
+        return json.loads(self.template_text), json.loads(self.inner_template_text)
+
+
+class RenderPlanCache(object):
+    """
+    Plans compiled by the process; one is compiled again when its templates change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._plans = {}  # (key, openshift required version) -> RenderPlan
+
+    def get(self, key, template_text, inner_template_text, openshift_required_version,
+            plugins_needing_triggers=()):
+        """
+        :param key: hashable, identifies the templates, e.g. build type and path of the store
+        :param template_text: str, build json template
+        :param inner_template_text: str, dock json template
+        :param openshift_required_version: list of int
+        :param plugins_needing_triggers: list of (plugin type, plugin name), see RenderPlan
+        :return: RenderPlan
+        """
+        cache_key = (key, tuple(openshift_required_version))
+        with self._lock:
+            plan = self._plans.get(cache_key)
+        if plan is None or not plan.compiled_from(template_text, inner_template_text):
+            logger.debug("compiling render plan for %s", cache_key)
+            plan = RenderPlan(template_text, inner_template_text,
+                              list(openshift_required_version), plugins_needing_triggers)
+            with self._lock:
+                self._plans[cache_key] = plan
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+
+# shared by all build requests of the process
+render_plans = RenderPlanCache()
@@ -0,0 +1,73 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+from __future__ import print_function, absolute_import, unicode_literals
+
+import io
+import json
+import logging
+import os
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateCache(object):
+    """
+    Contents of JSON templates, read once per process and again only when a file changes
+    (its modification time, inode or size), so that rendering many build requests from the
+    same store doesn't keep reading the same files.
+
+    The text of the files is kept rather than decoded JSON: decoding it again is as cheap as
+    copying the decoded structure, and every caller gets its own copy to modify.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._files = {}  # path -> (stat key, text)
+
+    @staticmethod
+    def _stat_key(path):
+        st = os.stat(path)
+        return (getattr(st, "st_mtime_ns", st.st_mtime), st.st_ino, st.st_dev, st.st_size)
+
+    def load_text(self, path):
+        """
+        :param path: str, path to a JSON file
+        :return: str, text of the file, the same object until the file changes
+        :raises IOError, OSError: when the file can't be read
+        """
+        key = self._stat_key(path)
+        with self._lock:
+            cached = self._files.get(path)
+        if cached is not None and cached[0] == key:
+            text = cached[1]
+        else:
+            logger.debug("loading template from path %s", path)
+            # stat before reading: a file changed meanwhile is read again next time
+            with io.open(path, "r", encoding="utf-8") as fp:
+                text = fp.read()
+            with self._lock:
+                self._files[path] = (key, text)
+        return text
+
+    def load(self, path):
+        """
+        :param path: str, path to a JSON file
+        :return: decoded JSON, a copy owned by the caller
+        :raises IOError, OSError: when the file can't be read
+        """
+        return json.loads(self.load_text(path))
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+
+
+# shared by all build requests of the process
+template_cache = TemplateCache()
@@ -39,6 +39,30 @@ class IterLinesSaver(object):
             yield line
 
 
+class IterChunksSaver(object):
+    """
+    Wrap HttpStream.iter_chunks() and save the response once it has been read.
+    """
+
+    def __init__(self, path, fn):
+        self.path = path
+        self.fn = fn
+
+    def iter_chunks(self, *args, **kwargs):
+        chunks = []
+        for chunk in self.fn(*args, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+
+        content = "".join(chunks)
+        logger.debug("capturing to %s.json", self.path)
+        with open(self.path + ".json", "w") as outf:
+            try:
+                json.dump(json.loads(content), outf, sort_keys=True, indent=4)
+            except ValueError:
+                outf.write(content)
+
+
 class ResponseSaver(object):
     """
     Wrap HttpSession.request() and save responses.
@@ -67,6 +91,9 @@ class ResponseSaver(object):
             stream = self.fn(url, method, *args, **kwargs)
             stream.iter_lines = IterLinesSaver(path,
                                                stream.iter_lines).iter_lines
+            # lists are read chunk by chunk
+            stream.iter_chunks = IterChunksSaver(path,
+                                                 stream.iter_chunks).iter_chunks
             return stream
         else:
             response = self.fn(url, method, *args, **kwargs)
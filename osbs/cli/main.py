@@ -29,18 +29,33 @@ def print_json_nicely(decoded_json):
     print(json.dumps(decoded_json, indent=2))
 
 
+def print_json_list_nicely(items):
+    """
+    print list the same way print_json_nicely does, item by item as they come
+
+    :param items: iterable of decoded json
+    """
+    separator = "["
+    for item in items:
+        print(separator + "\n  " + json.dumps(item, indent=2).replace("\n", "\n  "), end="")
+        separator = ","
+    print("[]" if separator == "[" else "\n]")
+
+
 def cmd_list_builds(args, osbs):
-    builds = osbs.list_builds(namespace=args.namespace)
+    labels = dict(args.label or [])
     if args.output == 'json':
-        json_output = []
-        for build in builds:
-            json_output.append(build.json)
-        print_json_nicely(json_output)
+        builds = osbs.iter_builds(namespace=args.namespace, field_selector=args.field_selector,
+                                  labels=labels)
+        print_json_list_nicely(build.json for build in builds)
     elif args.output == 'text':
+        builds = osbs.iter_build_records(namespace=args.namespace,
+                                         field_selector=args.field_selector, labels=labels)
         format_str = "{name:48} {status:16} {image:64}"
         print(format_str.format(**{"name": "BUILD ID", "status": "STATUS", "image": "IMAGE NAME"}), file=sys.stderr)
-        for build in sorted(builds,
-                            key=lambda x: x.get_time_created_in_seconds()):
+        # sorting needs all the builds; keep just what gets printed
+        rows = []
+        for build in builds:
             image = build.get_image_tag()
             if args.USER:
                 # image can contain registry - we may have to parse it more intelligently
@@ -52,6 +67,8 @@ def cmd_list_builds(args, osbs):
                 "status": build.status,
                 "image": image
             }
+            rows.append((build.get_time_created_in_seconds(), b))
+        for _, b in sorted(rows, key=lambda row: row[0]):
             print(format_str.format(**b))
 
 
@@ -246,6 +263,19 @@ def str_on_2_unicode_on_3(s):
         return s
 
 
+def key_value_pair(s):
+    """
+    argparse type for KEY=VALUE arguments
+
+    :param s: str
+    :return: tuple, (key, value)
+    """
+    key, sep, value = s.partition("=")
+    if not key or not sep:
+        raise argparse.ArgumentTypeError("expected key=value")
+    return key, value
+
+
 def cli():
     parser = argparse.ArgumentParser(
         description="OpenShift Build Service client"
@@ -261,6 +291,11 @@ def cli():
                                                "(to list all builds in all namespaces, use --namespace=\"\")")
     list_builds_parser.add_argument("USER", help="list builds only for specified username",
                                     nargs="?")
+    list_builds_parser.add_argument("--field-selector", action="store", metavar="SELECTOR",
+                                    help="filter builds on the server, e.g. status!=Complete")
+    list_builds_parser.add_argument("--label", action="append", metavar="KEY=VALUE",
+                                    type=key_value_pair,
+                                    help="list only builds with this label, may be repeated")
     list_builds_parser.set_defaults(func=cmd_list_builds)
 
     watch_build_parser = subparsers.add_parser(str_on_2_unicode_on_3('watch-build'), help='wait till build finishes')
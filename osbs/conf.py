@@ -102,6 +102,19 @@ class Configuration(object):
         else:
             return value
 
+    def _get_seconds(self, key, default=None):
+        """
+        :return: float, number of seconds, None when it is missing (and there is no default)
+                 or set to 0 or 'none'
+        """
+        value = self._get_value(key, self.conf_section, key, can_miss=True, default=default)
+        if value is None or str(value).lower() == "none":
+            return None
+        try:
+            return float(value) or None
+        except ValueError:
+            raise OsbsException("value of '%s' is not a number of seconds: %r" % (key, value))
+
     def get_openshift_required_version(self):
         """
         Get minimum version of openshift we require
@@ -251,6 +264,51 @@ class Configuration(object):
         return self._get_value("verify_ssl", self.conf_section, "verify_ssl",
                                default=True, can_miss=True, is_bool_val=True)
 
+    def get_use_token_cache(self):
+        return self._get_value("use_token_cache", self.conf_section, "use_token_cache",
+                               default=False, can_miss=True, is_bool_val=True)
+
+    def get_token_cache_file(self):
+        return self._get_value("token_cache_file", self.conf_section, "token_cache_file",
+                               can_miss=True)
+
+    def get_use_compression(self):
+        return self._get_value("use_compression", self.conf_section, "use_compression",
+                               default=False, can_miss=True, is_bool_val=True)
+
+    def get_use_http2(self):
+        return self._get_value("use_http2", self.conf_section, "use_http2",
+                               default=False, can_miss=True, is_bool_val=True)
+
+    def get_connect_timeout(self):
+        return self._get_seconds("connect_timeout", default=30)
+
+    def get_request_timeout(self):
+        return self._get_seconds("request_timeout")
+
+    def get_stall_timeout(self):
+        return self._get_seconds("stall_timeout")
+
+    def get_tcp_keepalive(self):
+        keepalive = self._get_seconds("tcp_keepalive", default=60)
+        return None if keepalive is None else int(keepalive)
+
+    def get_max_retries(self):
+        """
+        :return: int, how many times a request failing with a transient error is sent again,
+                 0 for no retries
+        """
+        value = self._get_value("max_retries", self.conf_section, "max_retries",
+                                default=0, can_miss=True)
+        try:
+            return max(0, int(value))
+        except ValueError:
+            raise OsbsException("value of 'max_retries' is not a number: %r" % value)
+
+    def get_use_watch_hub(self):
+        return self._get_value("use_watch_hub", self.conf_section, "use_watch_hub",
+                               default=False, can_miss=True, is_bool_val=True)
+
     def get_build_type(self):
         return self._get_value("build_type", self.conf_section, "build_type")
 
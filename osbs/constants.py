@@ -26,6 +26,13 @@ BUILD_SUCCEEDED_STATES = ["complete"]
 BUILD_PENDING_STATES = ["pending", "new"]
 BUILD_RUNNING_STATES = ["running"]
 
+# builds requested at once when listing them page by page
+DEFAULT_BUILDS_PAGE_SIZE = 500
+
+# Content-Type of PATCH requests
+PATCH_MERGE = "application/merge-patch+json"
+PATCH_STRATEGIC_MERGE = "application/strategic-merge-patch+json"
+
 # Watch response types
 WATCH_ADDED = 'added'
 WATCH_DELETED = 'deleted'
@@ -6,18 +6,27 @@ This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
 from __future__ import print_function, unicode_literals, absolute_import
+import bisect
+import contextlib
+import copy
 import json
 import os
+import random
+import threading
+import time
 
 import logging
+from functools import reduce
 from osbs.kerberos_ccache import kerberos_ccache_init
+from osbs.token_cache import TokenCache
 from osbs.build.build_response import BuildResponse
 from osbs.constants import DEFAULT_NAMESPACE, BUILD_FINISHED_STATES, BUILD_RUNNING_STATES, BUILD_CANCELLED_STATE
+from osbs.constants import DEFAULT_BUILDS_PAGE_SIZE, PATCH_MERGE, PATCH_STRATEGIC_MERGE
 from osbs.constants import WATCH_MODIFIED, WATCH_DELETED, WATCH_ERROR
 from osbs.constants import (SERVICEACCOUNT_SECRET, SERVICEACCOUNT_TOKEN,
                             SERVICEACCOUNT_CACRT)
 from osbs.exceptions import OsbsResponseException, OsbsException, OsbsWatchBuildNotFound, \
-                            OsbsAuthException
+                            OsbsAuthException, OsbsNetworkException, OsbsTimeoutException
 
 try:
     # py2
@@ -30,7 +39,8 @@ except ImportError:
     import urllib.parse as urlparse
     from urllib.parse import urlencode
 
-from .http import HttpSession
+from .http import (HttpSession, JsonItemsDecoder, DEFAULT_MAX_CONCURRENCY,
+                   E_OPERATION_TIMEDOUT)
 
 
 logger = logging.getLogger(__name__)
@@ -49,18 +59,51 @@ def check_response(response):
 
 # TODO: error handling: create function which handles errors in response object
 class Openshift(object):
+    # reconnecting a watch: exponential backoff with jitter, giving up after too many
+    # consecutive failures
+    WATCH_RECONNECT_DELAY = 0.5
+    WATCH_RECONNECT_MAX_DELAY = 30
+    WATCH_MAX_FAILURES = 9
+    # attempts to apply a patch conditional on resourceVersion
+    PATCH_CONFLICT_RETRIES = 3
+    # requests sent again with a new token when the server rejects the old one: idempotent
+    # methods, and PATCH with a merge patch, which is idempotent too
+    REPLAYED_METHODS = ("get", "put", "delete")
+    REPLAYED_PATCH_TYPES = (PATCH_MERGE, PATCH_STRATEGIC_MERGE)
+
     def __init__(self, openshift_api_url, openshift_api_version, openshift_oauth_url,
                  k8s_api_url=None,
                  verbose=False, username=None, password=None, use_kerberos=False,
                  kerberos_keytab=None, kerberos_principal=None, kerberos_ccache=None,
-                 client_cert=None, client_key=None, verify_ssl=True, use_auth=None):
+                 client_cert=None, client_key=None, verify_ssl=True, use_auth=None,
+                 use_watch_hub=False, use_token_cache=False, token_cache_file=None,
+                 use_compression=False, use_http2=False, connect_timeout=None,
+                 request_timeout=None, stall_timeout=None, keepalive=None, retry_policy=None):
         self.os_api_url = openshift_api_url
         self.k8s_api_url = k8s_api_url
         self._os_api_version = openshift_api_version
         self._os_oauth_url = openshift_oauth_url
         self.verbose = verbose
         self.verify_ssl = verify_ssl
-        self._con = HttpSession(verbose=self.verbose)
+        self.use_compression = use_compression
+        self.use_http2 = use_http2
+        # seconds, see HttpSession
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self.stall_timeout = stall_timeout
+        self.keepalive = keepalive
+        # callables getting osbs.http.RequestMetrics of every request
+        self.request_observers = []
+        self._con = HttpSession(verbose=self.verbose, compression=use_compression,
+                                http2=use_http2, observers=self.request_observers,
+                                connect_timeout=connect_timeout, timeout=request_timeout,
+                                stall_timeout=stall_timeout, keepalive=keepalive,
+                                # None: no retries
+                                retry_policy=retry_policy)
+        # deadline() of each thread
+        self._local = threading.local()
+        # share one watch per namespace between all threads waiting for builds
+        self.watch_hub = BuildWatchHub(self) if use_watch_hub else None
 
         # auth stuff
         self.use_kerberos = use_kerberos
@@ -72,6 +115,11 @@ class Openshift(object):
         self.kerberos_principal = kerberos_principal
         self.kerberos_ccache = kerberos_ccache
         self.token = None
+        # the token was obtained through OAuth (and may be cached), not from a service account
+        self._oauth_token = False
+        # only one thread at a time gets a token
+        self._token_lock = threading.RLock()
+        self.token_cache = TokenCache(token_cache_file) if use_token_cache else None
         self.ca = None
         auth_credentials_provided = bool(use_kerberos or
                                          (username and password))
@@ -122,13 +170,56 @@ class Openshift(object):
             url += ("?" + urlencode(query))
         return urlparse.urljoin(self.os_api_url, url)
 
+    @contextlib.contextmanager
+    def deadline(self, timeout):
+        """
+        limit the time all requests made by the current thread within the block may take;
+        once it passes, requests and waiting for builds raise OsbsTimeoutException
+
+        A deadline nested in another one can only make it earlier.
+
+        :param timeout: float, seconds, None for no limit
+        """
+        previous = getattr(self._local, "deadline", None)
+        if timeout is not None:
+            deadline = time.time() + timeout
+            if previous is None or deadline < previous:
+                self._local.deadline = deadline
+        try:
+            yield
+        finally:
+            self._local.deadline = previous
+
+    def time_left(self):
+        """
+        :return: float, seconds until the deadline of the current thread (0 once it has passed),
+                 None when there is no deadline
+        """
+        deadline = getattr(self._local, "deadline", None)
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.time())
+
     def _request_args(self, with_auth=True, **kwargs):
+        time_left = self.time_left()
+        if time_left is not None:
+            if time_left == 0:
+                raise OsbsTimeoutException(None, "deadline exceeded", E_OPERATION_TIMEDOUT)
+            timeout = kwargs.get("timeout")
+            kwargs["timeout"] = time_left if timeout is None else min(timeout, time_left)
+
         headers = kwargs.pop("headers", {})
         if with_auth and self.use_auth:
-            if self.token is None:
-                self.get_oauth_token()
-            if self.token:
-                headers["Authorization"] = "Bearer %s" % self.token
+            # read it once, another thread may replace it meanwhile
+            token = self.token
+            if token is None:
+                with self._token_lock:
+                    # somebody else may have got the token meanwhile
+                    token = self.token
+                    if token is None:
+                        token = self.get_oauth_token()
+            if token:
+                headers["Authorization"] = "Bearer %s" % token
             else:
                 raise OsbsAuthException("Please check your credentials. "
                                         "Token was not retrieved successfully.")
@@ -150,19 +241,129 @@ class Openshift(object):
 
         return headers, kwargs
 
+    def _request(self, method, url, with_auth=True, **kwargs):
+        headers, request_kwargs = self._request_args(with_auth, **kwargs)
+        response = getattr(self._con, method)(url, headers=headers, verify_ssl=self.verify_ssl,
+                                              **request_kwargs)
+        if with_auth and self.use_auth and response.status_code == httplib.UNAUTHORIZED:
+            refreshed = self._token_rejected(headers.get("Authorization"))
+            # the server rejected the request before acting on it, but play it safe
+            if refreshed and self._is_replayed(method, headers):
+                logger.info("replaying %s %s with a new token", method.upper(), url)
+                if request_kwargs.get("stream"):
+                    response.close()
+                headers, request_kwargs = self._request_args(with_auth, **kwargs)
+                response = getattr(self._con, method)(url, headers=headers,
+                                                      verify_ssl=self.verify_ssl,
+                                                      **request_kwargs)
+        return response
+
+    def _is_replayed(self, method, headers):
+        """
+        :return: bool, whether the request may be sent again after a rejected token
+        """
+        if method == "patch":
+            return headers.get("Content-Type") in self.REPLAYED_PATCH_TYPES
+        return method in self.REPLAYED_METHODS
+
     def _post(self, url, with_auth=True, **kwargs):
-        headers, kwargs = self._request_args(with_auth, **kwargs)
-        return self._con.post(url, headers=headers, verify_ssl=self.verify_ssl, **kwargs)
+        return self._request("post", url, with_auth, **kwargs)
 
     def _get(self, url, with_auth=True, **kwargs):
-        headers, kwargs = self._request_args(with_auth, **kwargs)
-        return self._con.get(url, headers=headers, verify_ssl=self.verify_ssl, **kwargs)
+        return self._request("get", url, with_auth, **kwargs)
 
     def _put(self, url, with_auth=True, **kwargs):
-        headers, kwargs = self._request_args(with_auth, **kwargs)
-        return self._con.put(url, headers=headers, verify_ssl=self.verify_ssl, **kwargs)
+        return self._request("put", url, with_auth, **kwargs)
+
+    def _patch(self, url, with_auth=True, **kwargs):
+        return self._request("patch", url, with_auth, **kwargs)
+
+    def _get_many(self, urls, with_auth=True, max_concurrency=DEFAULT_MAX_CONCURRENCY, **kwargs):
+        headers, request_kwargs = self._request_args(with_auth, **kwargs)
+        requests = (dict(url=url, method="get", headers=headers, verify_ssl=self.verify_ssl,
+                         **request_kwargs)
+                    for url in urls)
+        for response in self._con.request_many(requests, max_concurrency=max_concurrency):
+            if with_auth and self.use_auth and response.status_code == httplib.UNAUTHORIZED:
+                # see _request(); the few rejected requests are replayed one by one
+                if self._token_rejected(headers.get("Authorization")):
+                    logger.info("replaying GET %s with a new token", response.url)
+                    response = self._request("get", response.url, with_auth, **kwargs)
+            yield response
+
+    def _get_batch(self, urls_to_keys, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        every url is requested once, so duplicate keys (which map to the same url) yield
+        a single response; a failed request is raised after all the other responses
+        """
+        for response in self._get_many(urls_to_keys.keys(), max_concurrency=max_concurrency):
+            yield urls_to_keys[response.url], response
+
+    def add_request_observer(self, observer):
+        """
+        get timing and size of every request
+
+        :param observer: callable taking osbs.http.RequestMetrics, e.g.
+                         osbs.metrics.EndpointStats
+        """
+        self.request_observers.append(observer)
+
+    def _token_identity(self):
+        """
+        who the OAuth token is obtained for, see get_oauth_token()
+        """
+        if self.username and self.password:
+            return "user:%s" % self.username
+        elif self.use_kerberos:
+            return "kerberos:%s" % (self.kerberos_principal or self.kerberos_ccache or
+                                    os.environ.get("KRB5CCNAME", ""))
+        elif self.client_cert:
+            return "cert:%s" % self.client_cert
+        return "anonymous"
+
+    def _token_rejected(self, authorization):
+        """
+        get a new token after the server rejected one; when many threads get rejected at
+        once, only the first one asks for a new token and the others use it
+
+        :param authorization: str, Authorization header of the rejected request
+        :return: bool, True if there's a new token to retry with
+        """
+        with self._token_lock:
+            if self.token is not None and authorization != "Bearer %s" % self.token:
+                # somebody has already replaced the token
+                return True
+            if not self._oauth_token:
+                # service account token, we can't get another one
+                return False
+            logger.info("token was rejected, getting a new one")
+            if self.token_cache is not None and self.token is not None:
+                token = self.token
+                if isinstance(token, bytes):
+                    token = token.decode("utf-8")
+                self.token_cache.invalidate(self.os_oauth_url, self._token_identity(),
+                                            token=token)
+            # other threads keep using the old token until get_oauth_token() replaces it,
+            # then they end up here and replay with the new one
+            try:
+                token = self.get_oauth_token()
+            except OsbsException as ex:
+                logger.warning("failed to get a new token: %r", ex)
+                token = None
+            if not token:
+                # the next request tries to get one again
+                self.token = None
+            return bool(token)
 
     def get_oauth_token(self):
+        if self.token_cache is not None:
+            token = self.token_cache.get(self.os_oauth_url, self._token_identity())
+            if token:
+                logger.info("using cached token")
+                self.token = token
+                self._oauth_token = True
+                return self.token
+
         url = self.os_oauth_url + "?response_type=token&client_id=openshift-challenging-client"
         if self.use_auth:
             if self.username and self.password:
@@ -196,7 +397,22 @@ class Openshift(object):
         fragment = parsed_url.fragment
         logger.debug("fragment is '%s'", fragment)
         parsed_fragment = urlparse.parse_qs(fragment)
-        self.token = parsed_fragment[b'access_token'][0]
+        # keys are of the same type as the header value
+        if isinstance(fragment, bytes):
+            parsed_fragment = dict((key.decode("utf-8"), values)
+                                   for key, values in parsed_fragment.items())
+        self.token = parsed_fragment['access_token'][0]
+        self._oauth_token = True
+        if self.token_cache is not None:
+            try:
+                expires_in = int(parsed_fragment['expires_in'][0])
+            except (KeyError, ValueError):
+                expires_in = None
+            token = self.token
+            if isinstance(token, bytes):
+                token = token.decode("utf-8")
+            self.token_cache.set(self.os_oauth_url, self._token_identity(), token,
+                                 expires_in=expires_in)
         return self.token
 
     def get_user(self, username="~"):
@@ -221,12 +437,9 @@ class Openshift(object):
                           headers={"Content-Type": "application/json"})
 
     def cancel_build(self, build_id, namespace=DEFAULT_NAMESPACE):
-        response = self.get_build(build_id, namespace=namespace)
-        br = BuildResponse(response)
-        br.status = BUILD_CANCELLED_STATE
         url = self._build_url("namespaces/%s/builds/%s/" % (namespace, build_id))
-        return self._put(url, data=json.dumps(br.json),
-                         headers={"Content-Type": "application/json"})
+        patch = {"status": {"phase": BUILD_CANCELLED_STATE.capitalize()}}
+        return self._patch(url, data=json.dumps(patch), headers={"Content-Type": PATCH_MERGE})
 
     def list_pods(self, label=None, namespace=DEFAULT_NAMESPACE):
         kwargs = {}
@@ -235,12 +448,71 @@ class Openshift(object):
         url = self._build_k8s_url("namespaces/%s/pods/" % namespace, **kwargs)
         return self._get(url)
 
+    def iter_pods(self, label=None, namespace=DEFAULT_NAMESPACE):
+        """
+        list pods, decoding them one by one as they arrive
+
+        :param label: str, label selector
+        :param namespace: str
+        :return: generator of dicts, pod jsons
+        """
+        kwargs = {}
+        if label is not None:
+            kwargs['labelSelector'] = label
+        url = self._build_k8s_url("namespaces/%s/pods/" % namespace, **kwargs)
+        return self._iter_list(url)
+
+    def list_pods_in_namespaces(self, namespaces, label=None,
+                                max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        list pods in several namespaces concurrently
+
+        :param namespaces: iterable of str
+        :param label: str, label selector
+        :param max_concurrency: int, maximum number of requests in flight
+        :return: generator of (namespace, HttpResponse) tuples, in order of completion; one tuple
+                 per distinct namespace, duplicates are requested only once
+        """
+        kwargs = {}
+        if label is not None:
+            kwargs['labelSelector'] = label
+        urls = dict((self._build_k8s_url("namespaces/%s/pods/" % namespace, **kwargs), namespace)
+                    for namespace in namespaces)
+        return self._get_batch(urls, max_concurrency=max_concurrency)
+
     def get_build_config(self, build_config_id, namespace=DEFAULT_NAMESPACE):
         url = self._build_url("namespaces/%s/buildconfigs/%s/" % (namespace, build_config_id))
         response = self._get(url)
         build_config = response.json()
         return build_config
 
+    def iter_build_configs(self, namespace=DEFAULT_NAMESPACE, labels=None):
+        """
+        list build configs, decoding them one by one as they arrive
+
+        :param namespace: str
+        :param labels: dict, only build configs with all these labels
+        :return: generator of dicts, build config jsons
+        """
+        query = self._builds_query(labels=labels)
+        url = self._build_url("namespaces/%s/buildconfigs/" % namespace, **query)
+        return self._iter_list(url)
+
+    def get_build_configs(self, build_config_ids, namespace=DEFAULT_NAMESPACE,
+                          max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        get several build configs concurrently
+
+        :param build_config_ids: iterable of str
+        :param namespace: str
+        :param max_concurrency: int, maximum number of requests in flight
+        :return: generator of (build_config_id, HttpResponse) tuples, in order of completion;
+                 one tuple per distinct id, duplicates are requested only once
+        """
+        urls = dict((self._build_url("namespaces/%s/buildconfigs/%s/" % (namespace, bc_id)), bc_id)
+                    for bc_id in build_config_ids)
+        return self._get_batch(urls, max_concurrency=max_concurrency)
+
     def create_build_config(self, build_config_json, namespace=DEFAULT_NAMESPACE):
         """
         :return:
@@ -315,17 +587,94 @@ class Openshift(object):
             return response.iter_lines()
         return response.content
 
-    def list_builds(self, build_config_id=None, namespace=DEFAULT_NAMESPACE):
+    @staticmethod
+    def _builds_query(build_config_id=None, field_selector=None, labels=None):
+        query = {}
+        if build_config_id is not None:
+            labels = dict(labels or {}, buildconfig=build_config_id)
+        if labels:
+            query['labelSelector'] = ','.join('%s=%s' % (key, value)
+                                              for key, value in sorted(labels.items()))
+        if field_selector is not None:
+            query['fieldSelector'] = field_selector
+        return query
+
+    def list_builds(self, build_config_id=None, namespace=DEFAULT_NAMESPACE, field_selector=None,
+                    labels=None):
         """
+        list builds, filtered by the server
 
-        :return:
+        :param build_config_id: str, only builds of this BuildConfig
+        :param namespace: str
+        :param field_selector: str, e.g. "status!=Complete" (builds can be selected by
+                               "status", which is their phase, and "podName")
+        :param labels: dict, only builds with all these labels
+        :return: HttpResponse
         """
-        query = {}
-        if build_config_id is not None:
-            query['labelSelector'] = '%s=%s' % ('buildconfig', build_config_id)
+        query = self._builds_query(build_config_id, field_selector, labels)
         url = self._build_url("namespaces/%s/builds/" % namespace, **query)
         return self._get(url)
 
+    def iter_builds(self, build_config_id=None, namespace=DEFAULT_NAMESPACE,
+                    page_size=DEFAULT_BUILDS_PAGE_SIZE, field_selector=None, labels=None):
+        """
+        list builds page by page, using limit and continue tokens of the API; servers which
+        don't support them send all builds in the first page
+
+        :param build_config_id: str, only builds of this BuildConfig
+        :param namespace: str
+        :param page_size: int, number of builds per request, None to get all of them at once
+        :param field_selector: str, see list_builds()
+        :param labels: dict, only builds with all these labels
+        :return: generator of dicts, build jsons
+
+        The server forgets continue tokens after a while (410 Gone), e.g. when the builds are
+        consumed slowly; the list then starts over, skipping builds which were yielded already.
+        """
+        query = {"limit": page_size} if page_size else {}
+        query.update(self._builds_query(build_config_id, field_selector, labels))
+        seen = set()  # names of the builds yielded, in case the list has to start over
+        while True:
+            page = {}
+            url = self._build_url("namespaces/%s/builds/" % namespace, **query)
+            try:
+                for build in self._iter_list(url, document=page):
+                    if page_size:
+                        name = build.get("metadata", {}).get("name")
+                        if name in seen:
+                            continue
+                        seen.add(name)
+                    yield build
+            except OsbsResponseException as ex:
+                if ex.status_code != httplib.GONE or "continue" not in query:
+                    raise
+                logger.info("continue token of builds in namespace '%s' expired, "
+                            "listing them again", namespace)
+                del query["continue"]
+                continue
+            continue_token = page.get("metadata", {}).get("continue")
+            if not continue_token:
+                return
+            query["continue"] = continue_token
+
+    def _iter_list(self, url, document=None):
+        """
+        get a list of objects, decoding the items one by one as they arrive, so that just one
+        of them is held in memory rather than the whole response
+
+        :param url: str
+        :param document: dict, filled with the other keys of the list, e.g. metadata, once all
+                         items have been read
+        :return: generator of dicts
+        """
+        decoder = JsonItemsDecoder()
+        with self._get(url, stream=True) as response:
+            check_response(response)
+            for item in decoder.iter_items(response.iter_chunks()):
+                yield item
+        if document is not None:
+            document.update(decoder.document)
+
     def get_build(self, build_id, namespace=DEFAULT_NAMESPACE):
         """
 
@@ -336,6 +685,92 @@ class Openshift(object):
         check_response(response)
         return response
 
+    def get_builds(self, build_ids, namespace=DEFAULT_NAMESPACE,
+                   max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        get several builds concurrently
+
+        :param build_ids: iterable of str
+        :param namespace: str
+        :param max_concurrency: int, maximum number of requests in flight
+        :return: generator of (build_id, HttpResponse) tuples, in order of completion; one tuple
+                 per distinct id, duplicates are requested only once
+        """
+        urls = dict((self._build_url("namespaces/%s/builds/%s/" % (namespace, build_id)), build_id)
+                    for build_id in build_ids)
+        return self._get_batch(urls, max_concurrency=max_concurrency)
+
+    def watch(self, path, relist=None, resource_version=None):
+        """
+        watch objects, resuming from the last seen resourceVersion when the stream ends or
+        the connection drops
+
+        :param path: str, watch URL relative to the API URL, e.g. "watch/namespaces/default/builds/"
+        :param relist: callable returning (list of objects, resourceVersion of the list); used to
+                       catch up when the server no longer remembers our resourceVersion (410 Gone)
+        :param resource_version: str, report only changes newer than this
+        :return: generator of (change type, object) tuples
+        """
+        failures = 0
+        while True:
+            query = {}
+            if resource_version:
+                query["resourceVersion"] = resource_version
+            url = self._build_url(path, **query)
+            try:
+                # the loop reconnects on its own
+                with self._get(url, stream=True, headers={'Connection': 'close'},
+                               retry=False) as response:
+                    check_response(response)
+                    for line in response.iter_lines():
+                        j = json.loads(line)
+                        logger.debug(line)
+                        changetype = j.get("type", "").lower()
+                        obj = j.get("object", None)
+                        if obj is None:
+                            logger.error("'object' is None")
+                            continue
+                        if changetype == WATCH_ERROR:
+                            # Status object, e.g. 410 when resourceVersion is too old
+                            raise OsbsResponseException(obj.get("message", "watch failed"),
+                                                        obj.get("code"))
+                        failures = 0
+                        resource_version = obj.get("metadata", {}).get("resourceVersion",
+                                                                       resource_version)
+                        yield changetype, obj
+            except OsbsResponseException as ex:
+                if ex.status_code == httplib.GONE:
+                    logger.info("resourceVersion %s is gone, listing again", resource_version)
+                    resource_version = None
+                    if relist is not None:
+                        objs, resource_version = relist()
+                        for obj in objs:
+                            yield WATCH_MODIFIED, obj
+                    continue
+                if ex.status_code is not None and ex.status_code < 500:
+                    raise
+                failures += 1
+                if failures > self.WATCH_MAX_FAILURES:
+                    raise
+                logger.warning("watch failed (%d/%d): %r", failures, self.WATCH_MAX_FAILURES, ex)
+            except OsbsNetworkException as ex:
+                failures += 1
+                # a stalled connection is worth another try, an exceeded deadline isn't
+                if failures > self.WATCH_MAX_FAILURES or self.time_left() == 0:
+                    raise
+                logger.warning("watch failed (%d/%d): %r", failures, self.WATCH_MAX_FAILURES, ex)
+            else:
+                logger.debug("watch stream ended, resuming from resourceVersion %s",
+                             resource_version)
+
+            # full jitter keeps many clients from reconnecting in lockstep
+            delay = random.uniform(0, min(self.WATCH_RECONNECT_MAX_DELAY,
+                                          self.WATCH_RECONNECT_DELAY * 2 ** failures))
+            time_left = self.time_left()
+            if time_left is not None:
+                delay = min(delay, time_left)
+            time.sleep(delay)
+
     def wait(self, build_id, states, namespace=DEFAULT_NAMESPACE):
         """
         :param build_id: wait for build to finish
@@ -343,63 +778,51 @@ class Openshift(object):
         :return:
         """
         logger.info("watching build '%s'", build_id)
-        url = self._build_url("watch/namespaces/%s/builds/%s/" % (namespace, build_id))
-        with self._get(url, stream=True, headers={'Connection': 'close'}) as response:
-            check_response(response)
-            for line in response.iter_lines():
-                j = json.loads(line)
-                logger.debug(line)
-                obj = j.get("object", None)
-                if obj is None:
-                    logger.error("'object' is None")
-                    continue
-                try:
-                    obj_name = obj["metadata"]["name"]
-                except KeyError:
-                    logger.error("'object' doesn't have any name")
-                    continue
-                try:
-                    obj_status = obj["status"]["phase"]
-                except KeyError:
-                    logger.error("'object' doesn't have any status")
-                    continue
-                else:
-                    obj_status_lower = obj_status.lower()
-                logger.info("object has changed: '%s', status: '%s', name: '%s'",
-                            j['type'], obj_status, obj_name)
-                if obj_name == build_id:
-                    logger.info("matching build found")
-                    logger.debug("is %s in %s?", repr(obj_status_lower), states)
-                    if obj_status_lower in states:
-                        logger.debug("Yes, build is in the state I'm waiting for.")
-                        return obj
-                    else:
-                        logger.debug("No, build is not in the state I'm "
-                                     "waiting for.")
-                else:
-                    logger.info("The build %r isn't me %r", obj_name, build_id)
-
-        # I'm not sure how we can end up here since there are two possible scenarios:
-        #   1. our object was found and we are returning in the loop
-        #   2. our object was not found and we keep waiting (in the loop)
-        # Therefore, let's raise here
-        logger.error("build '%s' was not found during wait", build_id)
-        check_response(response)
-        raise OsbsWatchBuildNotFound("build '%s' was not found and response stream ended" % build_id)
 
-    def wait_for_build_to_finish(self, build_id, namespace=DEFAULT_NAMESPACE):
-        for retry in range(1, 10):
+        def relist():
+            build_json = self.get_build(build_id, namespace=namespace).json()
+            return [build_json], build_json["metadata"].get("resourceVersion")
+
+        path = "watch/namespaces/%s/builds/%s/" % (namespace, build_id)
+        for changetype, obj in self.watch(path, relist=relist):
+            try:
+                obj_name = obj["metadata"]["name"]
+            except KeyError:
+                logger.error("'object' doesn't have any name")
+                continue
+            if obj_name != build_id:
+                logger.info("The build %r isn't me %r", obj_name, build_id)
+                continue
+            if changetype == WATCH_DELETED:
+                logger.error("build '%s' was deleted during wait", build_id)
+                raise OsbsWatchBuildNotFound("build '%s' was deleted" % build_id)
             try:
-                build_response = self.wait(build_id, BUILD_FINISHED_STATES,
-                                           namespace)
-                return build_response
-            except OsbsWatchBuildNotFound:
-                # this is woraround for https://github.com/openshift/origin/issues/2348
-                logger.error("I'm going to wait again. Retry #%d.", retry)
+                obj_status = obj["status"]["phase"]
+            except KeyError:
+                logger.error("'object' doesn't have any status")
                 continue
-        raise OsbsException("Failed to wait for a build: %s" % build_id)
+            else:
+                obj_status_lower = obj_status.lower()
+            logger.info("object has changed: '%s', status: '%s', name: '%s'",
+                        changetype, obj_status, obj_name)
+            logger.debug("is %s in %s?", repr(obj_status_lower), states)
+            if obj_status_lower in states:
+                logger.debug("Yes, build is in the state I'm waiting for.")
+                return obj
+            else:
+                logger.debug("No, build is not in the state I'm waiting for.")
+
+    def wait_for_build_to_finish(self, build_id, namespace=DEFAULT_NAMESPACE):
+        if self.watch_hub is not None:
+            return self.watch_hub.wait(build_id, BUILD_FINISHED_STATES, namespace=namespace)
+
+        return self.wait(build_id, BUILD_FINISHED_STATES, namespace)
 
     def wait_for_build_to_get_scheduled(self, build_id, namespace=DEFAULT_NAMESPACE):
+        if self.watch_hub is not None:
+            return self.watch_hub.wait(build_id, BUILD_FINISHED_STATES + BUILD_RUNNING_STATES,
+                                       namespace=namespace)
+
         build_response = self.wait(build_id, BUILD_FINISHED_STATES + BUILD_RUNNING_STATES,
                                    namespace)
         return build_response
@@ -432,9 +855,33 @@ class Openshift(object):
         """
         url = self._build_url("namespaces/%s/%s/%s" % (namespace, collection,
                                                        name))
-        build_json = self._get(url).json()
-        how(build_json['metadata'], things, values)
-        response = self._put(url, data=json.dumps(build_json), use_json=True)
+        headers = {"Content-Type": PATCH_MERGE}
+        if how == self._update_metadata_things:
+            # a merge patch adds and overwrites keys, no need to know the current values
+            patch = {"metadata": {things: values}}
+            response = self._patch(url, data=json.dumps(patch), headers=headers)
+            check_response(response)
+            return response
+
+        for attempt in range(1, self.PATCH_CONFLICT_RETRIES + 1):
+            response = self._get(url)
+            check_response(response)
+            metadata = response.json()['metadata']
+            current = metadata.get(things) or {}
+            adjusted = {things: dict(current)}
+            how(adjusted, things, values)
+            # null removes the key
+            changes = dict((key, None) for key in current if key not in adjusted[things])
+            changes.update((key, value) for key, value in adjusted[things].items()
+                           if current.get(key) != value)
+            # the patch is rejected with 409 Conflict if the object changed meanwhile
+            patch = {"metadata": {things: changes,
+                                  "resourceVersion": metadata["resourceVersion"]}}
+            response = self._patch(url, data=json.dumps(patch), headers=headers)
+            if response.status_code != httplib.CONFLICT:
+                break
+            logger.info("%s '%s' changed while adjusting %s (attempt %d/%d)",
+                        collection, name, things, attempt, self.PATCH_CONFLICT_RETRIES)
         check_response(response)
         return response
 
@@ -561,6 +1008,340 @@ class Openshift(object):
                         break
 
 
+class _BuildWaiter(object):
+    """
+    one thread waiting for a build to get to one of the states
+    """
+
+    def __init__(self, build_id, states):
+        self.build_id = build_id
+        self.states = states
+        self.result = None
+        self.error = None
+        self._event = threading.Event()
+
+    def feed(self, obj):
+        try:
+            obj_status = obj["status"]["phase"].lower()
+        except KeyError:
+            logger.error("'object' doesn't have any status")
+            return
+        logger.debug("is %s in %s?", repr(obj_status), self.states)
+        if obj_status in self.states and not self._event.is_set():
+            self.result = obj
+            self._event.set()
+
+    def fail(self, error):
+        if not self._event.is_set():
+            self.error = error
+            self._event.set()
+
+    def wait(self, timeout=None):
+        """
+        :param timeout: float, seconds to wait at most, None for no limit
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        # waiting with a timeout keeps the thread responsive to KeyboardInterrupt on python 2;
+        # Event.wait() returns None on python 2.6, so ask is_set()
+        while True:
+            self._event.wait(1 if deadline is None else min(1, max(0, deadline - time.time())))
+            if self._event.is_set():
+                break
+            if deadline is not None and time.time() >= deadline:
+                raise OsbsTimeoutException(None, "build '%s' didn't get to any of %s in time" %
+                                           (self.build_id, self.states), E_OPERATION_TIMEDOUT)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _NamespaceBuildWatch(threading.Thread):
+    """
+    thread reading the build watch of one namespace and handing events over to the waiters
+    """
+
+    def __init__(self, hub, namespace):
+        super(_NamespaceBuildWatch, self).__init__(name="build-watch-%s" % namespace)
+        self.daemon = True
+        self.hub = hub
+        self.namespace = namespace
+        self.stopping = False
+
+    def _relist(self):
+        response = self.hub.os.list_builds(namespace=self.namespace)
+        check_response(response)
+        builds = response.json()
+        return builds.get("items", []), builds.get("metadata", {}).get("resourceVersion")
+
+    def run(self):
+        path = "watch/namespaces/%s/builds/" % self.namespace
+        try:
+            for changetype, obj in self.hub.os.watch(path, relist=self._relist):
+                if self.stopping:
+                    return
+                self.hub._dispatch(self.namespace, changetype, obj)
+        except Exception as ex:  # pylint: disable=broad-except
+            if self.stopping:
+                return
+            logger.warning("watching builds in namespace '%s' failed: %r", self.namespace, ex)
+            self.hub._fail_namespace(self, ex)
+
+
+class BuildWatchHub(object):
+    """
+    Share one build watch per namespace between all threads waiting for builds
+
+    A watch is started when the first thread starts waiting for a build in a namespace and it is
+    stopped once nobody waits for builds in that namespace.
+    """
+
+    def __init__(self, openshift):
+        """
+        :param openshift: instance of Openshift
+        """
+        self.os = openshift
+        self._lock = threading.Lock()
+        self._watches = {}  # namespace -> _NamespaceBuildWatch
+        self._waiters = {}  # (namespace, build id) -> list of _BuildWaiter
+
+    def _subscribe(self, namespace, waiter):
+        with self._lock:
+            self._waiters.setdefault((namespace, waiter.build_id), []).append(waiter)
+            watch = self._watches.get(namespace)
+            if watch is None or watch.stopping:
+                watch = _NamespaceBuildWatch(self, namespace)
+                self._watches[namespace] = watch
+                watch.start()
+
+    def _unsubscribe(self, namespace, waiter):
+        with self._lock:
+            key = (namespace, waiter.build_id)
+            waiters = self._waiters.get(key, [])
+            if waiter in waiters:
+                waiters.remove(waiter)
+            if not waiters:
+                self._waiters.pop(key, None)
+            if not any(ns == namespace for ns, _ in self._waiters):
+                watch = self._watches.pop(namespace, None)
+                if watch is not None:
+                    # the thread finishes once it reads next event or the stream ends
+                    watch.stopping = True
+
+    def _dispatch(self, namespace, changetype, obj):
+        try:
+            obj_name = obj["metadata"]["name"]
+        except KeyError:
+            logger.error("'object' doesn't have any name")
+            return
+        with self._lock:
+            waiters = list(self._waiters.get((namespace, obj_name), []))
+        if not waiters:
+            return
+
+        logger.info("object has changed: '%s', name: '%s'", changetype, obj_name)
+        for waiter in waiters:
+            if changetype == WATCH_DELETED:
+                waiter.fail(OsbsWatchBuildNotFound("build '%s' was deleted" % obj_name))
+            else:
+                waiter.feed(obj)
+
+    def _fail_namespace(self, watch, error):
+        with self._lock:
+            if self._watches.get(watch.namespace) is watch:
+                del self._watches[watch.namespace]
+            waiters = [waiter
+                       for (ns, _), waiters in self._waiters.items() if ns == watch.namespace
+                       for waiter in waiters]
+        for waiter in waiters:
+            waiter.fail(OsbsException("Failed to watch builds in namespace '%s'" %
+                                      watch.namespace, cause=error))
+
+    def wait(self, build_id, states, namespace=DEFAULT_NAMESPACE):
+        """
+        wait for build to get to one of the states
+
+        :param build_id: str
+        :param states: list of str, lower-case build phases
+        :param namespace: str
+        :return: dict, build json
+        """
+        logger.info("waiting for build '%s' to get to one of %s", build_id, states)
+        waiter = _BuildWaiter(build_id, states)
+        self._subscribe(namespace, waiter)
+        try:
+            # the watch only reports changes: the build may already be where we want it
+            try:
+                waiter.feed(self.os.get_build(build_id, namespace=namespace).json())
+            except OsbsResponseException as ex:
+                if ex.status_code != 404:
+                    raise
+                logger.info("build '%s' doesn't exist yet", build_id)
+            return waiter.wait(self.os.time_left())
+        finally:
+            self._unsubscribe(namespace, waiter)
+
+
+class BuildReflector(object):
+    """
+    Keep an in-memory copy of all builds in a namespace
+
+    Builds are listed once and then kept up to date by a watch, so lookups are answered
+    locally. Builds are indexed by their buildconfig label, by phase and by creation time.
+    """
+
+    def __init__(self, openshift, namespace=DEFAULT_NAMESPACE):
+        """
+        :param openshift: instance of Openshift
+        :param namespace: str
+        """
+        self.os = openshift
+        self.namespace = namespace
+        self.error = None
+        self._lock = threading.Lock()
+        self._synced = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._builds = {}  # name -> build json
+        self._by_build_config = {}  # buildconfig label -> set of names
+        self._by_phase = {}  # lower-case phase -> set of names
+        self._by_creation = []  # sorted list of (creationTimestamp, name)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run,
+                                        name="build-reflector-%s" % self.namespace)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        # the thread finishes once it reads next event or the stream ends
+        self._stopping = True
+
+    def wait_for_sync(self, timeout=None):
+        """
+        wait until the initial list of builds is loaded
+
+        :param timeout: float, seconds
+        :return: bool, True when the reflector is running
+        """
+        self._synced.wait(timeout)
+        return self.is_running()
+
+    def is_running(self):
+        """
+        :return: bool, True if the copy of the builds is current
+        """
+        return (self._synced.is_set() and not self._stopping and self.error is None and
+                self._thread is not None and self._thread.is_alive())
+
+    def _run(self):
+        path = "watch/namespaces/%s/builds/" % self.namespace
+        try:
+            _, resource_version = self._list()
+            self._synced.set()
+            for changetype, obj in self.os.watch(path, relist=self._list,
+                                                 resource_version=resource_version):
+                if self._stopping:
+                    return
+                with self._lock:
+                    name = obj["metadata"]["name"]
+                    self._remove(name)
+                    if changetype != WATCH_DELETED:
+                        self._add(obj)
+        except Exception as ex:  # pylint: disable=broad-except
+            if not self._stopping:
+                logger.error("reflector of builds in namespace '%s' failed: %r",
+                             self.namespace, ex)
+                self.error = ex
+        finally:
+            # don't leave anyone waiting for a sync which isn't going to happen
+            self._synced.set()
+
+    def _list(self):
+        """
+        replace the whole store with the current list of builds
+
+        :return: (empty list, resourceVersion of the list), see Openshift.watch()
+        """
+        response = self.os.list_builds(namespace=self.namespace)
+        check_response(response)
+        builds = response.json()
+        with self._lock:
+            self._builds = {}
+            self._by_build_config = {}
+            self._by_phase = {}
+            self._by_creation = []
+            for obj in builds.get("items", []):
+                self._add(obj)
+        # the store is current already, nothing to replay
+        return [], builds.get("metadata", {}).get("resourceVersion")
+
+    @staticmethod
+    def _keys(obj):
+        metadata = obj.get("metadata", {})
+        return (metadata.get("labels", {}).get("buildconfig"),
+                obj.get("status", {}).get("phase", "").lower(),
+                (metadata.get("creationTimestamp", ""), metadata["name"]))
+
+    def _add(self, obj):
+        build_config, phase, created = self._keys(obj)
+        self._builds[obj["metadata"]["name"]] = obj
+        self._by_build_config.setdefault(build_config, set()).add(created[1])
+        self._by_phase.setdefault(phase, set()).add(created[1])
+        bisect.insort(self._by_creation, created)
+
+    def _remove(self, name):
+        obj = self._builds.pop(name, None)
+        if obj is None:
+            return
+        build_config, phase, created = self._keys(obj)
+        self._by_build_config[build_config].discard(name)
+        self._by_phase[phase].discard(name)
+        index = bisect.bisect_left(self._by_creation, created)
+        if index < len(self._by_creation) and self._by_creation[index] == created:
+            del self._by_creation[index]
+
+    def get_build(self, build_id):
+        """
+        :param build_id: str
+        :return: dict, build json (a copy), or None when the build is not known
+        """
+        with self._lock:
+            obj = self._builds.get(build_id)
+            return copy.deepcopy(obj) if obj is not None else None
+
+    def list_builds(self, build_config_id=None, phases=None, created_since=None, labels=None):
+        """
+        :param build_config_id: str, only builds with this buildconfig label
+        :param phases: list of str, only builds in one of these lower-case phases
+        :param created_since: str, only builds created at this time or later,
+                              e.g. "2016-01-31T12:00:00Z"
+        :param labels: dict, only builds with all these labels
+        :return: list of dicts, build jsons ordered by creation time; these are the objects
+                 of the store, not copies, so they must not be modified
+        """
+        with self._lock:
+            names = None
+            if build_config_id is not None:
+                names = set(self._by_build_config.get(build_config_id, ()))
+            if phases is not None:
+                in_phases = set()
+                for phase in phases:
+                    in_phases.update(self._by_phase.get(phase, ()))
+                names = in_phases if names is None else names & in_phases
+            start = 0
+            if created_since is not None:
+                start = bisect.bisect_left(self._by_creation, (created_since, ""))
+            builds = (self._builds[name] for _, name in self._by_creation[start:]
+                      if names is None or name in names)
+            if labels:
+                builds = (build for build in builds
+                          if all(build["metadata"].get("labels", {}).get(key) == value
+                                 for key, value in labels.items()))
+            # the store replaces builds rather than changing them, so they stay consistent
+            # after the lock is released
+            return list(builds)
+
+
 if __name__ == '__main__':
     o = Openshift(openshift_api_url="https://localhost:8443/oapi/v1/",
                   openshift_api_version="v1",
@@ -65,6 +65,10 @@ class OsbsNetworkException(OsbsException):
         self.status_code = status_code
 
 
+class OsbsTimeoutException(OsbsNetworkException):
+    """ request timed out, stalled or outlived its deadline """
+
+
 class OsbsAuthException(OsbsException):
     pass
 
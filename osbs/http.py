@@ -19,26 +19,43 @@ from __future__ import print_function, absolute_import, unicode_literals
 import re
 import sys
 import json
+import math
+import random
 import time
 import codecs
 import logging
+import threading
+from collections import deque
+from email.utils import parsedate_tz, mktime_tz
 from io import BytesIO
 
 import pycurl
 
-from osbs.exceptions import OsbsException, OsbsNetworkException, OsbsResponseException
+from osbs.exceptions import (OsbsException, OsbsNetworkException, OsbsResponseException,
+                             OsbsTimeoutException)
 
 try:
     # py2
     import httplib
+    import urlparse
 except ImportError:
     # py3
     import http.client as httplib
+    import urllib.parse as urlparse
 
 
 logger = logging.getLogger(__name__)
 
-SELECT_TIMEOUT = 9999
+# longest single wait for activity on a connection; curl usually asks for a shorter one
+SELECT_TIMEOUT = 1.0
+# how long to wait for activity on any of the connections of a batch
+BATCH_SELECT_TIMEOUT = 1.0
+DEFAULT_MAX_CONCURRENCY = 10
+# how many idle curl handles to keep around for every host
+DEFAULT_POOL_MAX_PER_HOST = 4
+# old pycurl: E_OPERATION_TIMEOUTED, new pycurl: E_OPERATION_TIMEDOUT
+E_OPERATION_TIMEDOUT = getattr(pycurl, "E_OPERATION_TIMEDOUT",
+                               getattr(pycurl, "E_OPERATION_TIMEOUTED", None))
 PYCURL_NETWORK_CODES = [pycurl.E_BAD_CONTENT_ENCODING,
                         pycurl.E_BAD_DOWNLOAD_RESUME,
                         pycurl.E_CONV_FAILED,
@@ -47,12 +64,12 @@ PYCURL_NETWORK_CODES = [pycurl.E_BAD_CONTENT_ENCODING,
                         pycurl.E_COULDNT_RESOLVE_HOST,
                         pycurl.E_COULDNT_RESOLVE_PROXY,
                         pycurl.E_FILESIZE_EXCEEDED,
+                        pycurl.E_GOT_NOTHING,
                         pycurl.E_HTTP_POST_ERROR,
                         pycurl.E_HTTP_RANGE_ERROR,
                         pycurl.E_HTTP_RETURNED_ERROR,
                         pycurl.E_LOGIN_DENIED,
-                        # old pycurl: E_OPERATION_TIMEOUTED, new pycurl: E_OPERATION_TIMEDOUT
-                        getattr(pycurl, "E_OPERATION_TIMEDOUT", "E_OPERATION_TIMEOUTED"),
+                        E_OPERATION_TIMEDOUT,
                         pycurl.E_PARTIAL_FILE,
                         pycurl.E_READ_ERROR,
                         pycurl.E_RECV_ERROR,
@@ -71,6 +88,47 @@ PYCURL_NETWORK_CODES = [pycurl.E_BAD_CONTENT_ENCODING,
 PYCURL_NETWORK_CODES = [x for x in PYCURL_NETWORK_CODES if x is not None]
 
 
+def network_exception(url, message, code, *args, **kwargs):
+    """
+    :return: OsbsNetworkException for curl error code, OsbsTimeoutException when the request
+             timed out or stalled
+    """
+    if code == E_OPERATION_TIMEDOUT:
+        return OsbsTimeoutException(url, message, code, *args, **kwargs)
+    return OsbsNetworkException(url, message, code, *args, **kwargs)
+
+
+def wait_for_activity(curl_multi, max_timeout):
+    """
+    wait until there is something to do for curl_multi.perform()
+
+    :param curl_multi: pycurl.CurlMulti
+    :param max_timeout: float, seconds to wait at most
+    """
+    # curl knows best how long we may wait, e.g. until one of its timeouts expires
+    timeout = curl_multi.timeout()
+    if timeout == 0:
+        return
+    if timeout < 0:
+        timeout = max_timeout
+    else:
+        timeout = min(timeout / 1000.0, max_timeout)
+
+    if not any(curl_multi.fdset()):
+        # no sockets yet, e.g. while resolving; select() would return at once and
+        # curl_multi_fdset(3) suggests sleeping 100 ms at most
+        time.sleep(min(timeout, 0.1))
+    elif curl_multi.select(timeout) == -1:
+        raise OsbsException("CurlMulti.select() failed")
+
+
+# state shared by all handles of a session; not LOCK_DATA_CONNECT: libcurl doesn't support
+# sharing a connection cache between handles used by several threads at once
+SHARED_DATA = [getattr(pycurl, name, None) for name in ("LOCK_DATA_DNS",
+                                                        "LOCK_DATA_SSL_SESSION")]
+SHARED_DATA = [x for x in SHARED_DATA if x is not None]
+
+
 def parse_headers(all_headers):
     # all_headers contains headers from all responses - even without FOLLOWLOCATION there
     # might be multiple sets of headers due to 401 Unauthorized. We only care about the last
@@ -82,6 +140,8 @@ def parse_headers(all_headers):
         raw_headers = all_headers
 
     logger.debug("raw headers: " + repr(raw_headers))
+    # httplib knows only HTTP/1.x status lines
+    raw_headers = re.sub(br"^HTTP/2(\.0)? ", b"HTTP/1.1 ", raw_headers)
 
     # http://stackoverflow.com/questions/24728088/python-parse-http-response-string/24729316#24729316
     class FakeSocket(object):
@@ -97,9 +157,672 @@ def parse_headers(all_headers):
     return dict(header_list)
 
 
+def create_curl_share():
+    """
+    :return: pycurl.CurlShare sharing DNS cache and TLS session IDs between curl handles,
+             as far as pycurl and libcurl support it
+    """
+    share = pycurl.CurlShare()
+    for data in SHARED_DATA:
+        try:
+            share.setopt(pycurl.SH_SHARE, data)
+        except pycurl.error as ex:
+            # libcurl is older than pycurl
+            logger.debug("curl can't share %s: %r", data, ex)
+    return share
+
+
+def http2_supported():
+    """
+    :return: bool, can curl speak HTTP/2?
+    """
+    features = pycurl.version_info()[4]
+    return (bool(features & getattr(pycurl, "VERSION_HTTP2", 0)) and
+            hasattr(pycurl, "CURL_HTTP_VERSION_2TLS"))
+
+
+def enable_multiplexing(curl_multi):
+    """
+    let HTTP/2 transfers of curl_multi share connections
+
+    :param curl_multi: pycurl.CurlMulti
+    """
+    curl_multi.setopt(pycurl.M_PIPELINING, pycurl.PIPE_MULTIPLEX)
+
+
+def get_encoding(headers):
+    """
+    :param headers: dict, parsed response headers
+    :return: str, charset of the response, utf-8 if not specified
+    """
+    encoding = None
+    if 'content-type' in headers:
+        content_type = headers['content-type'].lower()
+        match = re.search(r'charset=(\S+)', content_type)
+        if match:
+            encoding = match.group(1)
+    if encoding is None:
+        encoding = 'utf-8'  # assume utf-8
+
+    return encoding
+
+
+class RequestMetrics(object):
+    """
+    Timing and size of a request as measured by curl
+
+    The *_time attributes are seconds since the start of the request until the name was
+    resolved, the connection established, the TLS handshake done (0 for plain http and reused
+    connections), the request about to be sent, the first byte of the response received and the
+    transfer finished.
+    """
+
+    CURL_INFO = [
+        ("namelookup_time", pycurl.NAMELOOKUP_TIME),
+        ("connect_time", pycurl.CONNECT_TIME),
+        ("appconnect_time", pycurl.APPCONNECT_TIME),
+        ("pretransfer_time", pycurl.PRETRANSFER_TIME),
+        ("starttransfer_time", pycurl.STARTTRANSFER_TIME),
+        ("total_time", pycurl.TOTAL_TIME),
+        ("size_upload", getattr(pycurl, "SIZE_UPLOAD_T", pycurl.SIZE_UPLOAD)),
+        ("size_download", getattr(pycurl, "SIZE_DOWNLOAD_T", pycurl.SIZE_DOWNLOAD)),
+    ]
+
+    def __init__(self, url, method, status_code, **values):
+        """
+        :param url: str
+        :param method: str
+        :param status_code: int, 0 if there was no response
+        :param values: numbers named as in CURL_INFO
+        """
+        self.url = url
+        self.method = method
+        self.status_code = status_code
+        for name, _ in self.CURL_INFO:
+            setattr(self, name, values.get(name, 0))
+
+    @classmethod
+    def from_curl(cls, c, url, method):
+        """
+        :param c: pycurl.Curl which performed the request
+        """
+        values = dict((name, c.getinfo(info)) for name, info in cls.CURL_INFO)
+        return cls(url, method, c.getinfo(pycurl.HTTP_CODE), **values)
+
+    def phases(self):
+        """
+        :return: dict, seconds spent resolving the name ('dns'), connecting ('connect'), in the
+                 TLS handshake ('tls'), waiting for the server ('server') and transferring the
+                 response ('transfer')
+        """
+        tls = self.appconnect_time - self.connect_time if self.appconnect_time else 0.0
+        return {
+            "dns": self.namelookup_time,
+            "connect": max(self.connect_time - self.namelookup_time, 0.0),
+            "tls": max(tls, 0.0),
+            "server": max(self.starttransfer_time - self.pretransfer_time, 0.0),
+            "transfer": max(self.total_time - self.starttransfer_time, 0.0),
+        }
+
+
+def notify_observers(observers, metrics):
+    """
+    :param observers: list of callables taking RequestMetrics
+    :param metrics: RequestMetrics
+    """
+    for observer in observers:
+        try:
+            observer(metrics)
+        except Exception:
+            # instrumentation must not break requests
+            logger.exception("request observer %r failed", observer)
+
+
+class ChunkBuffer(object):
+    """
+    Receive buffer keeping the chunks written by curl as they are, without copying them into one
+    growing buffer; they are joined only when taken out.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+
+    def write(self, data):
+        self._chunks.append(data)
+        self._size += len(data)
+
+    def __len__(self):
+        return self._size
+
+    def take(self):
+        """
+        :return: bytes, everything written since the last call
+        """
+        # joining a single chunk returns it without a copy
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        return data
+
+
+class LineSplitter(object):
+    """
+    Splits text arriving in chunks into lines the same way str.splitlines() would split all of it.
+
+    Every chunk is scanned for line breaks only once; an unfinished line is kept as a list of
+    pieces and joined once it ends, so a long line arriving in many small chunks costs linear time.
+    """
+
+    def __init__(self, max_line_length=None):
+        """
+        :param max_line_length: int, raise OsbsException when a line is longer, None means no limit
+        """
+        self.max_line_length = max_line_length
+        self._pending = []  # pieces of the line which hasn't ended yet
+        self._pending_length = 0
+        self._after_cr = False  # the last chunk ended with CR, LF may follow
+
+    def feed(self, chunk):
+        """
+        :param chunk: str
+        :return: list of str, lines finished by the chunk
+        """
+        if self._after_cr and chunk.startswith("\n"):
+            # second half of CRLF, the line has been finished already
+            chunk = chunk[1:]
+            self._after_cr = False
+        if not chunk:
+            return []
+        self._after_cr = chunk.endswith("\r")
+
+        lines = chunk.splitlines()
+        ends_with_break = chunk[-1:].splitlines() == [""]
+        tail = None if ends_with_break else lines.pop()
+        if self._pending and lines:
+            self._pending.append(lines[0])
+            lines[0] = "".join(self._pending)
+            self._pending = []
+            self._pending_length = 0
+        if tail is not None:
+            self._pending.append(tail)
+            self._pending_length += len(tail)
+
+        if self.max_line_length is not None:
+            if self._pending_length > self.max_line_length or \
+                    (lines and max(map(len, lines)) > self.max_line_length):
+                raise OsbsException("line is longer than %d characters" % self.max_line_length)
+        return lines
+
+    def finish(self):
+        """
+        :return: list of str, the last line if it didn't end with a line break
+        """
+        if not self._pending:
+            return []
+        line = "".join(self._pending)
+        self._pending = []
+        self._pending_length = 0
+        return [line]
+
+
+class _JsonValueScanner(object):
+    """
+    finds where a JSON value ends in text arriving in chunks, without decoding it
+    """
+    STRING_SPECIAL = re.compile(r'["\\]')
+    STRUCTURE_SPECIAL = re.compile(r'["{}\[\]]')
+    SCALAR = re.compile(r'[^\s,\]}]*')
+
+    def __init__(self, chunk, start):
+        self._pieces = []
+        self._start = start
+        self._scalar = chunk[start] not in '"{['
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False  # the chunk ended with a backslash in a string
+
+    def scan(self, chunk, pos):
+        """
+        :return: int, index just past the end of the value, None if it continues in next chunk
+        """
+        if self._scalar:
+            end = self.SCALAR.match(chunk, pos).end()
+            return self._incomplete(chunk) if end == len(chunk) else end
+
+        if self._escaped:
+            self._escaped = False
+            pos += 1
+        while True:
+            if self._in_string:
+                match = self.STRING_SPECIAL.search(chunk, pos)
+                if match is None:
+                    return self._incomplete(chunk)
+                if match.group() == '\\':
+                    if match.end() == len(chunk):
+                        self._escaped = True
+                        return self._incomplete(chunk)
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                if self._depth == 0:
+                    return pos
+            else:
+                match = self.STRUCTURE_SPECIAL.search(chunk, pos)
+                if match is None:
+                    return self._incomplete(chunk)
+                char, pos = match.group(), match.end()
+                if char == '"':
+                    self._in_string = True
+                elif char in '{[':
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        return pos
+
+    def _incomplete(self, chunk):
+        self._pieces.append(chunk[self._start:])
+        self._start = 0
+        return None
+
+    def text(self, chunk, end):
+        """
+        :return: str, the whole value once scan() found its end at index end of chunk
+        """
+        self._pieces.append(chunk[self._start:end])
+        return "".join(self._pieces)
+
+
+class JsonItemsDecoder(object):
+    """
+    Incremental decoder of a JSON object holding a long array, such as the 'items' of list
+    responses.
+
+    Elements of the array are decoded one by one as the chunks arrive, so only one of them is
+    held in memory at a time; the other keys of the object are kept in `document`.
+    """
+    WHITESPACE = re.compile(r'\s*')
+
+    # what comes next
+    (_OBJECT_START, _KEY, _KEY_OR_END, _COLON, _VALUE, _NEXT_KEY,
+     _ITEM, _ITEM_OR_END, _NEXT_ITEM, _END) = range(10)
+
+    def __init__(self, key="items"):
+        """
+        :param key: str, key of the array to decode element by element
+        """
+        self.key = key
+        self.document = {}
+        self._state = self._OBJECT_START
+        self._current_key = None
+        self._scanner = None
+
+    def feed(self, chunk):
+        """
+        :param chunk: str
+        :return: list, elements of the array completed by the chunk
+        """
+        items = []
+        pos = 0
+        while pos < len(chunk):
+            if self._scanner is not None:
+                end = self._scanner.scan(chunk, pos)
+                if end is None:
+                    break
+                self._value_decoded(json.loads(self._scanner.text(chunk, end)), items)
+                self._scanner = None
+                pos = end
+                continue
+
+            pos = self.WHITESPACE.match(chunk, pos).end()
+            if pos == len(chunk):
+                break
+            char = chunk[pos]
+            state = self._state
+            if state == self._OBJECT_START and char == '{':
+                self._state = self._KEY_OR_END
+            elif state in (self._KEY, self._KEY_OR_END) and char == '"':
+                self._scanner = _JsonValueScanner(chunk, pos)
+                continue
+            elif state in (self._KEY_OR_END, self._NEXT_KEY) and char == '}':
+                self._state = self._END
+            elif state == self._COLON and char == ':':
+                self._state = self._VALUE
+            elif state == self._VALUE and self._current_key == self.key and char == '[':
+                self._state = self._ITEM_OR_END
+            elif state == self._NEXT_KEY and char == ',':
+                self._state = self._KEY
+            elif state in (self._ITEM_OR_END, self._NEXT_ITEM) and char == ']':
+                self._state = self._NEXT_KEY
+            elif state == self._NEXT_ITEM and char == ',':
+                self._state = self._ITEM
+            elif state in (self._VALUE, self._ITEM, self._ITEM_OR_END):
+                self._scanner = _JsonValueScanner(chunk, pos)
+                continue
+            else:
+                raise ValueError("unexpected %r in JSON document" % char)
+            pos += 1
+        return items
+
+    def _value_decoded(self, value, items):
+        if self._state in (self._KEY, self._KEY_OR_END):
+            self._current_key = value
+            self._state = self._COLON
+        elif self._state == self._VALUE:
+            self.document[self._current_key] = value
+            self._state = self._NEXT_KEY
+        else:
+            items.append(value)
+            self._state = self._NEXT_ITEM
+
+    def finish(self):
+        """
+        :raises ValueError: when the document is incomplete
+        """
+        if self._state != self._END:
+            raise ValueError("JSON document ended prematurely")
+
+    def iter_items(self, chunks):
+        """
+        :param chunks: iterable of str
+        :return: generator of elements of the array
+        """
+        for chunk in chunks:
+            for item in self.feed(chunk):
+                yield item
+        self.finish()
+
+
+class CurlPool(object):
+    """
+    Pool of reusable curl handles, bounded per host.
+
+    Every entry is a pycurl.Curl easy handle together with the pycurl.CurlMulti which drove it:
+    libcurl keeps live connections in the connection cache of the multi handle, which is not
+    shared with other handles, so both need to be reused for the next request to the same host
+    to skip the TCP and TLS handshakes. For the same reason a request made through the pool gets
+    an HTTP/2 connection of its own: libcurl multiplexes only transfers of one multi handle.
+
+    Handles are reset before they are put back, so the next user gets a handle with default
+    options, no cookies and no references to the previous request's callbacks.
+    """
+
+    def __init__(self, max_per_host=DEFAULT_POOL_MAX_PER_HOST):
+        """
+        :param max_per_host: int, maximum number of idle handles kept for a single host
+        """
+        self.max_per_host = max_per_host
+        self._idle = {}  # host key -> deque of (curl, curl_multi), most recently used last
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _host_key(url):
+        parsed = urlparse.urlsplit(url)
+        return parsed.scheme, parsed.hostname, parsed.port
+
+    def acquire(self, url):
+        """
+        get handles for a request to url: an idle pair for the same host if there is one,
+        otherwise a new one
+
+        :param url: str
+        :return: tuple, (pycurl.Curl, pycurl.CurlMulti)
+        """
+        key = self._host_key(url)
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.hits += 1
+                return idle.pop()
+            self.misses += 1
+        return pycurl.Curl(), pycurl.CurlMulti()
+
+    def release(self, url, curl, curl_multi):
+        """
+        return handles used for a finished request to url back to the pool
+
+        :param url: str
+        :param curl: pycurl.Curl, must not be attached to curl_multi any more
+        :param curl_multi: pycurl.CurlMulti
+        """
+        # drop cookies first: COOKIELIST needs the cookie engine which reset() turns off
+        curl.setopt(pycurl.COOKIELIST, 'ALL')
+        # pycurl keeps the handle attached to its CurlShare through reset()
+        curl.unsetopt(pycurl.SHARE)
+        curl.reset()
+
+        key = self._host_key(url)
+        evicted = None
+        with self._lock:
+            idle = self._idle.setdefault(key, deque())
+            idle.append((curl, curl_multi))
+            if len(idle) > self.max_per_host:
+                evicted = idle.popleft()
+                self.evictions += 1
+
+        if evicted is not None:
+            logger.debug("connection pool for %s is full, closing the oldest handle", key[1])
+            self._close_pair(*evicted)
+
+    @staticmethod
+    def _close_pair(curl, curl_multi):
+        curl.close()
+        curl_multi.close()
+
+    def clear(self):
+        """
+        close all idle handles (and their connections)
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for pairs in idle.values():
+            for pair in pairs:
+                self._close_pair(*pair)
+
+    def stats(self):
+        """
+        :return: dict, pool statistics
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "idle": sum(len(pairs) for pairs in self._idle.values()),
+            }
+
+
+class RetryPolicy(object):
+    """
+    When and after how long HttpSession sends a failed request again: exponential backoff with
+    full jitter, limited by the number of attempts and by the time spent on all of them.
+
+    GET, PUT and DELETE are idempotent and are retried after any transient failure. Other
+    methods, e.g. POST, only when the request carries an Idempotency-Key header, when the
+    server refused it with 429, or when it can't have reached the server at all.
+    """
+
+    IDEMPOTENT_METHODS = ("get", "put", "delete")
+    IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+    RETRY_STATUS_CODES = (httplib.BAD_GATEWAY, httplib.SERVICE_UNAVAILABLE,
+                          httplib.GATEWAY_TIMEOUT, 429)
+    # too many requests: the server didn't act on it
+    NOT_PROCESSED_STATUS_CODES = (429,)
+    # the connection wasn't set up, nothing was sent
+    NOT_SENT_CURL_CODES = (pycurl.E_COULDNT_RESOLVE_HOST, pycurl.E_COULDNT_CONNECT)
+    RETRY_CURL_CODES = NOT_SENT_CURL_CODES + (pycurl.E_SEND_ERROR, pycurl.E_RECV_ERROR,
+                                              pycurl.E_GOT_NOTHING, pycurl.E_PARTIAL_FILE,
+                                              pycurl.E_SSL_CONNECT_ERROR)
+
+    def __init__(self, max_attempts=4, backoff=0.5, max_backoff=10, max_elapsed=30):
+        """
+        :param max_attempts: int, attempts including the first one, 1 disables retries
+        :param backoff: float, seconds, longest delay before the first retry; it doubles with
+                        each retry
+        :param max_backoff: float, seconds, longest delay before any retry
+        :param max_elapsed: float, seconds since the first attempt after which no retry starts
+        """
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_elapsed = max_elapsed
+
+    def is_idempotent(self, method, headers=None):
+        return (method.lower() in self.IDEMPOTENT_METHODS or
+                self.IDEMPOTENCY_KEY_HEADER in (headers or {}))
+
+    def retry_error(self, method, headers, code):
+        """
+        :param code: int, curl error code of the failed attempt
+        :return: bool, whether the request may be sent again
+        """
+        if code in self.NOT_SENT_CURL_CODES:
+            return True
+        return code in self.RETRY_CURL_CODES and self.is_idempotent(method, headers)
+
+    def retry_status(self, method, headers, status_code):
+        """
+        :param status_code: int, HTTP status of the response to the attempt
+        :return: bool, whether the request may be sent again
+        """
+        if status_code in self.NOT_PROCESSED_STATUS_CODES:
+            return True
+        return status_code in self.RETRY_STATUS_CODES and self.is_idempotent(method, headers)
+
+    def delay(self, attempt, elapsed, retry_after=None, max_elapsed=None):
+        """
+        :param attempt: int, number of attempts made so far
+        :param elapsed: float, seconds since the first attempt started
+        :param retry_after: str, value of the Retry-After header of the response, if any
+        :param max_elapsed: float, seconds, a limit stricter than the policy's, e.g. a timeout
+        :return: float, seconds to wait before the next attempt, None to give up
+        """
+        if attempt >= self.max_attempts:
+            return None
+        delay = parse_retry_after(retry_after)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        if max_elapsed is None or max_elapsed > self.max_elapsed:
+            max_elapsed = self.max_elapsed
+        if elapsed + delay >= max_elapsed:
+            return None
+        return delay
+
+
+def parse_retry_after(value):
+    """
+    :param value: str, Retry-After header: seconds or an HTTP date
+    :return: float, seconds to wait, None when value is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0.0, mktime_tz(date) - time.time())
+
+
 class HttpSession(object):
-    def __init__(self, verbose=False):
+    """
+    Session reusing curl handles, and therefore connections, between requests.
+
+    Idle handles are kept in a CurlPool; call close() to drop them when the session is no longer
+    needed. All handles of the session, pooled or not, share the DNS cache and TLS sessions
+    through a CurlShare, so even short-lived handles skip DNS lookups and resume TLS sessions;
+    connections are reused only by the pooled handles, see CurlPool.
+
+    With HTTP/2 enabled, transfers driven by the same CurlMulti, i.e. those of request_many(),
+    are multiplexed over a single connection.
+
+    Observers added by add_observer() get RequestMetrics of every request once it is done.
+
+    Requests which time out or stall raise OsbsTimeoutException.
+
+    With a RetryPolicy, request() retries transient failures, see RetryPolicy. Streamed
+    requests are retried only until the response headers arrive. request_many() doesn't retry.
+    """
+
+    def __init__(self, verbose=False, pool_max_per_host=DEFAULT_POOL_MAX_PER_HOST,
+                 compression=False, http2=False, observers=None, connect_timeout=None,
+                 timeout=None, stall_timeout=None, keepalive=None, retry_policy=None):
+        """
+        :param verbose: bool, make curl verbose
+        :param pool_max_per_host: int, number of idle handles to keep for each host,
+                                  0 disables connection reuse
+        :param compression: bool, ask for compressed responses and decompress them on the fly
+        :param http2: bool, use HTTP/2 for https URLs when the server supports it; HTTP/1.1 is
+                      used otherwise, and when curl can't speak HTTP/2
+        :param observers: list of callables taking RequestMetrics, see add_observer()
+        :param connect_timeout: float, seconds to wait for a connection to be set up
+        :param timeout: float, seconds a request which isn't streamed may take; a shorter
+                        timeout can be passed to request()
+        :param stall_timeout: float, abort requests, streamed ones too, when no data arrives
+                              for this many seconds
+        :param keepalive: int, send TCP keepalive probes after this many idle seconds
+        :param retry_policy: RetryPolicy, None not to retry
+        """
         self.verbose = verbose
+        self.retry_policy = retry_policy
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.keepalive = keepalive
+        self.compression = compression
+        if http2 and not http2_supported():
+            logger.warning("curl doesn't support HTTP/2, using HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self.observers = observers if observers is not None else []
+        self.share = create_curl_share()
+        self.pool = CurlPool(max_per_host=pool_max_per_host) if pool_max_per_host else None
+        self._batch_multi = None  # CurlMulti shared by all request_many() calls
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.clear()
+        if self._batch_multi is not None:
+            self._batch_multi.close()
+            self._batch_multi = None
+
+    def add_observer(self, observer):
+        """
+        :param observer: callable taking RequestMetrics, called from the thread which
+                         performed the request, e.g. osbs.metrics.EndpointStats
+        """
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        self.observers.remove(observer)
+
+    def _transfer_args(self, kwargs):
+        """
+        :param kwargs: dict, keyword arguments of request()
+        :return: dict, keyword arguments for the transfer with defaults of the session
+        """
+        args = dict(verbose=self.verbose, compression=self.compression, http2=self.http2,
+                    share=self.share, connect_timeout=self.connect_timeout,
+                    stall_timeout=self.stall_timeout, keepalive=self.keepalive)
+        args.update(kwargs)
+        if self.timeout is not None and not args.get('stream', False):
+            timeout = args.get('timeout')
+            args['timeout'] = self.timeout if timeout is None else min(timeout, self.timeout)
+        return args
+
+    def pool_stats(self):
+        """
+        :return: dict, statistics of the connection pool, None when pooling is disabled
+        """
+        if self.pool is None:
+            return None
+        return self.pool.stats()
 
     def get(self, url, **kwargs):
         return self.request(url, "get", **kwargs)
@@ -110,20 +833,71 @@ class HttpSession(object):
     def put(self, url, **kwargs):
         return self.request(url, "put", **kwargs)
 
+    def patch(self, url, **kwargs):
+        return self.request(url, "patch", **kwargs)
+
     def delete(self, url, **kwargs):
         return self.request(url, "delete", **kwargs)
 
-    def request(self, url, *args, **kwargs):
+    def request(self, url, method, retry=True, **kwargs):
+        """
+        :param url: str
+        :param method: str, 'get', 'post', 'put', 'patch' or 'delete'
+        :param retry: bool, retry according to the retry policy of the session; False when
+                      the caller has retries of its own
+        :return: HttpResponse, or HttpStream when stream is True
+        """
+        policy = self.retry_policy if retry else None
+        if policy is None:
+            return self._request(url, method, **kwargs)
+
+        headers = kwargs.get('headers')
+        timeout = kwargs.get('timeout')
+        start = time.time()
+        attempt = 0
+        while True:
+            attempt += 1
+            error = None
+            try:
+                response = self._request(url, method, **kwargs)
+            except OsbsNetworkException as ex:
+                if not policy.retry_error(method, headers, ex.status_code):
+                    raise
+                error = ex
+                retry_after = None
+                reason = repr(ex)
+            else:
+                if not policy.retry_status(method, headers, response.status_code):
+                    return response
+                retry_after = response.headers.get('retry-after')
+                reason = "status %s" % response.status_code
+
+            elapsed = time.time() - start
+            delay = policy.delay(attempt, elapsed, retry_after=retry_after, max_elapsed=timeout)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            if error is None and kwargs.get('stream', False):
+                response.close()
+            logger.info("%s %s failed (%s), attempt %d, retrying in %.1fs",
+                        method.upper(), url, reason, attempt, delay)
+            time.sleep(delay)
+            if timeout is not None:
+                kwargs['timeout'] = timeout - (time.time() - start)
+
+    def _request(self, url, method, **kwargs):
         try:
-            stream = HttpStream(url, *args, verbose=self.verbose, **kwargs)
+            stream = HttpStream(url, method, pool=self.pool, observers=self.observers,
+                                **self._transfer_args(kwargs))
             if kwargs.get('stream', False):
                 return stream
 
             with stream as s:
-                # joining at once is much faster than doing += in a loop
-                all_chunks = list(s.iter_chunks())
-                content = ''.join(all_chunks)
-                return HttpResponse(s.status_code, s.headers, content)
+                # joining at once is much faster than doing += in a loop; the body is decoded
+                # only when somebody asks for it as text
+                content = b''.join(s.iter_chunks(decode=False))
+                return HttpResponse(s.status_code, s.headers, content, url=url)
         except pycurl.error as ex:
             code = ex.args[0]
             try:
@@ -132,12 +906,226 @@ class HttpSession(object):
                 # happened on rhel 6
                 message = ""
             if code in PYCURL_NETWORK_CODES:
-                raise OsbsNetworkException(url, message, code, *ex.args[2:],
-                                           cause=ex,
-                                           traceback=sys.exc_info()[2])
+                raise network_exception(url, message, code, *ex.args[2:],
+                                        cause=ex,
+                                        traceback=sys.exc_info()[2])
 
             raise OsbsException(cause=ex, traceback=sys.exc_info()[2])
 
+    def request_many(self, requests, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        """
+        perform many unary requests concurrently, driven by one CurlMulti
+
+        Connections are kept in the connection cache of that CurlMulti, so they are reused
+        between subsequent calls. The method is not thread-safe.
+
+        :param requests: iterable of dicts, keyword arguments of request(); 'url' is mandatory,
+                         'method' defaults to 'get'
+        :param max_concurrency: int, maximum number of requests in flight
+        :return: generator of HttpResponse instances in the order in which the requests
+                 complete; HttpResponse.url tells which request the response belongs to
+
+        A failed transfer doesn't stop the others: the responses of all the other requests
+        are yielded first and the error of the first failed transfer, OsbsNetworkException,
+        is raised once the whole batch is done.
+        """
+        if self._batch_multi is None:
+            self._batch_multi = pycurl.CurlMulti()
+            if self.http2:
+                enable_multiplexing(self._batch_multi)
+        curl_multi = self._batch_multi
+
+        requests = iter(requests)
+        active = {}  # pycurl.Curl -> _BatchTransfer
+        error = None
+        try:
+            while True:
+                while len(active) < max_concurrency:
+                    try:
+                        kwargs = dict(next(requests))
+                    except StopIteration:
+                        break
+                    url = kwargs.pop('url')
+                    method = kwargs.pop('method', 'get')
+                    transfer = _BatchTransfer(url, method, **self._transfer_args(kwargs))
+                    curl_multi.add_handle(transfer.c)
+                    active[transfer.c] = transfer
+
+                if not active:
+                    break
+
+                while True:
+                    ret, _ = curl_multi.perform()
+                    if ret != pycurl.E_CALL_MULTI_PERFORM:
+                        break
+
+                while True:
+                    num_q, ok_list, err_list = curl_multi.info_read()
+                    for c, code, message in err_list:
+                        transfer = active.pop(c)
+                        curl_multi.remove_handle(c)
+                        c.close()
+                        logger.debug("request to %s failed: %s", transfer.url, message)
+                        if error is None:
+                            error = network_exception(transfer.url, message, code)
+                    for c in ok_list:
+                        transfer = active.pop(c)
+                        curl_multi.remove_handle(c)
+                        response = transfer.get_response()
+                        if self.observers:
+                            notify_observers(self.observers,
+                                             RequestMetrics.from_curl(c, transfer.url,
+                                                                      transfer.method))
+                        c.close()
+                        yield response
+                    if num_q == 0:
+                        break
+
+                if active:
+                    wait_for_activity(curl_multi, BATCH_SELECT_TIMEOUT)
+        except pycurl.error as ex:
+            raise OsbsException(cause=ex, traceback=sys.exc_info()[2])
+        finally:
+            for c in active:
+                curl_multi.remove_handle(c)
+                c.close()
+
+        if error is not None:
+            raise error
+
+
+class _BatchTransfer(object):
+    """
+    curl handle and buffers of one request performed by HttpSession.request_many()
+    """
+
+    def __init__(self, url, method, verbose=False, **kwargs):
+        self.url = url
+        self.method = method
+        self.response_buffer = ChunkBuffer()
+        self.headers_buffer = BytesIO()
+        self.c = pycurl.Curl()
+        setup_curl(self.c, url, method, self.response_buffer.write, self.headers_buffer.write,
+                   verbose=verbose, **kwargs)
+
+    def get_response(self):
+        headers = parse_headers(self.headers_buffer.getvalue())
+        return HttpResponse(self.c.getinfo(pycurl.HTTP_CODE), headers,
+                            self.response_buffer.take(), url=self.url)
+
+
+def setup_curl(c, url, method, write_function, header_function, data=None, kerberos_auth=False,
+               allow_redirects=True, verify_ssl=True, ca=None, use_json=False, headers=None,
+               stream=False, username=None, password=None, client_cert=None, client_key=None,
+               verbose=False, compression=False, http2=False, share=None, connect_timeout=None,
+               timeout=None, stall_timeout=None, keepalive=None):
+    """
+    set options of curl handle c for a request
+
+    :param c: pycurl.Curl
+    :param url: str
+    :param method: str, 'get', 'post', 'put', 'patch' or 'delete'
+    :param write_function: callable, receives response body data
+    :param header_function: callable, receives response headers
+    :param compression: bool, send Accept-Encoding with all encodings curl supports;
+                        write_function then receives decompressed data as it arrives
+    :param http2: bool, negotiate HTTP/2 for https URLs, see http2_supported()
+    :param share: pycurl.CurlShare, see create_curl_share()
+    :param connect_timeout: float, seconds to wait for a connection to be set up
+    :param timeout: float, seconds the whole request may take
+    :param stall_timeout: float, abort when no data arrives for this many seconds
+    :param keepalive: int, send TCP keepalive probes on a connection idle for this many seconds
+    """
+    headers = dict(headers or {})
+    method = method.lower()
+
+    if method == 'post':
+        c.setopt(pycurl.POST, 1)
+        headers["Expect"] = ""  # openshift can't handle Expect
+    elif method == 'get':
+        c.setopt(pycurl.HTTPGET, 1)
+    elif method == 'put':
+        # c.setopt(pycurl.PUT, 1)
+        c.setopt(pycurl.CUSTOMREQUEST, b"PUT")
+        headers["Expect"] = ""
+    elif method == 'patch':
+        c.setopt(pycurl.CUSTOMREQUEST, b"PATCH")
+        headers["Expect"] = ""
+    elif method == 'delete':
+        c.setopt(pycurl.CUSTOMREQUEST, b"DELETE")
+    else:
+        raise RuntimeError("Unsupported method '%s' for curl call!" % method)
+
+    c.setopt(pycurl.COOKIEFILE, b'')
+    if share is not None:
+        c.setopt(pycurl.SHARE, share)
+    c.setopt(pycurl.URL, str(url))
+    c.setopt(pycurl.WRITEFUNCTION, write_function)
+    c.setopt(pycurl.HEADERFUNCTION, header_function)
+    c.setopt(pycurl.DEBUGFUNCTION, HttpStream._curl_debug)
+    c.setopt(pycurl.SSL_VERIFYPEER, 1 if verify_ssl else 0)
+    c.setopt(pycurl.SSL_VERIFYHOST, 2 if verify_ssl else 0)
+    if ca:
+        logger.info("Setting CAINFO to %r", ca)
+        c.setopt(pycurl.CAINFO, ca)
+
+    c.setopt(pycurl.VERBOSE, 1 if verbose else 0)
+    if compression:
+        # empty string: everything libcurl was built with, e.g. gzip and deflate
+        c.setopt(pycurl.ENCODING, "")
+    if http2:
+        # ALPN decides, servers which don't know HTTP/2 get HTTP/1.1
+        c.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2TLS)
+        # rather wait for a connection being set up, it may be multiplexed, than open another
+        c.setopt(pycurl.PIPEWAIT, 1)
+    if connect_timeout:
+        c.setopt(pycurl.CONNECTTIMEOUT_MS, max(1, int(connect_timeout * 1000)))
+    if timeout is not None:
+        # 0 would mean no timeout at all
+        c.setopt(pycurl.TIMEOUT_MS, max(1, int(timeout * 1000)))
+    if stall_timeout:
+        # less than a byte per second for that long
+        c.setopt(pycurl.LOW_SPEED_LIMIT, 1)
+        c.setopt(pycurl.LOW_SPEED_TIME, max(1, int(math.ceil(stall_timeout))))
+    if keepalive:
+        # dead peers are noticed even while the server has nothing to send, e.g. on watches
+        c.setopt(pycurl.TCP_KEEPALIVE, 1)
+        c.setopt(pycurl.TCP_KEEPIDLE, int(keepalive))
+        c.setopt(pycurl.TCP_KEEPINTVL, int(keepalive))
+    if username and password:
+        username = username.encode('utf-8')
+        password = password.encode('utf-8')
+        c.setopt(pycurl.USERPWD, username + b":" + password)
+
+    if client_cert and client_key:
+        c.setopt(pycurl.SSLCERTTYPE, "PEM")
+        c.setopt(pycurl.SSLKEYTYPE, "PEM")
+        c.setopt(pycurl.SSLCERT, client_cert)
+        c.setopt(pycurl.SSLKEY, client_key)
+
+    if data:
+        # curl sets the method to post if one sets any POSTFIELDS (even '')
+        c.setopt(pycurl.POSTFIELDS, data)
+
+    if use_json:
+        headers['Content-Type'] = 'application/json'
+
+    if allow_redirects:
+        c.setopt(pycurl.FOLLOWLOCATION, 1)
+
+    if kerberos_auth:
+        c.setopt(pycurl.HTTPAUTH, pycurl.HTTPAUTH_GSSNEGOTIATE)
+        c.setopt(pycurl.USERPWD, b':')
+
+    if stream:
+        headers['Cache-Control'] = 'no-cache'
+
+    if headers:
+        header_list = []
+        for header_key, header_value in headers.items():
+            header_list.append(str("%s: %s" % (header_key, header_value)))
+        c.setopt(pycurl.HTTPHEADER, header_list)
+
 
 class HttpStream(object):
     """
@@ -149,87 +1137,49 @@ class HttpStream(object):
     in the middle of reading the stream. Because it doesn't fit into our current API, the class also
     tries to free the resources when it finishes reading the http stream and also when it's garbage
     collected.
+
+    When a CurlPool is provided, curl handles are taken from it and handed back once the response
+    has been read completely, so that the connection can be reused by the next request.
+
+    Observers get RequestMetrics of the request when the stream is closed.
     """
 
     def __init__(self, url, method, data=None, kerberos_auth=False,
                  allow_redirects=True, verify_ssl=True, ca=None, use_json=False,
                  headers=None, stream=False, username=None, password=None,
-                 client_cert=None, client_key=None, verbose=False):
+                 client_cert=None, client_key=None, verbose=False, compression=False,
+                 http2=False, share=None, pool=None, observers=None, connect_timeout=None,
+                 timeout=None, stall_timeout=None, keepalive=None):
         self.finished = False  # have we read all data?
         self.closed = False    # have we destroyed curl resources?
+        self.method = method
+        self.observers = observers
 
         self.status_code = 0
         self.headers = None
-        self.response_buffer = BytesIO()
+        self.response_buffer = ChunkBuffer()
         self.headers_buffer = BytesIO()
         self.response_decoder = None
 
         self.url = url
-        headers = headers or {}
-        method = method.lower()
 
-        self.c = pycurl.Curl()
-        self.curl_multi = pycurl.CurlMulti()
-
-        if method == 'post':
-            self.c.setopt(pycurl.POST, 1)
-            headers["Expect"] = ""  # openshift can't handle Expect
-        elif method == 'get':
-            self.c.setopt(pycurl.HTTPGET, 1)
-        elif method == 'put':
-            # self.c.setopt(pycurl.PUT, 1)
-            self.c.setopt(pycurl.CUSTOMREQUEST, b"PUT")
-            headers["Expect"] = ""
-        elif method == 'delete':
-            self.c.setopt(pycurl.CUSTOMREQUEST, b"DELETE")
+        self.pool = pool
+        if pool is not None:
+            self.c, self.curl_multi = pool.acquire(url)
         else:
-            raise RuntimeError("Unsupported method '%s' for curl call!" % method)
-
-        self.c.setopt(pycurl.COOKIEFILE, b'')
-        self.c.setopt(pycurl.URL, str(url))
-        self.c.setopt(pycurl.WRITEFUNCTION, self.response_buffer.write)
-        self.c.setopt(pycurl.HEADERFUNCTION, self.headers_buffer.write)
-        self.c.setopt(pycurl.DEBUGFUNCTION, self._curl_debug)
-        self.c.setopt(pycurl.SSL_VERIFYPEER, 1 if verify_ssl else 0)
-        self.c.setopt(pycurl.SSL_VERIFYHOST, 2 if verify_ssl else 0)
-        if ca:
-            logger.info("Setting CAINFO to %r", ca)
-            self.c.setopt(pycurl.CAINFO, ca)
-
-        self.c.setopt(pycurl.VERBOSE, 1 if verbose else 0)
-        if username and password:
-            username = username.encode('utf-8')
-            password = password.encode('utf-8')
-            self.c.setopt(pycurl.USERPWD, username + b":" + password)
-
-        if client_cert and client_key:
-            self.c.setopt(pycurl.SSLCERTTYPE, "PEM")
-            self.c.setopt(pycurl.SSLKEYTYPE, "PEM")
-            self.c.setopt(pycurl.SSLCERT, client_cert)
-            self.c.setopt(pycurl.SSLKEY, client_key)
-
-        if data:
-            # curl sets the method to post if one sets any POSTFIELDS (even '')
-            self.c.setopt(pycurl.POSTFIELDS, data)
-
-        if use_json:
-            headers['Content-Type'] = b'application/json'
-
-        if allow_redirects:
-            self.c.setopt(pycurl.FOLLOWLOCATION, 1)
-
-        if kerberos_auth:
-            self.c.setopt(pycurl.HTTPAUTH, pycurl.HTTPAUTH_GSSNEGOTIATE)
-            self.c.setopt(pycurl.USERPWD, b':')
-
-        if stream:
-            headers['Cache-Control'] = b'no-cache'
-
-        if headers:
-            header_list = []
-            for header_key, header_value in headers.items():
-                header_list.append(str("%s: %s" % (header_key, header_value)))
-            self.c.setopt(pycurl.HTTPHEADER, header_list)
+            self.c = pycurl.Curl()
+            self.curl_multi = pycurl.CurlMulti()
+
+        setup_curl(self.c, url, method, self.response_buffer.write, self.headers_buffer.write,
+                   data=data, kerberos_auth=kerberos_auth, allow_redirects=allow_redirects,
+                   verify_ssl=verify_ssl, ca=ca, use_json=use_json, headers=headers,
+                   stream=stream, username=username, password=password,
+                   client_cert=client_cert, client_key=client_key, verbose=verbose,
+                   compression=compression, http2=http2, share=share,
+                   connect_timeout=connect_timeout, timeout=timeout,
+                   stall_timeout=stall_timeout, keepalive=keepalive)
+        if http2:
+            enable_multiplexing(self.curl_multi)
 
         self.curl_multi.add_handle(self.c)
 
@@ -258,33 +1208,31 @@ class HttpStream(object):
 
         if err_list:
             err_obj = err_list[0]
-            raise OsbsNetworkException(self.url, err_obj[2], err_obj[1])
+            raise network_exception(self.url, err_obj[2], err_obj[1])
 
         self.finished = (num_handles == 0)
 
     def _select(self):
-        sel = self.curl_multi.select(SELECT_TIMEOUT)
-        if sel == -1:
-            raise OsbsException("CurlMulti.select() timed out")
-        elif sel == 0:
-            # sel==0 means curl_multi_fdset returned -1
-            # manual page suggests sleeping >100ms when this happens:(
-            time.sleep(0.1)
+        wait_for_activity(self.curl_multi, SELECT_TIMEOUT)
 
     def _any_data_received(self):
-        return self.response_buffer.tell() != 0
+        return len(self.response_buffer) != 0
 
-    def _get_received_data(self):
-        result = self.response_buffer.getvalue()
-        self.response_buffer.truncate(0)
-        self.response_buffer.seek(0)
+    def _get_received_data(self, decode=True):
+        result = self.response_buffer.take()
+        if not decode:
+            return result
         return self.response_decoder.decode(result, final=self.finished)
 
-    def iter_chunks(self):
+    def iter_chunks(self, decode=True):
+        """
+        :param decode: bool, decode the chunks using the charset of the response;
+                       when False, yield bytes as they were received
+        """
         while True:
             self._perform()
             if self._any_data_received():
-                yield self._get_received_data()
+                yield self._get_received_data(decode=decode)
             if self.finished:
                 break
             self._select()
@@ -292,31 +1240,23 @@ class HttpStream(object):
         logger.debug("end of the stream")
         self.close()
 
-    def iter_lines(self):
+    def iter_lines(self, max_line_length=None):
+        """
+        :param max_line_length: int, raise OsbsException when a line is longer, None means no limit
+        """
         chunks = self.iter_chunks()
-        return self._split_lines_from_chunks(chunks)
+        return self._split_lines_from_chunks(chunks, max_line_length=max_line_length)
 
     @staticmethod
-    def _split_lines_from_chunks(chunks):
+    def _split_lines_from_chunks(chunks, max_line_length=None):
         # same behaviour as requests' Response.iter_lines(...)
-
-        pending = None
+        splitter = LineSplitter(max_line_length=max_line_length)
         for chunk in chunks:
-
-            if pending is not None:
-                chunk = pending + chunk
-            lines = chunk.splitlines()
-
-            if lines and lines[-1] and chunk and lines[-1][-1] == chunk[-1]:
-                pending = lines.pop()
-            else:
-                pending = None
-
-            for line in lines:
+            for line in splitter.feed(chunk):
                 yield line
 
-        if pending is not None:
-            yield pending
+        for line in splitter.finish():
+            yield line
 
     @staticmethod
     def _curl_debug(debug_type, debug_msg):
@@ -337,23 +1277,21 @@ class HttpStream(object):
 
     @property
     def encoding(self):
-        encoding = None
-        if 'content-type' in self.headers:
-            content_type = self.headers['content-type'].lower()
-            match = re.search(r'charset=(\S+)', content_type)
-            if match:
-                encoding = match.group(1)
-        if encoding is None:
-            encoding = 'utf-8'  # assume utf-8
-
-        return encoding
+        return get_encoding(self.headers)
 
     def close(self):
         if not self.closed:
             logger.debug("cleaning up")
+            if self.observers:
+                notify_observers(self.observers,
+                                 RequestMetrics.from_curl(self.c, self.url, self.method))
             self.curl_multi.remove_handle(self.c)
-            self.c.close()
-            self.curl_multi.close()
+            # a transfer which didn't finish leaves its connection in an unknown state
+            if self.pool is not None and self.finished:
+                self.pool.release(self.url, self.c, self.curl_multi)
+            else:
+                self.c.close()
+                self.curl_multi.close()
         self.closed = True
 
     def __del__(self):
@@ -367,13 +1305,41 @@ class HttpStream(object):
 
 
 class HttpResponse(object):
-    def __init__(self, status_code, headers, content):
+    def __init__(self, status_code, headers, content, url=None):
+        """
+        :param status_code: int
+        :param headers: dict, parsed response headers
+        :param content: bytes, body as received, or str, decoded body
+        :param url: str
+        """
         self.status_code = status_code
         self.headers = headers
-        self.content = content
+        self.url = url
+        if isinstance(content, bytes):
+            self.raw_content = content
+            self._content = None
+        else:
+            self.raw_content = None
+            self._content = content
+
+    @property
+    def content(self):
+        """
+        body decoded using the charset of the response
+        """
+        if self._content is None:
+            self._content = self.raw_content.decode(get_encoding(self.headers or {}))
+        return self._content
 
     def json(self, check=True):
         if check and self.status_code not in (0, httplib.OK, httplib.CREATED):
             raise OsbsResponseException(self.content, self.status_code)
 
+        if self._content is None and get_encoding(self.headers or {}) in ("utf-8", "utf8"):
+            try:
+                # spare the decoded copy of the whole body
+                return json.loads(self.raw_content)
+            except TypeError:
+                # json on python 3.5 and older only takes str
+                pass
         return json.loads(self.content)
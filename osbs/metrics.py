@@ -0,0 +1,93 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Aggregation of request metrics reported to HttpSession observers
+"""
+from __future__ import print_function, absolute_import, unicode_literals
+
+import re
+import threading
+
+try:
+    # py2
+    import urlparse
+except ImportError:
+    # py3
+    import urllib.parse as urlparse
+
+
+API_PREFIX = re.compile(r"^/(?:api|oapi)/[^/]+/")
+PHASES = ("dns", "connect", "tls", "server", "transfer")
+
+
+def endpoint_template(url):
+    """
+    :param url: str
+    :return: str, path of an API url with names replaced by placeholders, e.g.
+             'namespaces/{ns}/builds/{id}/log/'; other urls are returned as paths
+    """
+    path = urlparse.urlsplit(url).path
+    match = API_PREFIX.match(path)
+    if match is None:
+        return path
+    segments = path[match.end():].split("/")
+    # collection, name, collection, name, ..., optionally a subresource
+    start = 1 if segments[0] == "watch" else 0
+    for i in range(start + 1, len(segments), 2):
+        if segments[i]:
+            segments[i] = "{ns}" if segments[i - 1] == "namespaces" else "{id}"
+    return "/".join(segments)
+
+
+class EndpointStats(object):
+    """
+    HttpSession observer aggregating RequestMetrics by method and endpoint template
+    """
+
+    def __init__(self, template=endpoint_template):
+        """
+        :param template: callable turning an url into the name of its endpoint
+        """
+        self.template = template
+        self._lock = threading.Lock()
+        self._endpoints = {}  # (method, template) -> dict of sums
+
+    def __call__(self, metrics):
+        key = (metrics.method.upper(), self.template(metrics.url))
+        phases = metrics.phases()
+        with self._lock:
+            sums = self._endpoints.get(key)
+            if sums is None:
+                sums = dict.fromkeys(PHASES + ("total", "max_total"), 0.0)
+                sums.update(count=0, errors=0, size_upload=0, size_download=0)
+                self._endpoints[key] = sums
+            sums["count"] += 1
+            if not 200 <= metrics.status_code < 400:
+                sums["errors"] += 1
+            for phase in PHASES:
+                sums[phase] += phases[phase]
+            sums["total"] += metrics.total_time
+            sums["max_total"] = max(sums["max_total"], metrics.total_time)
+            sums["size_upload"] += metrics.size_upload
+            sums["size_download"] += metrics.size_download
+
+    def summary(self):
+        """
+        :return: dict, (method, endpoint template) -> dict with the number of requests ('count')
+                 and of those which failed ('errors'), mean seconds spent in each phase (see
+                 RequestMetrics.phases()) and in total ('total'), the longest request
+                 ('max_total') and bytes sent and received ('size_upload', 'size_download')
+        """
+        result = {}
+        with self._lock:
+            for key, sums in self._endpoints.items():
+                stats = dict(sums)
+                for name in PHASES + ("total",):
+                    stats[name] = sums[name] / sums["count"]
+                result[key] = stats
+        return result
@@ -0,0 +1,126 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Per-user on-disk cache of OAuth tokens
+"""
+from __future__ import print_function, absolute_import, unicode_literals
+
+import errno
+import json
+import logging
+import os
+import tempfile
+import time
+
+logger = logging.getLogger(__name__)
+
+# tokens which expire sooner than this (in seconds) are not handed out
+TOKEN_EXPIRY_MARGIN = 300
+
+
+def default_token_cache_file():
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache_dir, "osbs", "tokens.json")
+
+
+class TokenCache(object):
+    """
+    JSON file mapping (OAuth URL, identity) to a token and its expiry
+
+    The file is readable by its owner only. It is replaced atomically on every change, so
+    concurrent processes never see it half-written; when they race, the last one wins.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: str, cache file, default is ~/.cache/osbs/tokens.json
+        """
+        self.path = path or default_token_cache_file()
+
+    @staticmethod
+    def _key(oauth_url, identity):
+        return "%s %s" % (oauth_url, identity)
+
+    def _load(self):
+        try:
+            with open(self.path) as fp:
+                tokens = json.load(fp)
+        except (IOError, OSError) as ex:
+            if ex.errno != errno.ENOENT:
+                logger.warning("can't read token cache %s: %s", self.path, ex)
+            return {}
+        except ValueError:
+            logger.warning("token cache %s is corrupted, ignoring it", self.path)
+            return {}
+        return tokens if isinstance(tokens, dict) else {}
+
+    def _save(self, tokens):
+        directory = os.path.dirname(self.path)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tokens-")
+        except (IOError, OSError) as ex:
+            logger.warning("can't write token cache %s: %s", self.path, ex)
+            return
+        try:
+            # mkstemp creates the file with mode 0600
+            with os.fdopen(fd, "w") as fp:
+                json.dump(tokens, fp)
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError) as ex:
+            logger.warning("can't write token cache %s: %s", self.path, ex)
+            os.unlink(tmp_path)
+
+    def get(self, oauth_url, identity):
+        """
+        :param oauth_url: str
+        :param identity: str, who the token belongs to
+        :return: str, token or None when there's no token valid long enough
+        """
+        entry = self._load().get(self._key(oauth_url, identity))
+        if not entry:
+            return None
+        expires = entry.get("expires")
+        if expires is not None and expires - TOKEN_EXPIRY_MARGIN < time.time():
+            logger.debug("cached token expires at %s, not using it", expires)
+            return None
+        return entry.get("token")
+
+    def set(self, oauth_url, identity, token, expires_in=None):
+        """
+        :param oauth_url: str
+        :param identity: str, who the token belongs to
+        :param token: str
+        :param expires_in: int, seconds until the token expires, None if not known
+        """
+        tokens = self._load()
+        now = time.time()
+        # drop whatever has expired meanwhile
+        tokens = dict((key, entry) for key, entry in tokens.items()
+                      if entry.get("expires") is None or entry["expires"] > now)
+        tokens[self._key(oauth_url, identity)] = {
+            "token": token,
+            "expires": now + expires_in if expires_in is not None else None,
+        }
+        self._save(tokens)
+
+    def invalidate(self, oauth_url, identity, token=None):
+        """
+        forget the token
+
+        :param oauth_url: str
+        :param identity: str, who the token belongs to
+        :param token: str, forget the token only if it is this one
+        """
+        tokens = self._load()
+        entry = tokens.get(self._key(oauth_url, identity))
+        if entry is None or (token is not None and entry.get("token") != token):
+            return
+        del tokens[self._key(oauth_url, identity)]
+        self._save(tokens)
@@ -8,7 +8,6 @@ of the BSD license. See the LICENSE file for details.
 from __future__ import print_function, absolute_import, unicode_literals
 
 import contextlib
-import copy
 import os
 import shutil
 import subprocess
@@ -22,15 +21,19 @@ from osbs.exceptions import OsbsException
 
 
 def graceful_chain_get(d, *args):
+    """
+    :param d: dict or list, e.g. decoded JSON
+    :param args: keys and indexes leading to the value
+    :return: the value, None when any of the keys is missing; not a copy, so don't modify it
+    """
     if not d:
         return None
-    t = copy.deepcopy(d)
     for arg in args:
         try:
-            t = t[arg]
-        except (AttributeError, KeyError):
+            d = d[arg]
+        except (AttributeError, KeyError, IndexError, TypeError):
             return None
-    return t
+    return d
 
 
 def deep_update(orig, new):
@@ -8,8 +8,10 @@ of the BSD license. See the LICENSE file for details.
 """
 
 import re
+import sys
 
 from setuptools import setup, find_packages
+from setuptools.command.build_py import build_py as _build_py
 
 data_files = {
     "share/osbs": [
@@ -33,6 +35,14 @@ def _install_requirements():
     requirements = _get_requirements('requirements.txt')
     return requirements
 
+class build_py(_build_py):
+    def find_package_modules(self, package, package_dir):
+        modules = _build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 6):
+            # osbs.aio uses async/await, which can't even be byte-compiled before 3.6
+            modules = [m for m in modules if m[:2] != ("osbs", "aio")]
+        return modules
+
 setup(
     name="osbs-client",
     description='Python module and command line client for OpenShift Build Service',
@@ -46,5 +56,6 @@ setup(
           'console_scripts': ['osbs=osbs.cli.main:main'],
     },
     install_requires=_install_requirements(),
+    cmdclass={'build_py': build_py},
     data_files=data_files.items(),
 )
@@ -0,0 +1,66 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import json
+import sys
+
+import pytest
+
+from osbs.build.build_record import BuildRecord
+from osbs.exceptions import OsbsException
+
+
+BUILD_JSON = """{
+    "metadata": {"name": "build-1", "namespace": "ns", "creationTimestamp": "2015-08-26T12:00:00Z",
+                 "labels": {"buildconfig": "bc", "git-branch": "master"},
+                 "annotations": {"logs": "lots of logs"}},
+    "spec": {"output": {"to": {"name": "registry/ns/image:1"}}},
+    "status": {"phase": "Running", "startTimestamp": "2015-08-26T12:00:05Z"}
+}"""
+
+
+class TestBuildRecord(object):
+    def test_from_json(self):
+        record = BuildRecord.from_json(json.loads(BUILD_JSON))
+        assert record.get_build_name() == "build-1"
+        assert record.namespace == "ns"
+        assert record.status == "running"
+        assert record.is_running()
+        assert not record.is_finished()
+        assert record.get_image_tag() == "registry/ns/image:1"
+        assert record.get_time_created_in_seconds() == 1440590400
+        assert record.started == "2015-08-26T12:00:05Z"
+        assert record.completed is None
+        assert record.build_config == "bc"
+        assert record.get_labels() == {"buildconfig": "bc", "git-branch": "master"}
+        assert not hasattr(record, "__dict__")
+
+    def test_build_config_from_status(self):
+        record = BuildRecord.from_json({"metadata": {"name": "build-1"},
+                                        "status": {"config": {"name": "bc"}}},
+                                       namespace="ns")
+        assert record.build_config == "bc"
+        assert record.namespace == "ns"
+        assert record.phase is None
+
+    @pytest.mark.skipif(sys.version_info[0] < 3, reason="py2 interns only byte strings")
+    def test_interned(self):
+        first, second = [BuildRecord.from_json(json.loads(BUILD_JSON)) for _ in range(2)]
+        assert first.phase is second.phase
+        assert first.labels["git-branch"] is second.labels["git-branch"]
+
+    def test_full(self):
+        fetched = []
+        record = BuildRecord.from_json(json.loads(BUILD_JSON),
+                                       fetch=lambda *args: fetched.append(args) or "full")
+        assert record.full() == "full"
+        assert fetched == [("build-1", "ns")]
+
+        with pytest.raises(OsbsException):
+            BuildRecord.from_json(json.loads(BUILD_JSON)).full()
@@ -0,0 +1,46 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+from flexmock import flexmock
+
+from osbs.build.build_response import BuildResponse
+
+
+class TestBuildResponse(object):
+    def build_json(self, annotations):
+        return {
+            "metadata": {"name": "build-1", "annotations": annotations},
+            "spec": {"output": {"to": {"name": "registry/ns/image:1"}}},
+            "status": {"phase": "Complete"},
+        }
+
+    def test_fields(self):
+        build = BuildResponse(None, self.build_json({"commit_id": "abc"}))
+        assert build.get_build_name() == "build-1"
+        assert build.get_image_tag() == "registry/ns/image:1"
+        assert build.get_commit_id() == "abc"
+        assert build.get_rpm_packages() is None
+        assert build.is_succeeded()
+
+    def test_tar_metadata_decoded_once(self):
+        tar_metadata = {"size": 10, "md5sum": "m", "sha256sum": "s", "filename": "f.tar"}
+        build = BuildResponse(None, self.build_json({"tar_metadata": json.dumps(tar_metadata)}))
+        flexmock(json).should_call("loads").once()
+        assert build.get_tar_metadata_size() == 10
+        assert build.get_tar_metadata_md5sum() == "m"
+        assert build.get_tar_metadata_sha256sum() == "s"
+        assert build.get_tar_metadata_filename() == "f.tar"
+
+    def test_missing_annotations(self):
+        build = BuildResponse(None, self.build_json({}))
+        assert build.get_repositories() is None
+        assert build.get_tar_metadata_size() is None
+        assert build.get_logs() == ""
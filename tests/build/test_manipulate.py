@@ -58,3 +58,39 @@ class TestDockJsonManipulator(object):
         assert plugin['args']['key1']['a'] == '3'
         assert plugin['args']['key1']['b'] == '2'
         assert plugin['args']['key1']['z'] == '9'
+
+    def test_manipulator_index(self):
+        inner = {"prebuild_plugins": [{"name": "a", "args": {"n": 1}},
+                                      {"name": "b"},
+                                      {"name": "a", "args": {"n": 2}}]}
+        m = DockJsonManipulator(None, inner)
+        assert m.dock_json_get_plugin_conf("prebuild_plugins", "a")["args"]["n"] == 1
+        m.dock_json_set_arg("prebuild_plugins", "b", "key", "value")
+        assert inner["prebuild_plugins"][1]["args"] == {"key": "value"}
+
+        # the next plugin of the same name takes over
+        m.remove_plugin("prebuild_plugins", "a")
+        assert m.dock_json_get_plugin_conf("prebuild_plugins", "a")["args"]["n"] == 2
+        m.remove_plugin("prebuild_plugins", "a")
+        assert not m.dock_json_has_plugin_conf("prebuild_plugins", "a")
+        assert inner["prebuild_plugins"] == [{"name": "b", "args": {"key": "value"}}]
+
+        # changed behind the manipulator's back
+        inner["prebuild_plugins"].append({"name": "c"})
+        assert m.dock_json_has_plugin_conf("prebuild_plugins", "c")
+        inner["prebuild_plugins"] = [{"name": "d"}]
+        assert not m.dock_json_has_plugin_conf("prebuild_plugins", "c")
+        assert m.dock_json_has_plugin_conf("prebuild_plugins", "d")
+
+    def test_manipulator_get_plugin_conf_errors(self):
+        m = DockJsonManipulator(None, {"prebuild_plugins": [{"name": "a"}]})
+        with pytest.raises(KeyError):
+            m.dock_json_get_plugin_conf("postbuild_plugins", "a")
+        with pytest.raises(IndexError):
+            m.dock_json_get_plugin_conf("prebuild_plugins", "b")
+
+    def test_manipulator_write_dock_json(self):
+        build_json = copy.deepcopy(TEST_BUILD_JSON)
+        m = DockJsonManipulator(build_json, {"prebuild_plugins": []})
+        m.write_dock_json()
+        assert m.get_dock_json() == {"prebuild_plugins": []}
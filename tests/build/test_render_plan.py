@@ -0,0 +1,123 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+from flexmock import flexmock
+import pytest
+
+from osbs.build import render_plan
+from osbs.build.build_request import BuildRequest, ProductionBuild
+from osbs.build.render_plan import RenderPlan, RenderPlanCache
+from osbs.constants import PROD_BUILD_TYPE
+from tests.constants import INPUTS_PATH
+
+
+TEMPLATE = {
+    "metadata": {},
+    "spec": {
+        "source": {"git": {}, "sourceSecret": {}},
+        "strategy": {"customStrategy": {"secrets": [], "env": []}},
+        "output": {"to": {}},
+    },
+}
+INNER_TEMPLATE = {
+    "prebuild_plugins": [{"name": "check_and_set_rebuild"}, {"name": "koji"}],
+    "postbuild_plugins": [{"name": "import_image"}, {"name": "store_metadata_in_osv3"}],
+    "exit_plugins": [],
+}
+
+
+def compile_plan(template=TEMPLATE, inner_template=INNER_TEMPLATE,
+                 openshift_required_version=(1, 0, 6)):
+    return RenderPlan(json.dumps(template), json.dumps(inner_template),
+                      list(openshift_required_version),
+                      ProductionBuild.plugins_needing_triggers)
+
+
+class TestRenderPlan(object):
+    @pytest.mark.parametrize(('version', 'uses_secrets', 'has_source_secret'), [
+        ((1, 0, 5), False, True),
+        ((1, 0, 6), True, False),
+    ])
+    def test_secrets(self, version, uses_secrets, has_source_secret):
+        plan = compile_plan(openshift_required_version=version)
+        assert plan.uses_secrets is uses_secrets
+        assert plan.has_source_secret is has_source_secret
+        template, _ = plan.new_templates()
+        assert ('secrets' in template['spec']['strategy']['customStrategy']) is uses_secrets
+        assert ('sourceSecret' in template['spec']['source']) is has_source_secret
+
+    def test_no_triggers(self):
+        plan = compile_plan()
+        assert not plan.has_triggers
+        assert not plan.has_plugin('prebuild_plugins', 'check_and_set_rebuild')
+        assert not plan.has_plugin('postbuild_plugins', 'import_image')
+        assert plan.has_plugin('prebuild_plugins', 'koji')
+        _, inner_template = plan.new_templates()
+        assert inner_template['prebuild_plugins'] == [{"name": "koji"}]
+
+    def test_triggers(self):
+        template = json.loads(json.dumps(TEMPLATE))
+        template['spec']['triggers'] = [{"type": "ImageChange"}]
+        plan = compile_plan(template=template)
+        assert plan.has_triggers
+        assert plan.has_plugin('prebuild_plugins', 'check_and_set_rebuild')
+        assert plan.has_plugin('postbuild_plugins', 'import_image')
+
+    def test_metadata_plugin_type(self):
+        assert compile_plan().metadata_plugin_type == 'postbuild_plugins'
+        inner_template = dict(INNER_TEMPLATE, exit_plugins=[{"name": "store_metadata_in_osv3"}])
+        plan = compile_plan(inner_template=inner_template)
+        assert plan.metadata_plugin_type == 'exit_plugins'
+
+    def test_private_copies(self):
+        plan = compile_plan()
+        template, inner_template = plan.new_templates()
+        template['metadata']['name'] = 'changed'
+        inner_template['prebuild_plugins'].pop()
+        assert plan.new_templates() == compile_plan().new_templates()
+
+
+class TestRenderPlanCache(object):
+    def test_compiled_once(self):
+        cache = RenderPlanCache()
+        template, inner_template = json.dumps(TEMPLATE), json.dumps(INNER_TEMPLATE)
+        plan = cache.get("key", template, inner_template, [1, 0, 6])
+        assert cache.get("key", template, inner_template, [1, 0, 6]) is plan
+        assert cache.get("key", template, inner_template, [1, 0, 5]) is not plan
+        assert cache.get("other", template, inner_template, [1, 0, 6]) is not plan
+
+    def test_compiled_again_when_changed(self):
+        cache = RenderPlanCache()
+        template = json.loads(json.dumps(TEMPLATE))
+        plan = cache.get("key", json.dumps(template), json.dumps(INNER_TEMPLATE), [1, 0, 6])
+        template['spec']['triggers'] = [{"type": "ImageChange"}]
+        changed = cache.get("key", json.dumps(template), json.dumps(INNER_TEMPLATE), [1, 0, 6])
+        assert changed is not plan
+        assert changed.has_triggers
+
+    def test_shared_by_build_requests(self):
+        (flexmock(render_plan)
+            .should_receive('RenderPlan')
+            .once()
+            .replace_with(RenderPlan))
+        render_plan.render_plans.clear()
+        for _ in range(3):
+            build_request = BuildRequest.new_by_type(PROD_BUILD_TYPE,
+                                                     build_json_store=INPUTS_PATH)
+            build_request.set_params(git_uri="http://git/", git_ref="master", user="user",
+                                     component="component", base_image="fedora:latest",
+                                     name_label="fedora/image", registry_uri="registry",
+                                     openshift_uri="http://openshift/",
+                                     sources_command="make", architecture="x86_64",
+                                     vendor="vendor", build_host="host",
+                                     authoritative_registry="registry")
+            build_json = build_request.render()
+            assert build_json['metadata']['name'] == build_request.spec.name.value
@@ -0,0 +1,55 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import io
+import json
+
+from flexmock import flexmock
+import pytest
+
+from osbs.build.template_cache import TemplateCache
+
+
+class TestTemplateCache(object):
+    @pytest.fixture
+    def template(self, tmpdir):
+        path = tmpdir.join("prod.json")
+        path.write(json.dumps({"spec": {"triggers": []}}))
+        return str(path)
+
+    def test_private_copies(self, template):
+        cache = TemplateCache()
+        first = cache.load(template)
+        first["spec"]["triggers"].append("changed")
+        assert cache.load(template) == {"spec": {"triggers": []}}
+
+    def test_read_once(self, template):
+        cache = TemplateCache()
+        flexmock(io).should_call("open").once()
+        for _ in range(3):
+            cache.load(template)
+
+    def test_reloaded_when_changed(self, template):
+        cache = TemplateCache()
+        cache.load(template)
+        with open(template, "w") as fp:
+            json.dump({"spec": {"triggers": ["new"]}}, fp)
+        assert cache.load(template) == {"spec": {"triggers": ["new"]}}
+
+    def test_missing(self, tmpdir):
+        with pytest.raises((IOError, OSError)):
+            TemplateCache().load(str(tmpdir.join("missing.json")))
+
+    def test_text_shared_until_changed(self, template):
+        cache = TemplateCache()
+        text = cache.load_text(template)
+        assert cache.load_text(template) is text
+        with open(template, "w") as fp:
+            json.dump({"spec": {"triggers": ["new"]}}, fp)
+        assert json.loads(cache.load_text(template)) == {"spec": {"triggers": ["new"]}}
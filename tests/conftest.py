@@ -0,0 +1,13 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+import sys
+
+collect_ignore = []
+if sys.version_info < (3, 6):
+    # osbs.aio and its tests use async/await syntax
+    collect_ignore.append("test_aio.py")
@@ -43,6 +43,12 @@ class StreamingResponse(object):
     def iter_lines(self):
         yield self.content.decode("utf-8")
 
+    def iter_chunks(self):
+        # small chunks, to exercise incremental decoding
+        content = self.content.decode("utf-8")
+        for i in range(0, len(content), 100):
+            yield content[i:i + 100]
+
     def __enter__(self):
         return self
 
@@ -62,7 +68,8 @@ class Connection(object):
         # The files are captured using the command line tool's
         # --capture-dir parameter, and edited as needed.
         self.DEFINITION = {
-            OAPI_PREFIX + "namespaces/default/builds/": {
+            (OAPI_PREFIX + "namespaces/default/builds/",
+             OAPI_PREFIX + "namespaces/default/builds/?limit=500"): {
                 "get": {
                     # Contains a list of builds
                     "file": "builds_list.json",
@@ -83,6 +90,9 @@ class Connection(object):
                  },
                  "put": {
                      "file": "build_test-build-123.json",
+                 },
+                 "patch": {
+                     "file": "build_test-build-123.json",
                  }
              },
 
@@ -118,6 +128,14 @@ class Connection(object):
                 }
             },
 
+            OAPI_PREFIX + "watch/namespaces/default/builds/": {
+                "get": {
+                    # Single MODIFIED item, with a Build object in
+                    # Completed phase named test-build-123
+                    "file": "watch_build_test-build-123.json",
+                }
+            },
+
             OAPI_PREFIX + "namespaces/default/buildconfigs/": {
                 "post": {
                     # Contains a BuildConfig named test-build-config-123
@@ -143,8 +161,11 @@ class Connection(object):
                  }
              },
 
-            OAPI_PREFIX + "namespaces/default/builds/?labelSelector=buildconfig%%3D%s" %
-            TEST_BUILD_CONFIG: {
+            (OAPI_PREFIX + "namespaces/default/builds/?labelSelector=buildconfig%%3D%s" %
+             TEST_BUILD_CONFIG,
+             OAPI_PREFIX + "namespaces/default/builds/?labelSelector=buildconfig%%3D%s"
+             "&fieldSelector=status%%21%%3DFailed%%2Cstatus%%21%%3DComplete"
+             "%%2Cstatus%%21%%3DError%%2Cstatus%%21%%3DCancelled" % TEST_BUILD_CONFIG): {
                 "get": {
                     # Contains a BuildList with Builds labeled with
                     # buildconfig=fedora23-something, none of which
@@ -200,8 +221,8 @@ class Connection(object):
             raise ValueError("Can't find '%s' in url mapping definition" % key)
 
     @staticmethod
-    def response(status_code=200, content=b'', headers=None):
-        return HttpResponse(status_code, headers or {}, content.decode("utf-8"))
+    def response(status_code=200, content=b'', headers=None, url=None):
+        return HttpResponse(status_code, headers or {}, content.decode("utf-8"), url=url)
 
     def request(self, url, method, stream=None, *args, **kwargs):
         parsed_url = urlparse.urlparse(url)
@@ -215,7 +236,12 @@ class Connection(object):
         if stream:
             return StreamingResponse(**kwargs)
         else:
-            return self.response(**kwargs)
+            return self.response(url=url, **kwargs)
+
+    def request_many(self, requests, max_concurrency=None):
+        for kwargs in requests:
+            kwargs = dict(kwargs)
+            yield self.request(kwargs.pop("url"), kwargs.pop("method", "get"), **kwargs)
 
     def get(self, url, *args, **kwargs):
         return self.request(url, "get", *args, **kwargs)
@@ -226,6 +252,9 @@ class Connection(object):
     def put(self, url, *args, **kwargs):
         return self.request(url, "put", *args, **kwargs)
 
+    def patch(self, url, *args, **kwargs):
+        return self.request(url, "patch", *args, **kwargs)
+
 
 @pytest.fixture(params=["0.5.4", "1.0.4"])
 def openshift(request):
@@ -0,0 +1,164 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+
+
+Minimal HTTP/1.1 server running in a thread, for tests which need real connections, and an
+HTTP/2 server, nghttpd, if it is installed
+"""
+from __future__ import absolute_import, unicode_literals, print_function
+
+import os
+import re
+import socket
+import subprocess
+import threading
+import time
+
+import pytest
+
+try:
+    # py2
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    # py3
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+try:
+    from shutil import which
+except ImportError:
+    # py2
+    from distutils.spawn import find_executable as which
+
+
+class LocalHandler(BaseHTTPRequestHandler):
+    # keep-alive needs HTTP/1.1
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self):
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        body = self.rfile.read(length) if length else b""
+        self.server.requests.append((self.command, self.path, dict(self.headers.items()), body))
+        self.server.connections.add(self.client_address)
+        responses = self.server.responses
+        response = responses.get((self.command, self.path), responses.get(self.path))
+        if response is None:
+            # a callable can look at the query string itself
+            response = responses.get(self.path.split("?", 1)[0])
+        if isinstance(response, list):
+            # one response after another, the last one stays
+            response = response.pop(0) if len(response) > 1 else response[0]
+        if callable(response):
+            response = response(self.command, self.path, self.headers)
+        status, headers, content = response or (
+            200, {"Content-Type": "application/json"}, ('{"path": "%s"}' % self.path).encode("utf-8"))
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = _respond
+
+
+class LocalServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), LocalHandler)
+        self.requests = []
+        self.connections = set()  # client addresses
+        # path or (method, path) -> (status, headers, content), a list of those or a callable
+        # taking (method, path, headers) and returning one; a path without query string
+        # matches any query string
+        self.responses = {}
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+
+@pytest.fixture
+def local_server(request):
+    server = LocalServer()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    def fin():
+        server.shutdown()
+        server.server_close()
+    request.addfinalizer(fin)
+    return server
+
+
+class H2Server(object):
+    """
+    nghttpd serving files from a directory over HTTP/2 with TLS
+    """
+
+    def __init__(self, tmpdir):
+        self.docroot = str(tmpdir.mkdir("docroot"))
+        key, cert = str(tmpdir.join("key.pem")), str(tmpdir.join("cert.pem"))
+        with open(os.devnull, "w") as devnull:
+            subprocess.check_call([which("openssl"), "req", "-x509", "-newkey", "rsa:2048",
+                                   "-nodes", "-keyout", key, "-out", cert,
+                                   "-subj", "/CN=localhost", "-days", "1"],
+                                  stdout=devnull, stderr=devnull)
+
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        self.port = sock.getsockname()[1]
+        sock.close()
+
+        self.log_path = str(tmpdir.join("nghttpd.log"))
+        with open(self.log_path, "w") as log:
+            self.process = subprocess.Popen([which("nghttpd"), "-v", "-d", self.docroot,
+                                             str(self.port), key, cert],
+                                            stdout=log, stderr=subprocess.STDOUT)
+        deadline = time.time() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", self.port)).close()
+                break
+            except socket.error:
+                if time.time() > deadline:
+                    self.stop()
+                    raise
+                time.sleep(0.05)
+
+    @property
+    def url(self):
+        return "https://127.0.0.1:%d" % self.port
+
+    def connections(self):
+        """
+        :return: int, number of HTTP/2 connections the server has seen
+        """
+        with open(self.log_path) as log:
+            # connections which got as far as HTTP/2, not the probes made while starting
+            return len(set(re.findall(r"^\[id=(\d+)\].* recv SETTINGS", log.read(),
+                                      re.MULTILINE)))
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+@pytest.fixture
+def h2_server(request, tmpdir):
+    if not (which("nghttpd") and which("openssl")):
+        pytest.skip("nghttpd and openssl are needed for an HTTP/2 server")
+    server = H2Server(tmpdir)
+    request.addfinalizer(server.stop)
+    return server
@@ -0,0 +1,192 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+import asyncio
+import json
+
+import pytest
+
+from osbs import aio
+from osbs.aio import AsyncHttpSession, AsyncOpenshift
+from osbs.core import Openshift
+from osbs.exceptions import OsbsNetworkException, OsbsResponseException
+from osbs.http import HttpResponse
+
+from tests.constants import TEST_BUILD
+from tests.local_server import local_server
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+def build_json(phase):
+    return {"metadata": {"name": TEST_BUILD}, "status": {"phase": phase}}
+
+
+def watch_event(phase):
+    return json.dumps({"type": "MODIFIED", "object": build_json(phase)})
+
+
+@pytest.fixture
+def async_openshift(local_server):
+    os_inst = Openshift(local_server.url + "/oapi/v1/", "v1", local_server.url + "/oauth/authorize",
+                        k8s_api_url=local_server.url + "/api/v1/", use_auth=False)
+    return AsyncOpenshift(os_inst)
+
+
+class TestAsyncHttpSession(object):
+    def test_concurrent_requests(self, local_server):
+        async def fetch_all():
+            session = AsyncHttpSession()
+            paths = ["/item/%d" % i for i in range(30)]
+            responses = await asyncio.gather(*[session.get(local_server.url + path)
+                                               for path in paths])
+            session.close()
+            return paths, responses
+
+        paths, responses = run(fetch_all())
+        for path, response in zip(paths, responses):
+            assert isinstance(response, HttpResponse)
+            assert response.status_code == 200
+            assert response.json() == {"path": path}
+
+    def test_stream_lines(self, local_server):
+        local_server.responses["/lines"] = (200, {}, b"one\ntwo\nthree")
+
+        async def read_lines():
+            session = AsyncHttpSession()
+            stream = await session.get(local_server.url + "/lines", stream=True)
+            async with stream:
+                return [line async for line in stream.iter_lines()]
+
+        assert run(read_lines()) == ["one", "two", "three"]
+
+    def test_slow_consumer_pauses_transfer(self, local_server, monkeypatch):
+        monkeypatch.setattr(aio, "MAX_QUEUED_CHUNKS", 4)
+        content = b"x" * (4 * 1024 * 1024)
+        local_server.responses["/big"] = (200, {}, content)
+
+        async def read_slowly():
+            session = AsyncHttpSession()
+            stream = await session.get(local_server.url + "/big", stream=True)
+            chunks, max_queued, paused = [], 0, False
+            async with stream:
+                async for chunk in stream.iter_chunks(decode=False):
+                    max_queued = max(max_queued, stream._transfer.chunks.qsize())
+                    paused = paused or stream._transfer.paused
+                    chunks.append(chunk)
+                    await asyncio.sleep(0)
+            session.close()
+            return b"".join(chunks), max_queued, paused
+
+        received, max_queued, paused = run(read_slowly())
+        assert received == content
+        assert paused
+        # the end marker may come on top of the queued chunks
+        assert max_queued <= 4 + 1
+
+    def test_network_error(self):
+        async def fetch():
+            await AsyncHttpSession().get("http://127.0.0.1:1/")
+
+        with pytest.raises(OsbsNetworkException):
+            run(fetch())
+
+
+class TestAsyncOpenshift(object):
+    def test_get_build(self, local_server, async_openshift):
+        path = "/oapi/v1/namespaces/default/builds/%s/" % TEST_BUILD
+        local_server.responses[path] = (200, {}, json.dumps(build_json("Running")).encode())
+        response = run(async_openshift.get_build(TEST_BUILD))
+        assert response.json()["metadata"]["name"] == TEST_BUILD
+
+    def test_create_build(self, local_server, async_openshift):
+        response = run(async_openshift.create_build(json.dumps(build_json("New"))))
+        assert response.status_code == 200
+        method, path, _, body = local_server.requests[-1]
+        assert (method, path) == ("POST", "/oapi/v1/namespaces/default/builds/")
+        assert json.loads(body.decode()) == build_json("New")
+
+    def test_wait_for_build_to_finish(self, local_server, async_openshift):
+        path = "/oapi/v1/watch/namespaces/default/builds/%s/" % TEST_BUILD
+        events = "\n".join([watch_event("Running"), watch_event("Complete")])
+        local_server.responses[path] = (200, {}, events.encode())
+        obj = run(async_openshift.wait_for_build_to_finish(TEST_BUILD))
+        assert obj["status"]["phase"] == "Complete"
+
+    def test_wait_resumes_watch(self, local_server, async_openshift):
+        async_openshift.os.WATCH_RECONNECT_DELAY = 0
+        path = "/oapi/v1/watch/namespaces/default/builds/%s/" % TEST_BUILD
+        running = build_json("Running")
+        running["metadata"]["resourceVersion"] = "10"
+        local_server.responses[path] = (200, {}, json.dumps({"type": "MODIFIED",
+                                                             "object": running}).encode())
+        local_server.responses[path + "?resourceVersion=10"] = (200, {},
+                                                                watch_event("Complete").encode())
+        obj = run(async_openshift.wait_for_build_to_finish(TEST_BUILD))
+        assert obj["status"]["phase"] == "Complete"
+        assert local_server.requests[-1][1] == path + "?resourceVersion=10"
+
+    def test_logs_follow(self, local_server, async_openshift):
+        path = "/oapi/v1/watch/namespaces/default/builds/%s/" % TEST_BUILD
+        local_server.responses[path] = (200, {}, watch_event("Running").encode())
+        path = "/oapi/v1/namespaces/default/builds/%s/log/?follow=1" % TEST_BUILD
+        local_server.responses[path] = (200, {}, b"line 1\nline 2\n")
+
+        async def follow():
+            lines = await async_openshift.logs(TEST_BUILD, follow=True,
+                                               build_json=build_json("Running"))
+            return [line async for line in lines]
+
+        assert run(follow()) == ["line 1", "line 2"]
+
+    def test_watch_retries_server_error(self, local_server, async_openshift):
+        async_openshift.os.WATCH_RECONNECT_DELAY = 0
+        path = "/oapi/v1/watch/namespaces/default/builds/%s/" % TEST_BUILD
+        local_server.responses[path] = [(500, {}, b"internal error"),
+                                        (200, {}, watch_event("Complete").encode())]
+        obj = run(async_openshift.wait_for_build_to_finish(TEST_BUILD))
+        assert obj["status"]["phase"] == "Complete"
+        assert [r[1] for r in local_server.requests] == [path, path]
+
+    def test_watch_gone_lists_again(self, local_server, async_openshift):
+        path = "/oapi/v1/watch/namespaces/default/builds/"
+        local_server.responses[path] = (410, {}, b"too old resource version")
+        builds = {"metadata": {"resourceVersion": "20"}, "items": [build_json("Running")]}
+        local_server.responses["/oapi/v1/namespaces/default/builds/"] = (
+            200, {}, json.dumps(builds).encode())
+
+        async def first_event():
+            watch = async_openshift.watch_builds()
+            try:
+                return await watch.__anext__()
+            finally:
+                await watch.aclose()
+
+        assert run(first_event()) == ("modified", build_json("Running"))
+
+    def test_wait_gone_gets_build(self, local_server, async_openshift):
+        path = "/oapi/v1/watch/namespaces/default/builds/%s/" % TEST_BUILD
+        local_server.responses[path] = (410, {}, b"too old resource version")
+        local_server.responses["/oapi/v1/namespaces/default/builds/%s/" % TEST_BUILD] = (
+            200, {}, json.dumps(build_json("Complete")).encode())
+        obj = run(async_openshift.wait_for_build_to_finish(TEST_BUILD))
+        assert obj["status"]["phase"] == "Complete"
+
+    @pytest.mark.parametrize("status", [500, 410])
+    @pytest.mark.parametrize("follow", [True, False])
+    def test_logs_error(self, local_server, async_openshift, status, follow):
+        path = "/oapi/v1/watch/namespaces/default/builds/%s/" % TEST_BUILD
+        local_server.responses[path] = (200, {}, watch_event("Running").encode())
+        path = "/oapi/v1/namespaces/default/builds/%s/log/?follow=%d" % (TEST_BUILD, follow)
+        local_server.responses[path] = (status, {}, b"no logs")
+
+        with pytest.raises(OsbsResponseException) as exc_info:
+            run(async_openshift.logs(TEST_BUILD, follow=follow,
+                                     build_json=build_json("Running")))
+        assert exc_info.value.status_code == status
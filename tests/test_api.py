@@ -5,16 +5,20 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
+import time
 from types import GeneratorType
 
 from flexmock import flexmock
 import pytest
 import six
 
+from osbs.api import OSBS
+from osbs.conf import Configuration
 from osbs.constants import PROD_BUILD_TYPE, PROD_WITHOUT_KOJI_BUILD_TYPE, SIMPLE_BUILD_TYPE
 from osbs.build.build_request import BuildRequest, SimpleBuild, ProductionBuild
 from osbs.build.build_response import BuildResponse
 from osbs.build.pod_response import PodResponse
+from osbs.exceptions import OsbsException, OsbsTimeoutException
 from osbs.http import HttpResponse
 from osbs import utils
 
@@ -35,6 +39,38 @@ class TestOSBS(object):
         for build in response_list:
             assert build.get_time_created_in_seconds() != 0.0
 
+    def test_iter_builds_api(self, osbs):
+        builds = osbs.iter_builds()
+        assert isinstance(builds, GeneratorType)
+        names = [build.get_build_name() for build in builds]
+        assert names == [build.get_build_name() for build in osbs.list_builds()]
+
+    def test_iter_builds_timeout(self, osbs):
+        builds = osbs.iter_builds(timeout=60)
+        assert isinstance(builds, GeneratorType)
+        next(builds)
+        # the deadline applies only while the generator runs
+        assert osbs.os.time_left() is None
+        list(builds)
+
+        builds = osbs.iter_builds(timeout=0.01)
+        time.sleep(0.02)
+        with pytest.raises(OsbsTimeoutException):
+            list(builds)
+
+    def test_iter_builds_timeout_between_pages(self, osbs):
+        def pages(**kwargs):
+            yield {"metadata": {"name": "first"}}
+            # fetching the next page
+            yield osbs.os.get_build(TEST_BUILD).json()
+
+        flexmock(osbs.os).should_receive("iter_builds").replace_with(pages)
+        builds = osbs.iter_builds(timeout=0.05)
+        assert next(builds).get_build_name() == "first"
+        time.sleep(0.1)
+        with pytest.raises(OsbsTimeoutException):
+            next(builds)
+
     def test_get_pod_for_build(self, osbs):
         pod = osbs.get_pod_for_build(TEST_BUILD)
         assert isinstance(pod, PodResponse)
@@ -108,11 +144,70 @@ class TestOSBS(object):
         build_response = osbs.wait_for_build_to_finish(TEST_BUILD)
         assert isinstance(build_response, BuildResponse)
 
+    def test_wait_for_build_to_finish_timeout(self, osbs):
+        build_response = osbs.wait_for_build_to_finish(TEST_BUILD, timeout=60)
+        assert isinstance(build_response, BuildResponse)
+        # the deadline ends with the call
+        assert osbs.os.time_left() is None
+
+    def test_timeout_sets_deadline(self, osbs):
+        no_deadline = osbs.os.deadline(None)
+        (flexmock(osbs.os)
+            .should_receive("deadline")
+            .with_args(5)
+            .once()
+            .and_return(no_deadline))
+        assert isinstance(osbs.get_build(TEST_BUILD, timeout=5), BuildResponse)
+
+    def test_list_build_records(self, osbs):
+        builds = osbs.list_builds()
+        records = osbs.list_build_records()
+        assert [r.get_build_name() for r in records] == [b.get_build_name() for b in builds]
+        assert [r.status for r in records] == [b.status for b in builds]
+
+        (flexmock(osbs)
+            .should_receive("get_build")
+            .with_args(records[0].name, "default")
+            .and_return(builds[0])
+            .once())
+        # a fresh record, fetching through the mocked method
+        assert osbs.list_build_records()[0].full() is builds[0]
+
     def test_get_build_api(self, osbs):
         response = osbs.get_build(TEST_BUILD)
         # We should get a BuildResponse
         assert isinstance(response, BuildResponse)
 
+    def test_get_builds_api(self, osbs):
+        response_list = osbs.get_builds([TEST_BUILD])
+        assert len(response_list) == 1
+        assert isinstance(response_list[0], BuildResponse)
+        assert response_list[0].get_build_name() == TEST_BUILD
+
+    def test_builds_from_reflector(self, osbs):
+        running = {"metadata": {"name": TEST_BUILD, "labels": {"buildconfig": "bc"}},
+                   "status": {"phase": "Running"}}
+        reflector = (flexmock(is_running=lambda: True)
+                     .should_receive("list_builds")
+                     .with_args(build_config_id="bc", phases=["pending", "new", "running"])
+                     .and_return([running])
+                     .mock())
+        reflector.should_receive("list_builds").with_args(labels=None).and_return([running])
+        reflector.should_receive("get_build").with_args(TEST_BUILD).and_return(running)
+        osbs._reflectors["default"] = reflector
+        # nothing may be requested from the server
+        flexmock(osbs.os).should_receive("list_builds").never()
+        flexmock(osbs.os).should_receive("get_build").never()
+
+        assert [b.get_build_name() for b in osbs.list_builds()] == [TEST_BUILD]
+        assert osbs.get_build(TEST_BUILD).json == running
+        running_builds = osbs._get_running_builds_for_build_config("bc")
+        assert [b.get_build_name() for b in running_builds] == [TEST_BUILD]
+
+    def test_stopped_reflector_not_used(self, osbs):
+        osbs._reflectors["default"] = flexmock(is_running=lambda: False)
+        assert osbs.get_build(TEST_BUILD).get_build_name() == TEST_BUILD
+
     def test_get_build_request_api(self, osbs):
         build = osbs.get_build_request()
         assert isinstance(build, BuildRequest)
@@ -156,3 +251,19 @@ class TestOSBS(object):
         logs = osbs.get_docker_build_logs(TEST_BUILD, decode_logs=decode_docker_logs)
         assert isinstance(logs, tuple(list(six.string_types) + [bytes]))
         assert logs.split('\n')[0].find("Step ") != -1
+
+
+class TestRetries(object):
+    def test_no_retries_by_default(self):
+        conf = Configuration(conf_file=None, openshift_uri="https://example:8443")
+        assert OSBS(conf, conf).os._con.retry_policy is None
+
+    def test_max_retries(self):
+        conf = Configuration(conf_file=None, openshift_uri="https://example:8443",
+                             max_retries="2")
+        assert OSBS(conf, conf).os._con.retry_policy.max_attempts == 3
+
+    def test_invalid_max_retries(self):
+        conf = Configuration(conf_file=None, max_retries="many")
+        with pytest.raises(OsbsException):
+            conf.get_max_retries()
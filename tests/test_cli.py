@@ -5,9 +5,13 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
+import json
 import sys
 
-from osbs.cli.main import str_on_2_unicode_on_3
+import pytest
+
+from osbs.cli.main import (str_on_2_unicode_on_3, print_json_nicely, print_json_list_nicely,
+                           cli)
 
 
 class TestStrOn2UnicodeOn3(object):
@@ -21,3 +25,36 @@ class TestStrOn2UnicodeOn3(object):
             s = u"s"
             assert str_on_2_unicode_on_3(s) == b
             assert str_on_2_unicode_on_3(b) == b
+
+
+class TestPrintJsonListNicely(object):
+    @pytest.mark.parametrize("items", [
+        [],
+        [{"a": 1}],
+        [{"a": [1, 2], "b": {"c": "multi\nline"}}, "x", 3],
+    ])
+    def test_same_as_print_json_nicely(self, capsys, items):
+        print_json_nicely(items)
+        expected = capsys.readouterr()[0]
+        print_json_list_nicely(iter(items))
+        output = capsys.readouterr()[0]
+        assert json.loads(output) == items
+        # json.dumps() on py2 leaves a space after "," at the end of lines
+        assert [line.rstrip() for line in output.splitlines()] == \
+            [line.rstrip() for line in expected.splitlines()]
+
+
+class TestLabelArgument(object):
+    def test_key_value(self, monkeypatch):
+        monkeypatch.setattr(sys, "argv", ["osbs", "list-builds", "--label", "a=b=c",
+                                          "--label", "d="])
+        _, args = cli()
+        assert dict(args.label) == {"a": "b=c", "d": ""}
+
+    @pytest.mark.parametrize("label", ["foo", "=bar"])
+    def test_invalid(self, monkeypatch, capsys, label):
+        monkeypatch.setattr(sys, "argv", ["osbs", "list-builds", "--label", label])
+        with pytest.raises(SystemExit) as exc_info:
+            cli()
+        assert exc_info.value.code == 2
+        assert "expected key=value" in capsys.readouterr()[1]
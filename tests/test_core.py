@@ -5,13 +5,35 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
+import json
+import threading
+import time
+
+from flexmock import flexmock
+import pytest
 import six
+from six.moves.urllib import parse as urlparse
 
+from osbs.core import BuildWatchHub, BuildReflector, Openshift
+from osbs.token_cache import TokenCache
+from osbs.exceptions import OsbsResponseException, OsbsTimeoutException, OsbsWatchBuildNotFound
 from osbs.http import HttpResponse
-from osbs.constants import BUILD_FINISHED_STATES
+from osbs.constants import BUILD_FINISHED_STATES, PATCH_MERGE
+
+from tests.constants import TEST_BUILD, TEST_BUILD_CONFIG, TEST_LABEL, TEST_LABEL_VALUE
+from tests.fake_api import openshift, OAPI_PREFIX, API_VER
+from tests.local_server import local_server
+
 
-from tests.constants import TEST_BUILD, TEST_LABEL, TEST_LABEL_VALUE
-from tests.fake_api import openshift
+@pytest.fixture
+def os_local(local_server):
+    """
+    Openshift talking to local_server without authentication, reconnecting watches at once
+    """
+    os_inst = Openshift(local_server.url + "/oapi/v1/", "v1",
+                        local_server.url + "/oauth/authorize", use_auth=False)
+    os_inst.WATCH_RECONNECT_DELAY = 0
+    return os_inst
 
 
 class TestOpenshift(object):
@@ -29,6 +51,93 @@ class TestOpenshift(object):
                                        TEST_BUILD)
         assert isinstance(response, HttpResponse)
 
+    def test_iter_builds_pages(self, local_server, os_local):
+        pages = {
+            None: {"metadata": {"continue": "next"},
+                   "items": [{"metadata": {"name": "b1"}}, {"metadata": {"name": "b2"}}]},
+            "next": {"metadata": {},
+                     "items": [{"metadata": {"name": "b3"}}]},
+        }
+
+        def respond(method, path, headers):
+            query = urlparse.parse_qs(urlparse.urlparse(path).query)
+            page = pages[query.get("continue", [None])[0]]
+            return 200, {}, json.dumps(page).encode()
+
+        local_server.responses["/oapi/v1/namespaces/default/builds/"] = respond
+
+        builds = os_local.iter_builds(page_size=2)
+        assert next(builds)["metadata"]["name"] == "b1"
+        # the second page isn't requested before it is needed
+        assert len(local_server.requests) == 1
+        assert [b["metadata"]["name"] for b in builds] == ["b2", "b3"]
+        queries = [urlparse.parse_qs(urlparse.urlparse(path).query)
+                   for _, path, _, _ in local_server.requests]
+        assert queries == [{"limit": ["2"]}, {"limit": ["2"], "continue": ["next"]}]
+
+    def test_iter_builds_continue_expired(self, local_server, os_local):
+        pages = {
+            None: {"metadata": {"continue": "next"},
+                   "items": [{"metadata": {"name": "b1"}}, {"metadata": {"name": "b2"}}]},
+            "next": {"metadata": {},
+                     "items": [{"metadata": {"name": "b3"}}]},
+        }
+        expired = ["next"]
+
+        def respond(method, path, headers):
+            query = urlparse.parse_qs(urlparse.urlparse(path).query)
+            continue_token = query.get("continue", [None])[0]
+            if continue_token in expired:
+                expired.remove(continue_token)
+                return 410, {}, b'{"kind": "Status", "reason": "Expired"}'
+            return 200, {}, json.dumps(pages[continue_token]).encode()
+
+        local_server.responses["/oapi/v1/namespaces/default/builds/"] = respond
+
+        names = [b["metadata"]["name"] for b in os_local.iter_builds(page_size=2)]
+        # the list starts over, the builds seen already are skipped
+        assert names == ["b1", "b2", "b3"]
+        assert len(local_server.requests) == 4
+
+    def test_iter_builds_gone(self, local_server, os_local):
+        local_server.responses["/oapi/v1/namespaces/default/builds/"] = (410, {}, b"gone")
+        with pytest.raises(OsbsResponseException) as exc_info:
+            list(os_local.iter_builds(page_size=2))
+        assert exc_info.value.status_code == 410
+
+    def test_list_builds_selectors(self, local_server, os_local):
+        os_local.list_builds(build_config_id="bc", field_selector="status!=Complete",
+                            labels={"user": "me"})
+        path = local_server.requests[-1][1]
+        query = urlparse.parse_qs(urlparse.urlparse(path).query)
+        assert query == {"labelSelector": ["buildconfig=bc,user=me"],
+                         "fieldSelector": ["status!=Complete"]}
+
+    def test_iter_pods(self, openshift):
+        label = "openshift.io/build.name=%s" % TEST_BUILD
+        pods = list(openshift.iter_pods(label=label))
+        assert pods == openshift.list_pods(label=label).json()["items"]
+
+    def test_iter_build_configs_error(self, local_server, os_local):
+        local_server.responses["/oapi/v1/namespaces/default/buildconfigs/?labelSelector=a%3Db"] = (
+            403, {}, b'{"kind": "Status", "message": "forbidden"}')
+        with pytest.raises(OsbsResponseException) as exc_info:
+            list(os_local.iter_build_configs(labels={"a": "b"}))
+        assert exc_info.value.status_code == 403
+
+    def test_get_builds(self, openshift):
+        responses = dict(openshift.get_builds([TEST_BUILD]))
+        assert responses[TEST_BUILD].json()["metadata"]["name"] == TEST_BUILD
+
+    def test_get_build_configs(self, openshift):
+        responses = dict(openshift.get_build_configs([TEST_BUILD_CONFIG]))
+        assert responses[TEST_BUILD_CONFIG].status_code == 404
+
+    def test_list_pods_in_namespaces(self, openshift):
+        label = "openshift.io/build.name=%s" % TEST_BUILD
+        responses = dict(openshift.list_pods_in_namespaces(["default"], label=label))
+        assert responses["default"].json()["items"]
+
     def test_get_oauth_token(self, openshift):
         token = openshift.get_oauth_token()
         assert token is not None
@@ -45,8 +154,365 @@ class TestOpenshift(object):
         assert isinstance(TEST_BUILD, six.text_type)
         assert isinstance(status_lower, six.text_type)
 
+    def test_watch_build_with_hub(self, openshift):
+        openshift.watch_hub = BuildWatchHub(openshift)
+        response = openshift.wait_for_build_to_finish(TEST_BUILD)
+        assert response["metadata"]["name"] == TEST_BUILD
+        assert response["status"]["phase"].lower() in BUILD_FINISHED_STATES
+
+    def test_watch_hub_dispatch(self, openshift):
+        waiters = 5
+        subscribed = []
+        all_subscribed = threading.Event()
+
+        def get_build(build_id, namespace):
+            # the build can't be fetched, so the result has to come from the namespace watch
+            subscribed.append(build_id)
+            if len(subscribed) == waiters:
+                all_subscribed.set()
+            raise OsbsResponseException("not found", 404)
+
+        watch = openshift.watch
+
+        def delayed_watch(*args, **kwargs):
+            # don't let the event go by before everybody waits for it
+            all_subscribed.wait(10)
+            return watch(*args, **kwargs)
+
+        openshift.get_build = get_build
+        openshift.watch = delayed_watch
+        hub = BuildWatchHub(openshift)
+
+        results = []
+
+        def wait():
+            results.append(hub.wait(TEST_BUILD, BUILD_FINISHED_STATES))
+
+        threads = [threading.Thread(target=wait) for _ in range(waiters)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        assert len(results) == waiters
+        assert all(obj["metadata"]["name"] == TEST_BUILD for obj in results)
+        # nobody is waiting any more, so the watch was stopped
+        assert not hub._watches
+
     def test_create_build(self, openshift):
         response = openshift.create_build({})
         assert response is not None
         assert response.json()["metadata"]["name"] == TEST_BUILD
         assert response.json()["status"]["phase"].lower() in BUILD_FINISHED_STATES
+
+
+def build_json(phase, resource_version):
+    return {"metadata": {"name": TEST_BUILD, "resourceVersion": resource_version},
+            "status": {"phase": phase}}
+
+
+def watch_event(phase, resource_version, changetype="MODIFIED"):
+    return json.dumps({"type": changetype, "object": build_json(phase, resource_version)})
+
+
+class TestWatchResumption(object):
+    WATCH_PATH = "/oapi/v1/watch/namespaces/default/builds/%s/" % TEST_BUILD
+    BUILD_PATH = "/oapi/v1/namespaces/default/builds/%s/" % TEST_BUILD
+
+    def requested_paths(self, local_server):
+        return [path for _, path, _, _ in local_server.requests]
+
+    def test_resume_from_last_resource_version(self, local_server, os_local):
+        local_server.responses[self.WATCH_PATH] = (200, {}, watch_event("Running", "10").encode())
+        local_server.responses[self.WATCH_PATH + "?resourceVersion=10"] = (
+            200, {}, watch_event("Complete", "11").encode())
+
+        obj = os_local.wait_for_build_to_finish(TEST_BUILD)
+        assert obj["status"]["phase"] == "Complete"
+        assert self.requested_paths(local_server) == [self.WATCH_PATH,
+                                                      self.WATCH_PATH + "?resourceVersion=10"]
+
+    @pytest.mark.parametrize("gone", [
+        (410, {}, b'{"kind": "Status", "code": 410}'),
+        (200, {}, json.dumps({"type": "ERROR",
+                              "object": {"kind": "Status", "code": 410}}).encode()),
+    ])
+    def test_relist_when_gone(self, local_server, os_local, gone):
+        local_server.responses[self.WATCH_PATH] = (200, {}, watch_event("Running", "10").encode())
+        local_server.responses[self.WATCH_PATH + "?resourceVersion=10"] = gone
+        local_server.responses[self.BUILD_PATH] = (
+            200, {}, json.dumps(build_json("Complete", "20")).encode())
+
+        obj = os_local.wait_for_build_to_finish(TEST_BUILD)
+        assert obj["metadata"]["resourceVersion"] == "20"
+        assert self.requested_paths(local_server) == [self.WATCH_PATH,
+                                                      self.WATCH_PATH + "?resourceVersion=10",
+                                                      self.BUILD_PATH]
+
+    def test_deleted_build(self, local_server, os_local):
+        local_server.responses[self.WATCH_PATH] = (
+            200, {}, watch_event("Running", "10", changetype="DELETED").encode())
+        with pytest.raises(OsbsWatchBuildNotFound):
+            os_local.wait_for_build_to_finish(TEST_BUILD)
+
+
+class TestBuildReflector(object):
+    @staticmethod
+    def build(name, build_config, phase, created):
+        return {"metadata": {"name": name, "labels": {"buildconfig": build_config},
+                             "creationTimestamp": created},
+                "status": {"phase": phase}}
+
+    def test_list_and_watch(self, local_server, os_local):
+        b1 = self.build("b1", "bc1", "Running", "2016-01-01T10:00:00Z")
+        b2 = self.build("b2", "bc1", "Complete", "2016-01-01T11:00:00Z")
+        b3 = self.build("b3", "bc2", "New", "2016-01-01T12:00:00Z")
+        b4 = self.build("b4", "bc2", "Pending", "2016-01-01T13:00:00Z")
+        local_server.responses["/oapi/v1/namespaces/default/builds/"] = (
+            200, {}, json.dumps({"metadata": {"resourceVersion": "5"},
+                                 "items": [b3, b2, b1]}).encode())
+        b3_running = self.build("b3", "bc2", "Running", "2016-01-01T12:00:00Z")
+        events = [{"type": "MODIFIED", "object": b3_running},
+                  {"type": "DELETED", "object": b2},
+                  {"type": "ADDED", "object": b4}]
+        local_server.responses["/oapi/v1/watch/namespaces/default/builds/?resourceVersion=5"] = (
+            200, {}, "\n".join(json.dumps(event) for event in events).encode())
+
+        reflector = BuildReflector(os_local)
+        reflector.start()
+        try:
+            assert reflector.wait_for_sync(10)
+            deadline = time.time() + 10
+            while reflector.get_build("b4") is None and time.time() < deadline:
+                time.sleep(0.01)
+
+            assert reflector.list_builds() == [b1, b3_running, b4]
+            assert reflector.get_build("b2") is None
+            assert reflector.list_builds(build_config_id="bc1") == [b1]
+            assert reflector.list_builds(phases=["running"]) == [b1, b3_running]
+            assert reflector.list_builds(build_config_id="bc2", phases=["pending", "new"]) == [b4]
+            assert reflector.list_builds(created_since="2016-01-01T12:00:00Z") == [b3_running, b4]
+            assert reflector.list_builds(labels={"buildconfig": "bc2"}) == [b3_running, b4]
+            # get_build() returns a copy, list_builds() the stored builds without copying
+            reflector.get_build("b1")["status"]["phase"] = "Failed"
+            assert reflector.get_build("b1") == b1
+            assert reflector.list_builds()[0] is reflector.list_builds()[0]
+        finally:
+            reflector.stop()
+
+    def test_list_fails(self, local_server, os_local):
+        local_server.responses["/oapi/v1/namespaces/default/builds/"] = (403, {}, b"{}")
+        reflector = BuildReflector(os_local)
+        reflector.start()
+        assert not reflector.wait_for_sync(10)
+        assert isinstance(reflector.error, OsbsResponseException)
+
+
+class TestPatch(object):
+    BUILD_PATH = "/oapi/v1/namespaces/default/builds/%s" % TEST_BUILD
+
+    def build(self, labels, resource_version):
+        return json.dumps({"metadata": {"name": TEST_BUILD, "labels": labels,
+                                        "resourceVersion": resource_version}}).encode()
+
+    def patches(self, local_server):
+        return [json.loads(body.decode()) for method, _, headers, body in local_server.requests
+                if method == "PATCH" and headers["Content-Type"] == PATCH_MERGE]
+
+    def test_update_is_single_patch(self, local_server, os_local):
+        os_local.update_annotations_on_build(TEST_BUILD, {"a": "1"})
+        assert len(local_server.requests) == 1
+        assert self.patches(local_server) == [{"metadata": {"annotations": {"a": "1"}}}]
+
+    def test_set_removes_other_keys(self, local_server, os_local):
+        local_server.responses[("GET", self.BUILD_PATH)] = (
+            200, {}, self.build({"a": "1", "b": "2"}, "5"))
+        os_local.set_labels_on_build(TEST_BUILD, {"b": "2", "c": "3"})
+        assert self.patches(local_server) == [
+            {"metadata": {"labels": {"a": None, "c": "3"}, "resourceVersion": "5"}}]
+
+    def test_set_retries_on_conflict(self, local_server, os_local):
+        local_server.responses[("GET", self.BUILD_PATH)] = [
+            (200, {}, self.build({"a": "1"}, "5")),
+            (200, {}, self.build({"a": "1", "b": "2"}, "6")),
+        ]
+        local_server.responses[("PATCH", self.BUILD_PATH)] = [
+            (409, {}, b'{"kind": "Status", "code": 409}'),
+            (200, {}, self.build({"c": "3"}, "7")),
+        ]
+        response = os_local.set_labels_on_build(TEST_BUILD, {"c": "3"})
+        assert response.status_code == 200
+        assert self.patches(local_server) == [
+            {"metadata": {"labels": {"a": None, "c": "3"}, "resourceVersion": "5"}},
+            {"metadata": {"labels": {"a": None, "b": None, "c": "3"}, "resourceVersion": "6"}},
+        ]
+
+    def test_set_gives_up_on_conflicts(self, local_server, os_local):
+        local_server.responses[("GET", self.BUILD_PATH)] = (200, {}, self.build({}, "5"))
+        local_server.responses[("PATCH", self.BUILD_PATH)] = (409, {}, b"{}")
+        with pytest.raises(OsbsResponseException) as exc_info:
+            os_local.set_labels_on_build(TEST_BUILD, {"c": "3"})
+        assert exc_info.value.status_code == 409
+        assert len(self.patches(local_server)) == os_local.PATCH_CONFLICT_RETRIES
+
+    def test_cancel_build(self, local_server, os_local):
+        os_local.cancel_build(TEST_BUILD)
+        assert len(local_server.requests) == 1
+        assert self.patches(local_server) == [{"status": {"phase": "Cancelled"}}]
+
+
+class TestTokenCache(object):
+    def test_token_reused(self, openshift, tmpdir):
+        cache_file = str(tmpdir.join("tokens.json"))
+        openshift.token_cache = TokenCache(cache_file)
+        token = openshift.get_oauth_token()
+
+        os_inst = Openshift(OAPI_PREFIX, API_VER, "/oauth/authorize", use_auth=True,
+                            use_token_cache=True, token_cache_file=cache_file)
+        flexmock(os_inst._con).should_receive("get").never()
+        assert os_inst.get_oauth_token() == token.decode("utf-8")
+
+    def test_rejected_token_dropped(self, local_server, tmpdir):
+        oauth_url = local_server.url + "/oauth/authorize"
+        cache = TokenCache(str(tmpdir.join("tokens.json")))
+        cache.set(oauth_url, "user:me", "stale")
+        local_server.responses["/oapi/v1/users/~/"] = (401, {}, b"{}")
+        os_inst = Openshift(local_server.url + "/oapi/v1/", "v1", oauth_url,
+                            username="me", password="secret",
+                            use_token_cache=True, token_cache_file=cache.path)
+
+        with pytest.raises(OsbsResponseException) as exc_info:
+            os_inst.get_user()
+        assert exc_info.value.status_code == 401
+        user_requests = [request for request in local_server.requests
+                         if request[1] == "/oapi/v1/users/~/"]
+        assert [headers["Authorization"] for _, _, headers, _ in user_requests] == \
+            ["Bearer stale"]
+        # the OAuth server didn't hand out a new token
+        assert os_inst.token is None
+        assert cache.get(oauth_url, "user:me") is None
+
+
+class TestDeadline(object):
+    WATCH_PATH = "/oapi/v1/watch/namespaces/default/builds/%s/" % TEST_BUILD
+
+    def test_nested(self, os_local):
+        assert os_local.time_left() is None
+        with os_local.deadline(10):
+            with os_local.deadline(None):
+                assert 9 < os_local.time_left() <= 10
+            with os_local.deadline(1):
+                assert os_local.time_left() <= 1
+            with os_local.deadline(100):
+                assert os_local.time_left() <= 10
+        assert os_local.time_left() is None
+
+    def test_request(self, local_server, os_local):
+        def slow(method, path, headers):
+            time.sleep(1)
+            return 200, {}, b"{}"
+
+        local_server.responses["/oapi/v1/users/~/"] = slow
+        with os_local.deadline(0.2):
+            with pytest.raises(OsbsTimeoutException):
+                os_local.get_user()
+            # nothing is sent once the time is up
+            time.sleep(0.2)
+            with pytest.raises(OsbsTimeoutException):
+                os_local.get_build(TEST_BUILD)
+        assert len(local_server.requests) == 1
+
+    def test_watch(self, local_server, os_local):
+        # the build never finishes, the watch keeps reconnecting
+        os_local.WATCH_RECONNECT_DELAY = 0.1
+        local_server.responses[self.WATCH_PATH] = (200, {}, b"")
+        start = time.time()
+        with os_local.deadline(0.5):
+            with pytest.raises(OsbsTimeoutException):
+                os_local.wait_for_build_to_finish(TEST_BUILD)
+        assert time.time() - start < 1.5
+
+    def test_watch_hub(self, openshift):
+        hub = BuildWatchHub(openshift)
+        flexmock(openshift).should_receive("get_build").and_return(
+            HttpResponse(200, {}, json.dumps(build_json("Running", "1"))))
+        flexmock(hub).should_receive("_subscribe")
+        flexmock(hub).should_receive("_unsubscribe")
+        with openshift.deadline(0.1):
+            with pytest.raises(OsbsTimeoutException):
+                hub.wait(TEST_BUILD, BUILD_FINISHED_STATES)
+
+
+class TestReauthentication(object):
+    OAUTH_PATH = "/oauth/authorize?response_type=token&client_id=openshift-challenging-client"
+
+    @pytest.fixture
+    def os_auth(self, local_server):
+        tokens = ["stale", "fresh"]
+
+        def oauth(method, path, headers):
+            # give the other rejected threads time to pile up
+            time.sleep(0.1)
+            return (302, {"Location": "https://example.com/#access_token=%s" % tokens.pop(0)},
+                    b"")
+
+        def api(method, path, headers):
+            if headers.get("Authorization") == "Bearer fresh":
+                return (200, {}, b'{"metadata": {"name": "me"}}')
+            return (401, {}, b"{}")
+
+        local_server.responses[self.OAUTH_PATH] = oauth
+        local_server.responses["/oapi/v1/users/~/"] = api
+        local_server.responses["/oapi/v1/namespaces/default/builds/"] = api
+        local_server.responses["/oapi/v1/namespaces/default/builds/%s/" % TEST_BUILD] = api
+        return Openshift(local_server.url + "/oapi/v1/", "v1",
+                         local_server.url + "/oauth/authorize",
+                         username="me", password="secret")
+
+    def oauth_requests(self, local_server):
+        return [path for _, path, _, _ in local_server.requests if path == self.OAUTH_PATH]
+
+    def test_single_flight_refresh(self, local_server, os_auth):
+        os_auth.get_oauth_token()
+        results = []
+
+        def get_user():
+            results.append(os_auth.get_user().json())
+
+        threads = [threading.Thread(target=get_user) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        assert results == [{"metadata": {"name": "me"}}] * 10
+        assert len(self.oauth_requests(local_server)) == 2
+
+    def test_post_not_replayed(self, local_server, os_auth):
+        assert os_auth.create_build("{}").status_code == 401
+        posts = [request for request in local_server.requests if request[0] == "POST"]
+        assert len(posts) == 1
+        # the next request goes with the new token
+        assert os_auth.create_build("{}").status_code == 200
+
+    def test_merge_patch_replayed(self, local_server, os_auth):
+        os_auth.get_oauth_token()
+        assert os_auth.cancel_build(TEST_BUILD).status_code == 200
+        patches = [request for request in local_server.requests if request[0] == "PATCH"]
+        assert len(patches) == 2
+
+    def test_batch_replayed(self, local_server, os_auth):
+        os_auth.get_oauth_token()
+        responses = dict(os_auth.get_builds([TEST_BUILD]))
+        assert responses[TEST_BUILD].status_code == 200
+
+    def test_token_kept_during_refresh(self, local_server, os_auth):
+        os_auth.get_oauth_token()
+        seen = []
+
+        def oauth(method, path, headers):
+            # another thread asking for the token now must not find it missing
+            seen.append(os_auth.token)
+            return (302, {"Location": "https://example.com/#access_token=fresh"}, b"")
+
+        local_server.responses[self.OAUTH_PATH] = oauth
+        assert os_auth.get_user().json() == {"metadata": {"name": "me"}}
+        assert seen == ["stale"]
@@ -5,16 +5,23 @@ All rights reserved.
 This software may be modified and distributed under the terms
 of the BSD license. See the LICENSE file for details.
 """
+import json
 import logging
+import os
+import time
+import zlib
 
 from flexmock import flexmock
 import pycurl
 import pytest
 
+from osbs.exceptions import OsbsException, OsbsTimeoutException
 import osbs.http as osbs_http
-from osbs.http import parse_headers, HttpSession, HttpStream
+from osbs.http import (parse_headers, HttpSession, HttpStream, HttpResponse, CurlPool,
+                       LineSplitter, JsonItemsDecoder, RetryPolicy, parse_retry_after)
 
 from tests.fake_api import Connection, ResponseMapping
+from tests.local_server import local_server, h2_server
 
 logger = logging.getLogger(__file__)
 
@@ -169,3 +176,374 @@ class TestHttpStream(object):
             assert r.content == expected_content
         finally:
             HttpStream._perform = orig_perform
+
+
+class TestLineSplitter(object):
+    @pytest.mark.parametrize('text', [
+        "",
+        "one",
+        "one\ntwo\n",
+        "one\r\ntwo\rthree\n\nfour",
+        "\n\r\n\r",
+        "a\r\n\nb\n",
+    ])
+    def test_any_chunking(self, text):
+        # every way of cutting the text into two or three chunks
+        for i in range(len(text) + 1):
+            for j in range(i, len(text) + 1):
+                chunks = [text[:i], text[i:j], text[j:]]
+                lines = list(HttpStream._split_lines_from_chunks(chunks))
+                assert lines == text.splitlines(), chunks
+
+    def test_lf_chunk_after_cr(self):
+        # LF which ends CRLF on its own must not swallow the next LF
+        chunks = ["a\r", "\n", "\n", "b\n"]
+        assert list(HttpStream._split_lines_from_chunks(chunks)) == ["a", "", "b"]
+
+    def test_long_line(self):
+        line = "x" * 100000
+        chunks = [line[i:i + 10] for i in range(0, len(line), 10)] + ["\nend"]
+        assert list(HttpStream._split_lines_from_chunks(chunks)) == [line, "end"]
+
+    def test_max_line_length(self):
+        splitter = LineSplitter(max_line_length=5)
+        assert splitter.feed("12345\n123") == ["12345"]
+        with pytest.raises(OsbsException):
+            splitter.feed("456")
+        with pytest.raises(OsbsException):
+            LineSplitter(max_line_length=5).feed("123456\n")
+
+
+class TestJsonItemsDecoder(object):
+    DOCUMENT = {
+        "kind": "BuildList",
+        "metadata": {"resourceVersion": "10", "continue": "abc"},
+        "items": [{"metadata": {"name": "b%d" % i},
+                   "status": {"phase": "Complete", "message": "say \\\"hi\\\" [{"},
+                   "spec": {"n": [1, -2.5e3, True, None, []]}} for i in range(10)],
+        "apiVersion": "v1",
+    }
+
+    @pytest.mark.parametrize('indent', [None, 2])
+    @pytest.mark.parametrize('chunk_size', [1, 2, 7, 4096])
+    def test_any_chunking(self, indent, chunk_size):
+        text = json.dumps(self.DOCUMENT, indent=indent)
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        decoder = JsonItemsDecoder()
+        assert list(decoder.iter_items(chunks)) == self.DOCUMENT["items"]
+        document = dict(self.DOCUMENT)
+        del document["items"]
+        assert decoder.document == document
+
+    def test_no_items(self):
+        decoder = JsonItemsDecoder()
+        assert list(decoder.iter_items(['{"kind": "Status", "code": 403}'])) == []
+        assert decoder.document == {"kind": "Status", "code": 403}
+
+    @pytest.mark.parametrize('text', ['{"items": [{}', '[1, 2]', '{"items": [1, 2]}}'])
+    def test_invalid(self, text):
+        with pytest.raises(ValueError):
+            list(JsonItemsDecoder().iter_items([text]))
+
+
+class TestRawContent(object):
+    def test_raw_chunks(self, local_server):
+        local_server.responses["/log"] = (200, {"Content-Type": "text/plain; charset=utf-8"},
+                                          "\u010d\n".encode("utf-8") * 1000)
+        stream = HttpSession().get(local_server.url + "/log", stream=True)
+        chunks = list(stream.iter_chunks(decode=False))
+        assert all(isinstance(chunk, bytes) for chunk in chunks)
+        assert b"".join(chunks) == "\u010d\n".encode("utf-8") * 1000
+
+    def test_content_decoded_lazily(self, local_server):
+        local_server.responses["/user"] = (200, {"Content-Type": "application/json"},
+                                           '{"name": "\u010d"}'.encode("utf-8"))
+        response = HttpSession().get(local_server.url + "/user")
+        assert response.raw_content == '{"name": "\u010d"}'.encode("utf-8")
+        assert response.json() == {"name": "\u010d"}
+        assert response._content is None
+        assert response.content == '{"name": "\u010d"}'
+
+    def test_decoded_content(self):
+        response = HttpResponse(200, {}, '{"a": 1}')
+        assert response.raw_content is None
+        assert response.json() == {"a": 1}
+
+
+class TestCompression(object):
+    CONTENT = b'{"items": [' + b", ".join([b'{"line": "build log line"}'] * 1000) + b"]}"
+
+    def gzipped(self, method, path, headers):
+        if "gzip" not in headers.get("Accept-Encoding", ""):
+            return 200, {}, self.CONTENT
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip format
+        return (200, {"Content-Encoding": "gzip"},
+                compressor.compress(self.CONTENT) + compressor.flush())
+
+    def test_decompressed(self, local_server):
+        local_server.responses["/list"] = self.gzipped
+        response = HttpSession(compression=True).get(local_server.url + "/list")
+        assert response.raw_content == self.CONTENT
+        assert len(response.json()["items"]) == 1000
+
+    def test_decompressed_stream(self, local_server):
+        local_server.responses["/list"] = self.gzipped
+        stream = HttpSession(compression=True).get(local_server.url + "/list", stream=True)
+        assert "".join(stream.iter_lines()) == self.CONTENT.decode()
+
+    def test_disabled(self, local_server):
+        HttpSession().get(local_server.url + "/list")
+        assert "Accept-Encoding" not in local_server.requests[-1][2]
+
+
+class TestTimeouts(object):
+    def slow(self, method, path, headers):
+        time.sleep(1.5)
+        return 200, {}, b"{}"
+
+    def test_timeout(self, local_server):
+        local_server.responses["/slow"] = self.slow
+        start = time.time()
+        with pytest.raises(OsbsTimeoutException):
+            HttpSession().get(local_server.url + "/slow", timeout=0.2)
+        assert time.time() - start < 1
+
+    def test_session_timeout(self, local_server):
+        local_server.responses["/slow"] = self.slow
+        s = HttpSession(timeout=0.2)
+        with pytest.raises(OsbsTimeoutException):
+            list(s.request_many([{"url": local_server.url + "/slow"}]))
+        # the shorter one wins
+        with pytest.raises(OsbsTimeoutException):
+            HttpSession(timeout=10).get(local_server.url + "/slow", timeout=0.2)
+
+    def test_stall_timeout(self, local_server):
+        local_server.responses["/slow"] = self.slow
+        s = HttpSession(stall_timeout=1, keepalive=60)
+        start = time.time()
+        with pytest.raises(OsbsTimeoutException):
+            s.get(local_server.url + "/slow", stream=True)
+        assert time.time() - start < 1.5
+        assert s.get(local_server.url + "/fast").status_code == 200
+
+    def test_connect_timeout(self):
+        start = time.time()
+        # non-routable address, nothing answers
+        with pytest.raises(osbs_http.OsbsNetworkException):
+            HttpSession(connect_timeout=0.2).get("http://10.255.255.1/")
+        assert time.time() - start < 2
+
+
+class TestRetryPolicy(object):
+    UNAVAILABLE = (503, {}, b"{}")
+    OK = (200, {}, b'{"ok": true}')
+
+    @pytest.fixture
+    def session(self):
+        return HttpSession(retry_policy=RetryPolicy(backoff=0.01))
+
+    def test_retried(self, local_server, session):
+        local_server.responses["/builds"] = [self.UNAVAILABLE, self.UNAVAILABLE, self.OK]
+        assert session.get(local_server.url + "/builds").json() == {"ok": True}
+        assert len(local_server.requests) == 3
+
+    def test_stream_retried(self, local_server, session):
+        local_server.responses["/builds"] = [self.UNAVAILABLE, self.OK]
+        with session.get(local_server.url + "/builds", stream=True) as stream:
+            assert stream.status_code == 200
+            assert list(stream.iter_lines()) == ['{"ok": true}']
+
+    def test_gives_up(self, local_server, session):
+        local_server.responses["/builds"] = [self.UNAVAILABLE]
+        assert session.get(local_server.url + "/builds").status_code == 503
+        assert len(local_server.requests) == 4
+
+    @pytest.mark.parametrize(('response', 'headers', 'attempts'), [
+        (UNAVAILABLE, {}, 1),
+        (UNAVAILABLE, {"Idempotency-Key": "build-1"}, 2),
+        ((429, {"Retry-After": "0"}, b"{}"), {}, 2),
+    ])
+    def test_post(self, local_server, session, response, headers, attempts):
+        local_server.responses["/builds"] = [response, self.OK]
+        session.post(local_server.url + "/builds", data="{}", headers=headers)
+        assert len(local_server.requests) == attempts
+
+    @pytest.mark.parametrize(('method', 'code', 'attempts'), [
+        ("get", pycurl.E_RECV_ERROR, 4),
+        ("post", pycurl.E_RECV_ERROR, 1),
+        ("post", pycurl.E_COULDNT_CONNECT, 4),
+        ("get", pycurl.E_SSL_CACERT, 1),
+    ])
+    def test_network_error(self, session, method, code, attempts):
+        (flexmock(session)
+            .should_receive("_request")
+            .and_raise(osbs_http.OsbsNetworkException("http://example.com/", "failed", code))
+            .times(attempts))
+        with pytest.raises(osbs_http.OsbsNetworkException):
+            session.request("http://example.com/", method)
+
+    def test_not_retried_on_request(self, local_server, session):
+        local_server.responses["/builds"] = [self.UNAVAILABLE, self.OK]
+        assert session.get(local_server.url + "/builds", retry=False).status_code == 503
+
+    def test_delay(self):
+        policy = RetryPolicy(max_attempts=3, backoff=1, max_elapsed=10)
+        assert 0 <= policy.delay(1, 0) <= 1
+        assert 0 <= policy.delay(2, 0) <= 2
+        assert policy.delay(3, 0) is None
+        assert policy.delay(1, 0, retry_after="5") == 5
+        assert policy.delay(1, 6, retry_after="5") is None
+        assert policy.delay(1, 0, retry_after="5", max_elapsed=2) is None
+
+    @pytest.mark.parametrize(('value', 'expected'), [
+        (None, None),
+        ("3", 3),
+        ("-1", 0),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", 0),
+        ("soon", None),
+    ])
+    def test_parse_retry_after(self, value, expected):
+        assert parse_retry_after(value) == expected
+
+
+class TestHttp2(object):
+    def test_multiplexed(self, h2_server):
+        for i in range(10):
+            with open(os.path.join(h2_server.docroot, "item%d" % i), "w") as fp:
+                fp.write('{"item": %d}' % i)
+        s = HttpSession(http2=True)
+        requests = [{"url": "%s/item%d" % (h2_server.url, i), "verify_ssl": False}
+                    for i in range(10)]
+        responses = list(s.request_many(requests, max_concurrency=10))
+        assert sorted(r.json()["item"] for r in responses) == list(range(10))
+        assert h2_server.connections() == 1
+
+        # nghttpd only speaks HTTP/2 over TLS
+        response = s.get(h2_server.url + "/item0", verify_ssl=False)
+        assert response.json() == {"item": 0}
+        # libcurl multiplexes only within one CurlMulti, the request has a connection of its own
+        assert h2_server.connections() == 2
+        s.close()
+
+    def test_http1_fallback(self, local_server):
+        response = HttpSession(http2=True).get(local_server.url + "/plain")
+        assert response.json() == {"path": "/plain"}
+
+    def test_http2_status_line(self):
+        headers = parse_headers(b"HTTP/2 200 \r\ncontent-type: application/json\r\n\r\n")
+        assert headers == {"content-type": "application/json"}
+
+
+class TestCurlPool(object):
+    def test_reuse_per_host(self):
+        pool = CurlPool(max_per_host=2)
+        c, m = pool.acquire("http://example.com/a")
+        pool.release("http://example.com/a", c, m)
+        assert pool.acquire("http://example.com/b") == (c, m)
+        assert pool.acquire("http://example.com/c") != (c, m)
+        assert pool.acquire("http://example.org:8080/") != (c, m)
+        assert pool.stats() == {"hits": 1, "misses": 3, "evictions": 0, "idle": 0}
+
+    def test_evictions(self):
+        pool = CurlPool(max_per_host=1)
+        pairs = [pool.acquire("http://example.com/") for _ in range(3)]
+        for pair in pairs:
+            pool.release("http://example.com/", *pair)
+        stats = pool.stats()
+        assert stats["evictions"] == 2
+        assert stats["idle"] == 1
+        # the most recently released handle survives
+        assert pool.acquire("http://example.com/") == pairs[-1]
+        pool.clear()
+        assert pool.stats()["idle"] == 0
+
+    def test_connection_reused(self, local_server):
+        s = HttpSession()
+        for path in ("/first", "/second"):
+            response = s.get(local_server.url + path)
+            assert response.json() == {"path": path}
+        assert s.pool_stats() == {"hits": 1, "misses": 1, "evictions": 0, "idle": 1}
+
+        # the second request went over the connection opened by the first one
+        c, _ = s.pool.acquire(local_server.url)
+        assert c.getinfo(pycurl.NUM_CONNECTS) == 0
+        s.close()
+
+    def test_no_cookies_leak(self, local_server):
+        local_server.responses["/login"] = (200, {"Set-Cookie": "ssn=secret; Path=/"}, b"{}")
+        s = HttpSession()
+        s.get(local_server.url + "/login")
+        s.get(local_server.url + "/next")
+        assert "Cookie" not in local_server.requests[-1][2]
+
+    def test_unfinished_stream_not_reused(self, local_server):
+        local_server.responses["/stream"] = (200, {}, b"x" * 16 * 1024 * 1024)
+        s = HttpSession()
+        stream = s.get(local_server.url + "/stream", stream=True)
+        stream.close()
+        assert s.pool_stats()["idle"] == 0
+
+    def test_pooling_disabled(self, local_server):
+        s = HttpSession(pool_max_per_host=0)
+        s.get(local_server.url + "/")
+        assert s.pool_stats() is None
+
+    def test_connections_not_shared_without_pooling(self, local_server):
+        s = HttpSession(pool_max_per_host=0)
+        for path in ("/first", "/second"):
+            stream = s.get(local_server.url + path, stream=True)
+            assert list(stream.iter_lines()) == ['{"path": "%s"}' % path]
+        # the share holds DNS cache and TLS sessions, connections go away with the handles
+        assert len(local_server.connections) == 2
+        assert getattr(pycurl, "LOCK_DATA_CONNECT", None) not in osbs_http.SHARED_DATA
+
+
+class TestMethods(object):
+    def test_patch(self, local_server):
+        s = HttpSession()
+        response = s.patch(local_server.url + "/object", data='{"a": 1}',
+                           headers={"Content-Type": "application/merge-patch+json"})
+        assert response.status_code == 200
+        method, path, headers, body = local_server.requests[-1]
+        assert (method, path, body) == ("PATCH", "/object", b'{"a": 1}')
+        assert headers["Content-Type"] == "application/merge-patch+json"
+
+    def test_use_json_header(self, local_server):
+        HttpSession().put(local_server.url + "/object", data="{}", use_json=True)
+        assert local_server.requests[-1][2]["Content-Type"] == "application/json"
+
+
+class TestRequestMany(object):
+    def test_request_many(self, local_server):
+        s = HttpSession()
+        paths = ["/item/%d" % i for i in range(20)]
+        requests = [{"url": local_server.url + path} for path in paths]
+        responses = list(s.request_many(requests, max_concurrency=4))
+        assert sorted(r.url for r in responses) == sorted(r["url"] for r in requests)
+        for response in responses:
+            assert response.status_code == 200
+            assert local_server.url + response.json()["path"] == response.url
+
+        # connections are kept for the next batch
+        requests = [{"url": local_server.url + "/again", "method": "post", "data": "{}"}]
+        assert [r.status_code for r in s.request_many(requests)] == [200]
+        assert local_server.requests[-1][0] == "POST"
+        s.close()
+
+    def test_request_many_network_error(self):
+        s = HttpSession()
+        with pytest.raises(osbs_http.OsbsNetworkException):
+            list(s.request_many([{"url": "http://127.0.0.1:1/"}]))
+
+    def test_request_many_error_keeps_other_responses(self, local_server):
+        s = HttpSession()
+        requests = [{"url": local_server.url + "/item/%d" % i} for i in range(5)]
+        requests.insert(2, {"url": "http://127.0.0.1:1/"})
+        responses = []
+        with pytest.raises(osbs_http.OsbsNetworkException) as exc_info:
+            for response in s.request_many(requests, max_concurrency=2):
+                responses.append(response)
+        assert exc_info.value.url == "http://127.0.0.1:1/"
+        assert sorted(r.url for r in responses) == sorted(r["url"] for r in requests
+                                                          if r["url"] != "http://127.0.0.1:1/")
+        s.close()
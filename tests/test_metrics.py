@@ -0,0 +1,83 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+
+from osbs.core import Openshift
+from osbs.http import HttpSession, RequestMetrics
+from osbs.metrics import EndpointStats, endpoint_template
+
+from tests.local_server import local_server
+
+
+@pytest.mark.parametrize(('url', 'template'), [
+    ("https://os.example.com/oapi/v1/namespaces/default/builds/b1/",
+     "namespaces/{ns}/builds/{id}/"),
+    ("https://os.example.com/oapi/v1/namespaces/default/builds/b1/log/?follow=1",
+     "namespaces/{ns}/builds/{id}/log/"),
+    ("https://os.example.com/oapi/v1/watch/namespaces/default/builds/?resourceVersion=1",
+     "watch/namespaces/{ns}/builds/"),
+    ("https://os.example.com/api/v1/namespaces/default/pods/?labelSelector=a%3Db",
+     "namespaces/{ns}/pods/"),
+    ("https://os.example.com/oapi/v1/users/~/", "users/{id}/"),
+    ("https://os.example.com/oauth/authorize?response_type=token", "/oauth/authorize"),
+])
+def test_endpoint_template(url, template):
+    assert endpoint_template(url) == template
+
+
+class TestEndpointStats(object):
+    def test_aggregation(self):
+        stats = EndpointStats()
+        for name, total in (("b1", 0.4), ("b2", 0.6)):
+            stats(RequestMetrics("https://os/oapi/v1/namespaces/ns/builds/%s/" % name, "get",
+                                 200, namelookup_time=0.1, connect_time=0.1,
+                                 pretransfer_time=0.1, starttransfer_time=0.3,
+                                 total_time=total, size_download=1000))
+        stats(RequestMetrics("https://os/oapi/v1/namespaces/ns/builds/", "post", 0))
+
+        summary = stats.summary()
+        builds = summary[("GET", "namespaces/{ns}/builds/{id}/")]
+        assert builds["count"] == 2
+        assert builds["errors"] == 0
+        assert builds["dns"] == pytest.approx(0.1)
+        assert builds["server"] == pytest.approx(0.2)
+        assert builds["transfer"] == pytest.approx(0.2)
+        assert builds["total"] == pytest.approx(0.5)
+        assert builds["max_total"] == pytest.approx(0.6)
+        assert builds["size_download"] == 2000
+        assert summary[("POST", "namespaces/{ns}/builds/")]["errors"] == 1
+
+    def test_session_observer(self, local_server):
+        stats = EndpointStats()
+        s = HttpSession()
+        s.add_observer(stats)
+        url = local_server.url + "/oapi/v1/namespaces/ns/builds/"
+        s.get(url + "b1/")
+        list(s.get(url + "b2/log/", stream=True).iter_lines())
+        list(s.request_many([{"url": url + "b3/"}, {"url": url + "b4/"}]))
+        s.post(url, data="{}")
+
+        summary = stats.summary()
+        assert summary[("GET", "namespaces/{ns}/builds/{id}/")]["count"] == 3
+        assert summary[("GET", "namespaces/{ns}/builds/{id}/log/")]["count"] == 1
+        post = summary[("POST", "namespaces/{ns}/builds/")]
+        assert post["count"] == 1
+        assert post["size_upload"] == 2
+        assert post["size_download"] > 0
+        assert post["total"] > 0
+
+    def test_failing_observer(self, local_server):
+        def observer(metrics):
+            raise RuntimeError("broken")
+
+        os_inst = Openshift(local_server.url + "/oapi/v1/", "v1",
+                            local_server.url + "/oauth/authorize", use_auth=False)
+        os_inst.add_request_observer(observer)
+        assert os_inst.get_user().status_code == 200
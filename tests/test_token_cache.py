@@ -0,0 +1,56 @@
+"""
+Copyright (c) 2015 Red Hat, Inc
+All rights reserved.
+
+This software may be modified and distributed under the terms
+of the BSD license. See the LICENSE file for details.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import os
+import stat
+
+import pytest
+
+from osbs.token_cache import TokenCache, TOKEN_EXPIRY_MARGIN
+
+OAUTH_URL = "https://openshift.example.com/oauth/authorize"
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return TokenCache(str(tmpdir.join("osbs", "tokens.json")))
+
+
+class TestTokenCache(object):
+    def test_set_get(self, cache):
+        assert cache.get(OAUTH_URL, "user:me") is None
+        cache.set(OAUTH_URL, "user:me", "token-me", expires_in=3600)
+        cache.set(OAUTH_URL, "user:you", "token-you")
+        assert cache.get(OAUTH_URL, "user:me") == "token-me"
+        assert cache.get(OAUTH_URL, "user:you") == "token-you"
+        assert cache.get("https://other.example.com/", "user:me") is None
+
+    def test_owner_only(self, cache):
+        cache.set(OAUTH_URL, "user:me", "token")
+        assert stat.S_IMODE(os.stat(cache.path).st_mode) == 0o600
+
+    def test_near_expiry(self, cache):
+        cache.set(OAUTH_URL, "user:me", "token", expires_in=TOKEN_EXPIRY_MARGIN - 10)
+        assert cache.get(OAUTH_URL, "user:me") is None
+
+    def test_invalidate(self, cache):
+        cache.set(OAUTH_URL, "user:me", "new-token")
+        # somebody else has already replaced the token we used
+        cache.invalidate(OAUTH_URL, "user:me", token="old-token")
+        assert cache.get(OAUTH_URL, "user:me") == "new-token"
+        cache.invalidate(OAUTH_URL, "user:me", token="new-token")
+        assert cache.get(OAUTH_URL, "user:me") is None
+
+    def test_corrupted_file(self, cache):
+        os.makedirs(os.path.dirname(cache.path))
+        with open(cache.path, "w") as fp:
+            fp.write("{not json")
+        assert cache.get(OAUTH_URL, "user:me") is None
+        cache.set(OAUTH_URL, "user:me", "token")
+        assert cache.get(OAUTH_URL, "user:me") == "token"
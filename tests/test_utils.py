@@ -11,6 +11,7 @@ import pytest
 import datetime
 
 from osbs.utils import (deep_update,
+                        graceful_chain_get,
                         get_imagestreamtag_from_image,
                         git_repo_humanish_part_from_uri,
                         get_time_from_rfc3339)
@@ -25,6 +26,25 @@ def test_deep_update():
     assert x == {'a': 'A', 'b': {'b1': 'newB1', 'b2': 'B2', 'b3': 'B3'}, 'c': 'C'}
 
 
+@pytest.mark.parametrize(('path', 'expected'), [
+    (("a", "b"), "B"),
+    (("a", "c", 1), 2),
+    (("a", "missing"), None),
+    (("a", "b", "too-deep"), None),
+    (("a", "c", 5), None),
+    (("none", "b"), None),
+])
+def test_graceful_chain_get(path, expected):
+    d = {"a": {"b": "B", "c": [1, 2]}, "none": None}
+    assert graceful_chain_get(d, *path) == expected
+
+
+def test_graceful_chain_get_no_copy():
+    d = {"a": {"b": {}}}
+    assert graceful_chain_get(d, "a", "b") is d["a"]["b"]
+    assert graceful_chain_get({}, "a") is None
+
+
 @pytest.mark.parametrize(('uri', 'humanish'), [
     ('http://git.example.com/git/repo.git/', 'repo'),
     ('http://git.example.com/git/repo.git', 'repo'),